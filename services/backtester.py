@@ -0,0 +1,383 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from services.stock_data_store import get_default_store, StockDataStore
+from services.stock_scorer import StockScorer
+from services.technical_indicator import TechnicalIndicator
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class ScoreBacktester:
+    """
+    评分信号回测服务
+    以StockScorer评分阈值作为进出场规则，在 (日期数, 股票数) 面板上用NumPy一次性回放，
+    统计组合净值、回撤、换手率以及各投资建议档位的远期收益和胜率
+    """
+
+    # 年化使用的交易日数
+    TRADING_DAYS_PER_YEAR = 252
+
+    # 默认统计的远期收益周期（交易日）
+    DEFAULT_HORIZONS = (5, 20)
+
+    def __init__(self, entry_score: int = 70, exit_score: int = 60, lag: int = 1,
+                 horizons: Sequence[int] = DEFAULT_HORIZONS, cost: float = 0.0):
+        """
+        初始化回测服务
+
+        Args:
+            entry_score: 评分达到该值时买入
+            exit_score: 评分低于该值时卖出，介于两者之间保持原有仓位
+            lag: 信号到持仓的滞后交易日数，1表示按信号当日收盘价成交
+            horizons: 统计远期收益的周期列表（交易日）
+            cost: 单边交易成本，按成交金额占组合的比例扣除，如0.0015
+        """
+        if exit_score > entry_score:
+            raise ValueError(f"卖出阈值({exit_score})不能高于买入阈值({entry_score})")
+        if lag < 1:
+            raise ValueError("信号滞后至少为1个交易日，否则会使用未来数据")
+
+        self.entry_score = entry_score
+        self.exit_score = exit_score
+        self.lag = int(lag)
+        self.horizons = tuple(int(h) for h in horizons)
+        self.cost = float(cost)
+        self.scorer = StockScorer()
+
+        logger.debug(f"初始化ScoreBacktester回测服务: 买入>={entry_score} 卖出<{exit_score} 滞后{lag}日")
+
+    @staticmethod
+    def forward_fill(values: np.ndarray) -> np.ndarray:
+        """
+        沿日期方向前向填充NaN，开头的NaN保持不变
+
+        Args:
+            values: (日期数, 股票数) 浮点数组
+
+        Returns:
+            同形状的填充结果
+        """
+        if values.size == 0:
+            return values.copy()
+        # 记录每个位置最近一次非NaN的行号，沿日期方向取累计最大值
+        rows = np.arange(values.shape[0])[:, None]
+        last = np.maximum.accumulate(np.where(np.isnan(values), 0, rows), axis=0)
+        return np.take_along_axis(values, last, axis=0)
+
+    def positions(self, scores: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """
+        根据评分生成每个交易日收盘后的目标持仓（带滞回区间）
+
+        Args:
+            scores: (日期数, 股票数) 评分面板
+            valid: 同形状布尔面板，False表示当日无法评分或停牌，沿用上一个交易日的状态
+
+        Returns:
+            同形状的0/1浮点数组
+        """
+        scores = np.asarray(scores)
+        # 买入为1，卖出为0，其余为NaN表示沿用上一个交易日的状态
+        signal = np.full(scores.shape, np.nan)
+        signal[scores >= self.entry_score] = 1.0
+        signal[scores < self.exit_score] = 0.0
+        signal[~valid] = np.nan
+
+        return np.nan_to_num(self.forward_fill(signal), nan=0.0)
+
+    def held_positions(self, target: np.ndarray, has_price: np.ndarray) -> np.ndarray:
+        """
+        目标持仓滞后lag日生效，得到每个交易日实际持有的仓位
+
+        t日持仓在t-1日收盘调仓得到；t-1日停牌的股票无法成交，沿用原有仓位
+
+        Args:
+            target: positions生成的目标持仓
+            has_price: 同形状布尔面板，标记有收盘价（可成交）的位置
+
+        Returns:
+            同形状的0/1浮点数组
+        """
+        held = np.zeros_like(target)
+        if self.lag < len(target):
+            held[self.lag:] = target[:-self.lag]
+        held[1:][~has_price[:-1]] = np.nan
+        return np.nan_to_num(self.forward_fill(held), nan=0.0)
+
+    @staticmethod
+    def rebalance(held: np.ndarray, daily: np.ndarray, has_price: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        每日收盘按等权重调仓，计算组合权重、收益和成交金额
+
+        前一日停牌的持仓无法成交，保持停牌前的持仓市值（停牌期间收益为0），其余持仓等分剩余的资金。
+        记t日开盘前组合净值为H_t，可交易持仓每只的市值为 V_t = (H_t - S_t) / n_t，
+        其中S_t是停牌持仓在停牌前最后一个可交易日的V之和，于是
+        H_{t+1} = H_t * (1 + m_t) + R_t - S_t * m_t（m_t为可交易持仓的平均收益，R_t为复牌持仓的收益金额）。
+        给定S和R时这是一阶线性递推，用累乘和累加在整个面板上求解；S和R只依赖更早交易日的V，
+        只在稀疏的停牌位置上迭代到不动点，没有停牌持仓时一次完成
+
+        Args:
+            held: held_positions得到的实际持仓
+            daily: 同形状的日收益
+            has_price: 同形状布尔面板，标记有收盘价（可成交）的位置
+
+        Returns:
+            (权重, 组合日收益, 成交金额占组合的比例) 的元组，成交金额为双边合计
+        """
+        periods = held.shape[0]
+        holding = held > 0
+        frozen = np.zeros(held.shape, dtype=bool)
+        frozen[1:] = holding[1:] & ~has_price[:-1]
+        free = holding & ~frozen
+
+        counts = free.sum(axis=1)
+        mean = np.divide(np.einsum('ij,ij->i', free, daily), counts, out=np.zeros(periods), where=counts > 0)
+        # scale[t] = Π_{u<t} (1 + m_u)
+        scale = np.concatenate([[1.0], np.cumprod(1 + mean)])
+
+        # 停牌位置按股票、日期排序，同一股票日期连续的位置属于同一段停牌，起点为该段前一个交易日
+        symbols, days = np.nonzero(frozen.T)
+        first = np.ones(days.size, dtype=bool)
+        first[1:] = (symbols[1:] != symbols[:-1]) | (days[1:] != days[:-1] + 1)
+        starts = days[np.maximum.accumulate(np.where(first, np.arange(days.size), 0))] - 1 if days.size else days
+        frozen_daily = daily[days, symbols]
+
+        # 每轮迭代至少多一个交易日的结果精确，停牌持仓只占组合一小部分，通常几轮即收敛
+        unit = np.zeros(periods)
+        for _ in range(periods + 1):
+            carried = np.bincount(days, weights=unit[starts], minlength=periods)
+            resumed = np.bincount(days, weights=unit[starts] * frozen_daily, minlength=periods)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                offset = np.cumsum((resumed - carried * mean) / scale[1:])
+            equity = scale[:-1] * (1 + np.concatenate([[0.0], offset[:-1]]))
+            previous, unit = unit, np.divide(equity - carried, counts, out=np.zeros(periods), where=counts > 0)
+            if not days.size or np.allclose(unit, previous, rtol=1e-13, atol=0):
+                break
+
+        # 净值归零后不再持有任何仓位
+        inverse = np.divide(1.0, equity, out=np.zeros(periods), where=equity > 0)
+        weights = free * (unit * inverse)[:, None]
+        weights[days, symbols] = unit[starts] * inverse[days]
+
+        gross = np.einsum('ij,ij->i', weights, daily)
+
+        # 上一日权重随当日涨跌漂移后的结果，与当日调仓后的权重之差即为成交金额
+        growth = 1 + gross
+        shrink = np.divide(1.0, growth, out=np.zeros(periods), where=growth > 0)
+        drifted = daily[:-1] + 1
+        drifted *= weights[:-1]
+        drifted *= shrink[:-1, None]
+        np.subtract(weights[1:], drifted, out=drifted)
+        traded = np.empty(periods)
+        traded[:1] = weights[:1].sum(axis=1)
+        traded[1:] = np.abs(drifted, out=drifted).sum(axis=1)
+
+        return weights, gross, traded
+
+    @staticmethod
+    def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+        """
+        计算远期收益 close[t + horizon] / close[t] - 1，末尾不足horizon的日期为NaN
+
+        Args:
+            close: (日期数, 股票数) 收盘价面板
+            horizon: 周期（交易日）
+
+        Returns:
+            同形状的远期收益数组
+        """
+        result = np.full(close.shape, np.nan)
+        if 0 < horizon < close.shape[0]:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[:-horizon] = close[horizon:] / close[:-horizon] - 1
+        return result
+
+    def bucket_stats(self, scores: np.ndarray, close: np.ndarray, valid: np.ndarray) -> pd.DataFrame:
+        """
+        按投资建议档位统计远期收益的样本数、平均收益和胜率
+
+        Args:
+            scores: (日期数, 股票数) 评分面板
+            close: 收盘价面板
+            valid: 可评分的布尔面板
+
+        Returns:
+            以投资建议为索引（从高到低）的DataFrame
+        """
+        levels = self.scorer.RECOMMENDATION_LEVELS
+        # 档位编号0为最低档，与RECOMMENDATION_LEVELS从低到高对应
+        bins = np.array([threshold for threshold, _ in reversed(levels)])
+        labels = [self.scorer.LOWEST_RECOMMENDATION] + [label for _, label in reversed(levels)]
+        buckets = np.digitize(scores, bins)
+
+        columns = {}
+        for horizon in self.horizons:
+            returns = self.forward_returns(close, horizon)
+            mask = valid & np.isfinite(returns)
+            bucket, value = buckets[mask], returns[mask]
+            count = np.bincount(bucket, minlength=len(labels))
+            total = np.bincount(bucket, weights=value, minlength=len(labels))
+            hits = np.bincount(bucket, weights=value > 0, minlength=len(labels))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                columns[f'count_{horizon}d'] = count
+                columns[f'return_{horizon}d'] = total / count
+                columns[f'hit_rate_{horizon}d'] = hits / count
+
+        return pd.DataFrame(columns, index=pd.Index(labels, name='Recommendation')).iloc[::-1]
+
+    def entry_stats(self, held: np.ndarray, close: np.ndarray) -> Dict[str, Any]:
+        """
+        统计买入事件之后的远期收益，从实际成交的K线（持仓由0变1的前一日收盘）起算
+
+        Args:
+            held: 实际持仓面板
+            close: 收盘价面板，停牌日期用停牌前的收盘价填充
+
+        Returns:
+            字典，包含买入次数及各周期的平均收益和胜率
+        """
+        entries = np.zeros(held.shape, dtype=bool)
+        entries[:-1] = (held[1:] > 0) & (held[:-1] == 0)
+
+        stats: Dict[str, Any] = {'entries': int(entries.sum())}
+        for horizon in self.horizons:
+            returns = self.forward_returns(close, horizon)[entries]
+            returns = returns[np.isfinite(returns)]
+            stats[f'return_{horizon}d'] = float(returns.mean()) if returns.size else np.nan
+            stats[f'hit_rate_{horizon}d'] = float((returns > 0).mean()) if returns.size else np.nan
+        return stats
+
+    def run(self, close: np.ndarray, scores: np.ndarray, valid: Optional[np.ndarray] = None,
+            dates: Optional[pd.Index] = None) -> Dict[str, Any]:
+        """
+        在面板上回放评分信号
+
+        组合每日收盘按等权重持有所有处于持仓状态的股票；停牌期间持仓不变、收益记为0，
+        复牌当日的收益相对停牌前的收盘价计算
+
+        Args:
+            close: (日期数, 股票数) 收盘价面板，未上市或停牌的日期为NaN
+            scores: 同形状的评分面板
+            valid: 同形状布尔面板，标记评分可用的位置，默认为收盘价非NaN的位置
+            dates: 日期索引，用于输出的时间序列
+
+        Returns:
+            字典，包含 summary（汇总指标）、equity、drawdown、turnover、positions（时间序列）、
+            buckets（各档位远期收益统计）和 entries（买入事件统计）
+        """
+        close = np.asarray(close, dtype=np.float64)
+        scores = np.asarray(scores)
+        if close.shape != scores.shape:
+            raise ValueError(f"收盘价面板{close.shape}与评分面板{scores.shape}形状不一致")
+
+        has_price = ~np.isnan(close)
+        valid = has_price if valid is None else (np.asarray(valid, dtype=bool) & has_price)
+        if dates is None:
+            dates = pd.RangeIndex(close.shape[0])
+
+        target = self.positions(scores, valid)
+
+        # 信号滞后lag日生效：t日收盘的目标持仓赚取t+1日起的收益
+        held = self.held_positions(target, has_price)
+
+        # 日收益相对最近一个有效收盘价计算，停牌期间的涨跌计入复牌当日；停牌日和上市前记为0
+        last_close = self.forward_fill(close)
+        daily = np.zeros_like(close)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily[1:] = close[1:] / last_close[:-1] - 1
+        daily[~np.isfinite(daily)] = 0.0
+
+        # 等权重组合，换手率 = 0.5 * Σ|w_t - 漂移后的w_{t-1}|，成本按双边成交金额扣除
+        counts = held.sum(axis=1)
+        _, gross, traded = self.rebalance(held, daily, has_price)
+        turnover = 0.5 * traded
+        net = gross - self.cost * traded
+
+        equity = np.cumprod(1 + net)
+        drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else equity
+
+        periods = len(net)
+        std = net.std(ddof=1) if periods > 1 else 0.0
+        summary = {
+            'days': periods,
+            'symbols': close.shape[1],
+            'total_return': float(equity[-1] - 1) if periods else 0.0,
+            'annual_return': float(equity[-1] ** (self.TRADING_DAYS_PER_YEAR / periods) - 1) if periods else 0.0,
+            'max_drawdown': float(drawdown.min()) if periods else 0.0,
+            'sharpe': float(net.mean() / std * np.sqrt(self.TRADING_DAYS_PER_YEAR)) if std > 0 else 0.0,
+            'avg_turnover': float(turnover.mean()) if periods else 0.0,
+            'avg_positions': float(counts.mean()) if periods else 0.0,
+            'exposure': float((counts > 0).mean()) if periods else 0.0,
+        }
+
+        return {
+            'summary': summary,
+            'equity': pd.Series(equity, index=dates, name='Equity'),
+            'drawdown': pd.Series(drawdown, index=dates, name='Drawdown'),
+            'turnover': pd.Series(turnover, index=dates, name='Turnover'),
+            'positions': pd.Series(counts.astype(np.int64), index=dates, name='Positions'),
+            'buckets': self.bucket_stats(scores, close, valid),
+            'entries': self.entry_stats(held, last_close),
+        }
+
+    def build_score_panel(self, stock_dfs: Dict[str, pd.DataFrame],
+                          indicator_params: Optional[Dict] = None) -> Tuple[pd.DatetimeIndex, List[str], Dict[str, np.ndarray]]:
+        """
+        将多只股票的历史行情组成面板，并计算技术指标和每日评分
+
+        Args:
+            stock_dfs: 字典，键为股票代码，值为以日期为索引的行情DataFrame
+            indicator_params: 技术指标参数，None时使用默认参数
+
+        Returns:
+            (日期索引, 股票代码列表, 面板字典) 的元组，面板包含 Close、Score 和 Valid
+        """
+        dates, codes, raw = TechnicalIndicator.build_panel(stock_dfs)
+        if not codes:
+            return dates, codes, {'Close': raw['Close'], 'Score': np.empty((0, 0), dtype=np.int8),
+                                  'Valid': np.empty((0, 0), dtype=bool)}
+
+        panel = TechnicalIndicator(indicator_params).calculate_panel(raw['Close'], raw['High'], raw['Low'], raw['Volume'])
+        panel['Close'] = raw['Close']
+        scores = self.scorer.score_history_panel(panel)
+        # 指标尚未预热完成的日期不参与统计
+        valid = np.logical_and.reduce([~np.isnan(panel[column]) for column in self.scorer.SCORE_COLUMNS])
+
+        return dates, codes, {'Close': raw['Close'], 'Score': scores, 'Valid': valid}
+
+    def run_from_store(self, codes: Optional[Sequence[str]] = None, market_type: str = 'A',
+                       start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       store: Optional[StockDataStore] = None,
+                       indicator_params: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        使用本地存储的历史行情回测
+
+        Args:
+            codes: 股票代码列表，None表示本地存储中该市场的全部股票
+            market_type: 市场类型
+            start_date: 开始日期，格式YYYYMMDD或YYYY-MM-DD
+            end_date: 结束日期，格式YYYYMMDD或YYYY-MM-DD
+            store: 本地行情存储，None时使用默认存储
+            indicator_params: 技术指标参数
+
+        Returns:
+            与run相同的结果字典，summary中额外包含codes
+        """
+        store = store or get_default_store()
+        if store is None:
+            raise ValueError("本地行情数据存储未启用，无法回测")
+        if not store.supports(market_type):
+            raise ValueError(f"本地行情数据存储不支持市场类型: {market_type}")
+
+        codes = list(codes) if codes is not None else store.list_symbols(market_type)
+        logger.info(f"📈 [回测] 从本地存储加载 {market_type} {len(codes)} 只股票的历史行情")
+        stock_dfs = {code: store.load(market_type, code, start_date=start_date, end_date=end_date) for code in codes}
+
+        dates, loaded_codes, panel = self.build_score_panel(stock_dfs, indicator_params)
+        logger.info(f"📈 [回测] 面板大小 {len(dates)} 日 × {len(loaded_codes)} 只股票")
+
+        result = self.run(panel['Close'], panel['Score'], valid=panel['Valid'], dates=dates)
+        result['summary']['codes'] = loaded_codes
+        return result
@@ -1,7 +1,7 @@
-import asyncio
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from utils.logger import get_logger
+from utils.executor import get_io_executor
 from datetime import datetime, timedelta
 
 # 获取日志器
@@ -97,12 +97,12 @@ class FundServiceAsync:
         try:
             logger.debug(f"从API获取{market_type}数据")
             
-            # 使用线程池执行同步的akshare调用
+            # 使用上游请求专用线程池执行同步的akshare调用
             if market_type == 'ETF':
-                df = await asyncio.to_thread(self._get_etf_data)
+                df = await get_io_executor().run(self._get_etf_data)
                 self._etf_cache = df
             else:
-                df = await asyncio.to_thread(self._get_lof_data)
+                df = await get_io_executor().run(self._get_lof_data)
                 self._lof_cache = df
                 
             self._cache_timestamp = now
@@ -0,0 +1,242 @@
+import math
+from collections import deque
+from typing import Dict, Optional, Any, Mapping
+import pandas as pd
+from services.technical_indicator import TechnicalIndicator
+from services.indicator_kernels import VARIANCE_TOLERANCE
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+def _divide(numerator: float, denominator: float) -> float:
+    """按IEEE语义相除（与pandas一致）：除以0得到inf，0/0得到NaN"""
+    if denominator == 0:
+        if numerator == 0 or math.isnan(numerator):
+            return math.nan
+        return math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+class RollingWindow:
+    """
+    固定长度滑动窗口，维护窗口内的累加和与平方累加和
+
+    窗口内有NaN时均值和标准差为NaN，与pandas rolling语义一致
+    """
+
+    # 每推入多少个值从窗口重新计算一次累加和，避免浮点误差累积
+    RECOMPUTE_INTERVAL = 1000
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.nan_count = 0
+        self.anchor = None
+        self.total = 0.0
+        self.squares = 0.0
+        self._pushes = 0
+
+    def push(self, value: float) -> None:
+        """推入一个新值，窗口已满时移除最旧的值"""
+        if len(self.values) == self.window:
+            self._remove(self.values[0])
+        self.values.append(value)
+
+        if math.isnan(value):
+            self.nan_count += 1
+        else:
+            # 以首个有效值为基准平移，减小平方和的抵消误差
+            if self.anchor is None:
+                self.anchor = value
+            shifted = value - self.anchor
+            self.total += shifted
+            self.squares += shifted * shifted
+
+        self._pushes += 1
+        if self._pushes % self.RECOMPUTE_INTERVAL == 0:
+            self._recompute()
+
+    def _remove(self, value: float) -> None:
+        if math.isnan(value):
+            self.nan_count -= 1
+        else:
+            shifted = value - self.anchor
+            self.total -= shifted
+            self.squares -= shifted * shifted
+
+    def _recompute(self) -> None:
+        """从窗口内的原始值重新计算累加和，同时把基准移到窗口内"""
+        valid = [v for v in self.values if not math.isnan(v)]
+        self.anchor = valid[0] if valid else None
+        self.total = sum(v - self.anchor for v in valid)
+        self.squares = sum((v - self.anchor) ** 2 for v in valid)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.values) == self.window and self.nan_count == 0
+
+    def mean(self) -> float:
+        if not self.ready:
+            return math.nan
+        return self.total / self.window + self.anchor
+
+    def std(self, ddof: int = 1) -> float:
+        if not self.ready or self.window <= ddof:
+            return math.nan
+        variance = (self.squares - self.total * self.total / self.window) / (self.window - ddof)
+        # 低于抵消误差量级的方差记为0，与面板内核一致
+        tolerance = self.squares / (self.window - ddof) * VARIANCE_TOLERANCE
+        return math.sqrt(variance) if variance > tolerance else 0.0
+
+
+class EMAState:
+    """
+    指数移动平均的递推状态，等价于 pandas ewm(span=span, adjust=False).mean()
+    """
+
+    def __init__(self, span: int):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = math.nan
+        self.old_weight = 1.0
+
+    def update(self, current: float) -> float:
+        """推入一个新值并返回最新的EMA"""
+        if math.isnan(self.value):
+            if not math.isnan(current):
+                self.value = current
+                self.old_weight = 1.0
+            return self.value
+
+        # 缺失值只衰减旧权重，与pandas处理中间NaN的方式一致
+        self.old_weight *= 1.0 - self.alpha
+        if not math.isnan(current):
+            if self.value != current:
+                self.value = (self.old_weight * self.value + self.alpha * current) / (self.old_weight + self.alpha)
+            self.old_weight = 1.0
+        return self.value
+
+
+class IncrementalIndicator:
+    """
+    增量技术指标计算
+
+    保存各指标的运行状态，追加一根新K线时以常数时间更新全部指标，
+    结果与对完整历史调用TechnicalIndicator.calculate_indicators的最后一行一致
+    """
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None):
+        """
+        初始化增量技术指标计算
+
+        Args:
+            params: 技术指标参数配置，默认与TechnicalIndicator相同
+        """
+        self.params = params or TechnicalIndicator().params
+
+        # 同一周期的收盘价窗口在MA、布林带和波动率之间共享
+        close_periods = set(self.params['ma_periods'].values())
+        close_periods.update([self.params['bollinger_period'], 20])
+        self.close_windows = {period: RollingWindow(period) for period in close_periods}
+
+        self.gain_window = RollingWindow(self.params['rsi_period'])
+        self.loss_window = RollingWindow(self.params['rsi_period'])
+        self.volume_window = RollingWindow(self.params['volume_ma_period'])
+        self.tr_window = RollingWindow(self.params['atr_period'])
+
+        self.ema12 = EMAState(12)
+        self.ema26 = EMAState(26)
+        self.signal_ema = EMAState(9)
+
+        self.prev_close = math.nan
+        self.bars = 0
+        self.last_index = None
+        self.latest: Dict[str, float] = {}
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, params: Optional[Dict[str, Any]] = None) -> 'IncrementalIndicator':
+        """
+        用历史数据初始化运行状态
+
+        Args:
+            df: 历史价格数据，包含High, Low, Close, Volume列
+            params: 技术指标参数配置
+
+        Returns:
+            已追加全部历史K线的IncrementalIndicator
+        """
+        state = cls(params)
+        for index, close, high, low, volume in zip(df.index, df['Close'], df['High'], df['Low'], df['Volume']):
+            state._update(float(close), float(high), float(low), float(volume))
+            state.last_index = index
+        return state
+
+    def update(self, bar: Mapping[str, Any], index: Any = None) -> Dict[str, float]:
+        """
+        追加一根新K线
+
+        Args:
+            bar: 包含Close, High, Low, Volume的K线（字典或pd.Series）
+            index: K线的日期，可选
+
+        Returns:
+            最新一行的技术指标
+        """
+        result = self._update(float(bar['Close']), float(bar['High']), float(bar['Low']), float(bar['Volume']))
+        if index is None and isinstance(bar, pd.Series):
+            index = bar.name
+        self.last_index = index
+        return result
+
+    def _update(self, close: float, high: float, low: float, volume: float) -> Dict[str, float]:
+        params = self.params
+
+        for window in self.close_windows.values():
+            window.push(close)
+
+        # RSI：差分缺失时涨跌记为0，与calculate_rsi中where的行为一致
+        delta = close - self.prev_close
+        self.gain_window.push(delta if delta > 0 else 0.0)
+        self.loss_window.push(-delta if delta < 0 else 0.0)
+
+        # ATR：真实波幅忽略缺失项
+        tr_parts = [v for v in (high - low, abs(high - self.prev_close), abs(low - self.prev_close)) if not math.isnan(v)]
+        self.tr_window.push(max(tr_parts) if tr_parts else math.nan)
+
+        self.volume_window.push(volume)
+
+        macd = self.ema12.update(close) - self.ema26.update(close)
+        signal = self.signal_ema.update(macd)
+
+        self.prev_close = close
+        self.bars += 1
+
+        result = {}
+        for name, period in params['ma_periods'].items():
+            result[f'MA{period}'] = self.close_windows[period].mean()
+
+        result['RSI'] = 100 - _divide(100, 1 + _divide(self.gain_window.mean(), self.loss_window.mean()))
+
+        result['MACD'] = macd
+        result['Signal'] = signal
+        result['Histogram'] = macd - signal
+
+        bb_window = self.close_windows[params['bollinger_period']]
+        middle = bb_window.mean()
+        std = bb_window.std()
+        result['BB_Middle'] = middle
+        result['BB_Upper'] = middle + params['bollinger_std'] * std
+        result['BB_Lower'] = middle - params['bollinger_std'] * std
+
+        volume_ma = self.volume_window.mean()
+        result['Volume_MA'] = volume_ma
+        result['Volume_Ratio'] = _divide(volume, volume_ma)
+
+        result['ATR'] = self.tr_window.mean()
+
+        volatility_window = self.close_windows[20]
+        result['Volatility'] = _divide(volatility_window.std(), volatility_window.mean()) * 100
+
+        self.latest = result
+        return result
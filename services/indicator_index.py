@@ -0,0 +1,266 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Mapping, Optional, Sequence
+import numpy as np
+import pandas as pd
+from services.stock_data_store import StockDataStore, get_default_store
+from services.stock_scorer import StockScorer
+from services.technical_indicator import TechnicalIndicator
+from utils.logger import get_logger
+from utils.market_time import latest_session_date
+
+# 获取日志器
+logger = get_logger()
+
+
+class IndicatorIndex:
+    """
+    单个交易日的全市场指标排序索引
+    对每个索引列保存一份按取值排序的 (取值, 行号) 数组，区间过滤为二分查找，
+    多个条件的结果通过位图求交集，不需要重新计算或扫描全部股票
+    """
+
+    # 默认建立索引的列
+    INDEX_COLUMNS = ('RSI', 'Volume_Ratio', 'Volatility', 'Score')
+
+    # 区间端点的包含方式，与 pandas.Series.between 的inclusive参数一致
+    INCLUSIVE_OPTIONS = ('both', 'neither', 'left', 'right')
+
+    def __init__(self, table: pd.DataFrame, as_of: Optional[Any] = None,
+                 columns: Optional[Sequence[str]] = None):
+        """
+        根据当日数据表建立索引
+
+        Args:
+            table: 以股票代码为索引的数据表，每行一只股票
+            as_of: 数据所属交易日
+            columns: 建立索引的列，默认为INDEX_COLUMNS中数据表包含的列
+        """
+        if columns is None:
+            columns = [column for column in self.INDEX_COLUMNS if column in table.columns]
+
+        self.table = table
+        self.as_of = pd.Timestamp(as_of).date() if as_of is not None else None
+        # 建立时间，用于判断索引是否在当日收盘后建立
+        self.built_at = datetime.now(timezone.utc)
+        # 列名 -> (升序取值, 对应行号)，NaN不进入索引
+        self._sorted: Dict[str, tuple] = {}
+        for column in columns:
+            values = table[column].to_numpy(dtype=np.float64)
+            known = np.flatnonzero(~np.isnan(values))
+            order = known[np.argsort(values[known], kind='stable')]
+            self._sorted[column] = (values[order], order)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @property
+    def columns(self) -> list:
+        """已建立索引的列"""
+        return list(self._sorted)
+
+    def range_positions(self, column: str, low: Optional[float] = None, high: Optional[float] = None,
+                        inclusive: str = 'both') -> np.ndarray:
+        """
+        二分查找取值落在区间内的行号
+
+        Args:
+            column: 索引列
+            low: 下界，None表示不限
+            high: 上界，None表示不限
+            inclusive: 端点包含方式，'both'、'neither'、'left'或'right'
+
+        Returns:
+            行号数组，按该列取值升序排列
+        """
+        if column not in self._sorted:
+            raise ValueError(f"未建立索引的列: {column}")
+        if inclusive not in self.INCLUSIVE_OPTIONS:
+            raise ValueError(f"inclusive必须是 {', '.join(self.INCLUSIVE_OPTIONS)} 之一")
+
+        values, order = self._sorted[column]
+        start = 0
+        stop = len(values)
+        if low is not None:
+            start = np.searchsorted(values, low, side='left' if inclusive in ('both', 'left') else 'right')
+        if high is not None:
+            stop = np.searchsorted(values, high, side='right' if inclusive in ('both', 'right') else 'left')
+        return order[start:max(start, stop)]
+
+    def query_positions(self, conditions: Mapping[str, Sequence]) -> np.ndarray:
+        """
+        多个区间条件同时满足的行号
+
+        Args:
+            conditions: 列名 -> (下界, 上界) 或 (下界, 上界, 包含方式)
+
+        Returns:
+            升序排列的行号数组；没有条件时返回全部行
+        """
+        if not conditions:
+            return np.arange(len(self.table))
+
+        matches = [self.range_positions(column, *bounds) for column, bounds in conditions.items()]
+        # 从命中最少的条件开始，其余条件用位图过滤
+        matches.sort(key=len)
+        result = matches[0]
+        member = np.zeros(len(self.table), dtype=bool)
+        for positions in matches[1:]:
+            if result.size == 0:
+                break
+            member[:] = False
+            member[positions] = True
+            result = result[member[result]]
+        return np.sort(result)
+
+    def query(self, conditions: Mapping[str, Sequence]) -> pd.DataFrame:
+        """
+        区间过滤，如 {'RSI': (30, 40), 'Volume_Ratio': (2, None, 'neither')}
+
+        Args:
+            conditions: 列名 -> (下界, 上界) 或 (下界, 上界, 包含方式)
+
+        Returns:
+            满足全部条件的行，保持数据表原有顺序
+        """
+        return self.table.iloc[self.query_positions(conditions)]
+
+
+def build_index_from_store(market_type: str = 'A', store: Optional[StockDataStore] = None,
+                           end_date: Optional[str] = None,
+                           indicator_params: Optional[Dict] = None) -> Optional[IndicatorIndex]:
+    """
+    从本地存储读取全市场最近的行情，一次面板计算得到最新交易日的指标、评分并建立索引
+
+    索引日期为最近一个已收盘的交易日（指定end_date时不晚于end_date），晚于该日的K线（如盘中写入的
+    当日K线）不参与计算；该日没有任何股票的K线时（节假日）顺延到之前最近一个有K线的日期。
+    每只股票最近的K线按右端对齐组成面板（而不是按日期对齐），停牌日期不会在序列中间留下空洞，
+    结果与逐只股票计算一致；索引日期当天没有K线的股票（当日停牌）不进入索引
+
+    Args:
+        market_type: 市场类型
+        store: 本地行情存储，None时使用默认存储
+        end_date: 截止日期，None表示最近一个已收盘的交易日
+        indicator_params: 技术指标参数
+
+    Returns:
+        IndicatorIndex，存储未启用或没有数据时返回None
+    """
+    store = store or get_default_store()
+    if store is None or not store.supports(market_type):
+        return None
+
+    indicator = TechnicalIndicator(indicator_params)
+    rows = indicator.get_required_rows(list(indicator.get_indicator_specs()), tail=1)
+    session_date = latest_session_date(market_type)
+    if end_date:
+        session_date = min(session_date, pd.Timestamp(end_date).date())
+    bars = store.load_tails(market_type, rows, end_date=session_date.strftime('%Y-%m-%d'))
+    if bars.empty:
+        return None
+
+    # 长表按 (symbol, date) 排序，计算每条记录在右对齐面板中的位置
+    symbols, starts, counts = np.unique(bars['symbol'].to_numpy(), return_index=True, return_counts=True)
+    rank = np.arange(len(bars)) - np.repeat(starts, counts)
+    row_index = rows - np.repeat(counts, counts) + rank
+    col_index = np.repeat(np.arange(len(symbols)), counts)
+
+    inputs = {}
+    for column in ('Close', 'High', 'Low', 'Volume'):
+        panel = np.full((rows, len(symbols)), np.nan)
+        panel[row_index, col_index] = bars[column].to_numpy(dtype=np.float64)
+        inputs[column] = panel
+
+    results = indicator.calculate_panel(inputs['Close'], inputs['High'], inputs['Low'], inputs['Volume'])
+    latest = {'Close': inputs['Close'][-1], 'Volume': inputs['Volume'][-1]}
+    latest.update({name: values[-1] for name, values in results.items()})
+    latest['Score'] = StockScorer().score_history_panel({name: latest[name][None, :] for name in StockScorer.SCORE_COLUMNS})[0]
+
+    last_dates = bars['date'].to_numpy()[starts + counts - 1]
+    as_of = np.datetime64(session_date, 'ns')
+    if not (last_dates == as_of).any():
+        # 该日没有任何K线（节假日），索引之前最近一个有K线的交易日
+        as_of = last_dates.max()
+    table = pd.DataFrame(latest, index=pd.Index(symbols, name='Code'))[last_dates == as_of]
+
+    index = IndicatorIndex(table, as_of=as_of)
+    logger.info(f"🗂️  [指标索引] {market_type} {index.as_of} 建立索引 {len(index)} 只股票，列: {', '.join(index.columns)}")
+    return index
+
+
+_daily_indexes: Dict[str, "OrderedDict[date, IndicatorIndex]"] = {}
+_daily_indexes_lock = threading.Lock()
+
+
+def publish_index(market_type: str, index: IndicatorIndex):
+    """
+    登记某个交易日的索引，超出保留天数（环境变量 INDICATOR_INDEX_DAYS，默认5）的旧索引被丢弃
+
+    Args:
+        market_type: 市场类型
+        index: 索引
+    """
+    with _daily_indexes_lock:
+        indexes = _daily_indexes.setdefault(market_type, OrderedDict())
+        indexes[index.as_of] = index
+        retention_days = int(os.getenv('INDICATOR_INDEX_DAYS', '5'))
+        for day in sorted(indexes)[:-retention_days]:
+            del indexes[day]
+
+
+def get_index(market_type: str = 'A', as_of: Optional[Any] = None) -> Optional[IndicatorIndex]:
+    """
+    获取已登记的索引
+
+    Args:
+        market_type: 市场类型
+        as_of: 交易日，None表示最新的一个
+
+    Returns:
+        IndicatorIndex，不存在时返回None
+
+    Raises:
+        ValueError: 交易日无法解析
+    """
+    day = None
+    if as_of is not None:
+        timestamp = pd.Timestamp(as_of)
+        if pd.isna(timestamp):
+            raise ValueError(f"无效的交易日: {as_of!r}")
+        day = timestamp.date()
+
+    with _daily_indexes_lock:
+        indexes = _daily_indexes.get(market_type)
+        if not indexes:
+            return None
+        if day is None:
+            return indexes[max(indexes)]
+        return indexes.get(day)
+
+
+def refresh_daily_index(market_type: str = 'A', store: Optional[StockDataStore] = None) -> Optional[IndicatorIndex]:
+    """
+    从本地存储重建最近一个已收盘交易日的索引并登记（每日收盘数据刷新后调用）
+
+    Args:
+        market_type: 市场类型
+        store: 本地行情存储，None时使用默认存储
+
+    Returns:
+        新建立的索引，无法建立时返回None
+    """
+    index = build_index_from_store(market_type, store=store)
+    if index is not None:
+        publish_index(market_type, index)
+    return index
+
+
+def get_index_stats() -> Dict[str, Any]:
+    """获取各市场已登记索引的交易日和股票数"""
+    with _daily_indexes_lock:
+        return {
+            market_type: {str(day): len(index) for day, index in indexes.items()}
+            for market_type, indexes in _daily_indexes.items()
+        }
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+# 技术指标的NumPy计算内核
+# 所有函数沿第0轴（时间轴）计算，输入可以是一维序列或 (日期数, 股票数) 的二维面板，
+# NaN语义与pandas保持一致：滚动窗口内有任何NaN时结果为NaN
+
+# 滚动方差的相对误差阈值，低于该量级的方差视为0
+VARIANCE_TOLERANCE = 1e-12
+
+
+def _as_2d(values) -> np.ndarray:
+    """转换为float64二维数组，一维输入视为单列"""
+    values = np.asarray(values, dtype=np.float64)
+    return values.reshape(len(values), -1) if values.ndim == 1 else values
+
+
+def _restore_shape(result: np.ndarray, values) -> np.ndarray:
+    """按输入的维度返回结果"""
+    return result.ravel() if np.ndim(values) == 1 else result
+
+
+def diff(values) -> np.ndarray:
+    """一阶差分，首行为NaN"""
+    data = _as_2d(values)
+    result = np.full_like(data, np.nan)
+    result[1:] = data[1:] - data[:-1]
+    return _restore_shape(result, values)
+
+
+class RollingSums:
+    """
+    共享累加和的滚动统计
+
+    对同一序列只计算一次累加和与平方累加和，不同窗口的均值和标准差都由其差分得到，
+    结果按窗口缓存，MA20、布林中轨和波动率等相同窗口的统计量只算一次
+    """
+
+    def __init__(self, values):
+        self._values = values
+        self.data = _as_2d(values)
+        self.valid = ~np.isnan(self.data)
+        # 每列先减去首个有效值以减小累加和抵消误差
+        self.offset = _column_offset(self.data, self.valid)
+        self.shifted = np.where(self.valid, self.data - self.offset, 0.0)
+        self.cumsum = np.cumsum(self.shifted, axis=0)
+        self.cumcount = np.cumsum(self.valid, axis=0)
+        self._cumsq = None
+        self._cache = {}
+
+    @property
+    def cumsq(self) -> np.ndarray:
+        """平方累加和，只在需要标准差时计算"""
+        if self._cumsq is None:
+            self._cumsq = np.cumsum(self.shifted * self.shifted, axis=0)
+        return self._cumsq
+
+    def _full(self, window: int) -> np.ndarray:
+        """窗口内没有NaN的位置（从第window-1行开始）"""
+        key = ('full', window)
+        if key not in self._cache:
+            self._cache[key] = _window_sums(self.cumcount, window) == window
+        return self._cache[key]
+
+    def _sums(self, window: int) -> np.ndarray:
+        key = ('sum', window)
+        if key not in self._cache:
+            self._cache[key] = _window_sums(self.cumsum, window)
+        return self._cache[key]
+
+    def mean(self, window: int) -> np.ndarray:
+        """滚动均值，等价于 pandas rolling(window).mean()"""
+        key = ('mean', window)
+        if key not in self._cache:
+            result = np.full_like(self.data, np.nan)
+            if 0 < window <= self.data.shape[0]:
+                result[window - 1:] = np.where(self._full(window), self._sums(window) / window + self.offset, np.nan)
+            self._cache[key] = _restore_shape(result, self._values)
+        return self._cache[key]
+
+    def std(self, window: int, ddof: int = 1) -> np.ndarray:
+        """滚动标准差，等价于 pandas rolling(window).std()"""
+        key = ('std', window, ddof)
+        if key not in self._cache:
+            result = np.full_like(self.data, np.nan)
+            if ddof < window <= self.data.shape[0]:
+                sums = self._sums(window)
+                squares = _window_sums(self.cumsq, window)
+                variance = (squares - sums * sums / window) / (window - ddof)
+                # 平方和相减存在抵消误差：低于误差量级的方差（如价格不变的窗口）记为0，
+                # 与pandas对常数窗口返回0一致，同时去掉浮点误差产生的负方差
+                tolerance = squares / (window - ddof) * VARIANCE_TOLERANCE
+                variance = np.where(variance > tolerance, variance, 0.0)
+                result[window - 1:] = np.where(self._full(window), np.sqrt(variance), np.nan)
+            self._cache[key] = _restore_shape(result, self._values)
+        return self._cache[key]
+
+
+def rolling_mean(values, window: int) -> np.ndarray:
+    """滚动均值，等价于 pandas rolling(window).mean()"""
+    return RollingSums(values).mean(window)
+
+
+def rolling_std(values, window: int, ddof: int = 1) -> np.ndarray:
+    """滚动标准差，等价于 pandas rolling(window).std()"""
+    return RollingSums(values).std(window, ddof)
+
+
+def ema(values, span: int) -> np.ndarray:
+    """
+    指数移动平均，等价于 pandas ewm(span=span, adjust=False).mean()
+
+    沿时间轴逐行递推，每一步对所有股票向量化计算；
+    序列开头的NaN跳过，序列中间的NaN按pandas的方式衰减旧权重
+    """
+    data = _as_2d(values)
+    T, N = data.shape
+    result = np.full_like(data, np.nan)
+    if T == 0:
+        return _restore_shape(result, values)
+
+    if N == 1:
+        # 单列时逐行递推的开销大于pandas的C实现
+        result = pd.Series(data[:, 0]).ewm(span=span, adjust=False).mean().to_numpy()
+        return _restore_shape(result.reshape(T, 1), values)
+
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+
+    weighted = data[0].copy()
+    old_weight = np.ones(N)
+    result[0] = weighted
+
+    for t in range(1, T):
+        current = data[t]
+        observed = ~np.isnan(current)
+        started = ~np.isnan(weighted)
+
+        old_weight = np.where(started, old_weight * decay, old_weight)
+        update = started & observed
+        with np.errstate(invalid='ignore'):
+            blended = (old_weight * weighted + alpha * current) / (old_weight + alpha)
+        weighted = np.where(update & (weighted != current), blended, weighted)
+        old_weight = np.where(update, 1.0, old_weight)
+        weighted = np.where(~started & observed, current, weighted)
+
+        result[t] = weighted
+
+    return _restore_shape(result, values)
+
+
+def true_range(high, low, close) -> np.ndarray:
+    """
+    真实波幅，等价于 max(High-Low, |High-前收|, |Low-前收|)（忽略NaN项）
+    """
+    high_2d, low_2d, close_2d = _as_2d(high), _as_2d(low), _as_2d(close)
+    prev_close = np.full_like(close_2d, np.nan)
+    prev_close[1:] = close_2d[:-1]
+
+    tr = np.fmax(
+        np.fmax(high_2d - low_2d, np.abs(high_2d - prev_close)),
+        np.abs(low_2d - prev_close)
+    )
+    return _restore_shape(tr, high)
+
+
+def _column_offset(data: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """每列首个有效值，用作累加前的平移量"""
+    first = valid.argmax(axis=0)
+    offset = data[first, np.arange(data.shape[1])]
+    return np.where(np.isnan(offset), 0.0, offset)
+
+
+def _window_sums(cumsum: np.ndarray, window: int) -> np.ndarray:
+    """由累加和计算长度为window的滑动窗口和，返回从第window-1行开始的结果"""
+    sums = cumsum[window - 1:].copy()
+    sums[1:] -= cumsum[:-window]
+    return sums
@@ -1,22 +1,115 @@
+import asyncio
 import json
+import os
+from contextlib import aclosing
 from datetime import datetime
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, Dict, Any, Optional, Tuple
 from utils.logger import get_logger
+from utils.checkpoint import JSONCheckpoint
+from utils.executor import get_compute_executor, get_io_executor
+from utils.market_time import latest_session_date
+from utils.settings import EnvSetting
+from utils.top_k import StreamingTopK
+from services.indicator_index import refresh_daily_index
 from services.stock_data_provider import StockDataProvider
+from services.stock_data_store import DEFAULT_DATA_DIR
 from services.technical_indicator import TechnicalIndicator
 from services.stock_scorer import StockScorer
+from services.stock_screener import StockScreener
 from services.ai_analyzer import AIAnalyzer
+import numpy as np
 import pandas as pd
 
 # 获取日志器
 logger = get_logger()
 
+# 流水线阶段结束标记
+_STAGE_END = object()
+
+# 正在进行全市场扫描的市场，同一市场同时只允许一个扫描写检查点
+_running_universe_scans = set()
+
+
+def _analyze_chunk(indicator_params: Dict[str, Any], items: List[Tuple[str, pd.DataFrame]],
+                   tail: Optional[int] = None, extra_columns: Optional[List[str]] = None
+                   ) -> List[Tuple[str, Optional[pd.DataFrame], Optional[int], Optional[str], Optional[str]]]:
+    """
+    计算一批股票的技术指标和评分
+    在计算执行器（线程池或进程池）中运行，避免阻塞事件循环；
+    只计算评分和扫描结果所需的指标列
+    
+    Args:
+        indicator_params: 技术指标参数
+        items: (股票代码, 原始数据)列表
+        tail: 只计算最后tail行指标，默认计算全部行
+        extra_columns: 评分之外还需要计算的指标列（如选股表达式引用的列）
+        
+    Returns:
+        (股票代码, 含指标的DataFrame, 评分, 投资建议, 错误信息)列表；
+        指标计算失败时只有错误信息，评分失败时各项均为None
+    """
+    indicator = TechnicalIndicator(indicator_params)
+    scorer = StockScorer()
+    columns = list(StockScorer.REQUIRED_COLUMNS)
+    columns += [column for column in (extra_columns or []) if column not in columns]
+    frames: Dict[str, pd.DataFrame] = {}
+    errors: Dict[str, str] = {}
+    
+    for code, df in items:
+        try:
+            frames[code] = indicator.calculate_indicators_cached(df, columns=columns, tail=tail)
+        except Exception as e:
+            logger.error(f"计算 {code} 技术指标时出错: {str(e)}")
+            errors[code] = f"计算技术指标时出错: {str(e)}"
+    
+    # 整批股票的最新数据组成矩阵，一次完成评分和投资建议
+    scored_codes, values = scorer.latest_matrix(frames)
+    scores = scorer.score_matrix(values).tolist()
+    scored = dict(zip(scored_codes, zip(scores, scorer.get_recommendations(scores))))
+    
+    results = []
+    for code, _ in items:
+        if code in errors:
+            results.append((code, None, None, None, errors[code]))
+        elif code in scored:
+            score, rec = scored[code]
+            results.append((code, frames[code], score, rec, None))
+        else:
+            # 评分失败（已在latest_matrix中记录错误）
+            results.append((code, None, None, None, None))
+    
+    return results
+
 class StockAnalyzerService:
     """
     股票分析服务
     作为门面类协调数据提供、指标计算、评分和AI分析等组件
     """
     
+    # 批量扫描流水线各阶段之间的队列容量
+    PIPELINE_QUEUE_SIZE = 16
+    
+    # 批量扫描时每次提交到计算执行器的股票数
+    SCAN_CHUNK_SIZE = EnvSetting('SCAN_CHUNK_SIZE', '8')
+    
+    # 单只股票分析只需要最近若干行指标（AI分析使用最近14个交易日）
+    ANALYSIS_TAIL_ROWS = 14
+    
+    # 批量扫描评分和结果只使用最新两行指标
+    SCAN_TAIL_ROWS = 2
+    
+    # 批量扫描后进行AI分析的股票数（评分最高的几只），避免分析过多导致前端卡顿
+    AI_ANALYSIS_TOP_K = 5
+    
+    # 全市场扫描每批处理的股票数，每批完成后保存一次检查点
+    UNIVERSE_BATCH_SIZE = EnvSetting('UNIVERSE_SCAN_BATCH_SIZE', '200')
+    
+    # 全市场扫描保留的评分最高的股票数
+    UNIVERSE_TOP_K = EnvSetting('UNIVERSE_SCAN_TOP_K', '50')
+    
+    # 全市场扫描每批进度消息中附带的当前最高评分股票数
+    UNIVERSE_PROGRESS_TOP_K = 10
+    
     def __init__(self, custom_api_url=None, custom_api_key=None, custom_api_model=None, custom_api_timeout=None):
         """
         初始化股票分析服务
@@ -82,8 +175,10 @@ class StockAnalyzerService:
                 })
                 return
             
-            # 计算技术指标
-            df_with_indicators = self.indicator.calculate_indicators(df)
+            # 计算技术指标（在计算执行器中执行，避免阻塞事件循环），只计算分析用到的最近几行
+            df_with_indicators = await get_compute_executor().run(
+                self.indicator.calculate_indicators_cached, df, tail=self.ANALYSIS_TAIL_ROWS
+            )
             
             # 计算评分
             score = self.scorer.calculate_score(df_with_indicators)
@@ -192,7 +287,197 @@ class StockAnalyzerService:
             logger.exception(e)
             yield json.dumps({"error": error_msg})
     
-    async def scan_stocks(self, stock_codes: List[str], market_type: str = 'A', min_score: int = 0, stream: bool = False) -> AsyncGenerator[str, None]:
+    def _build_scan_result(self, code: str, df: pd.DataFrame, score: int, rec: str, matched: bool) -> Optional[Dict[str, Any]]:
+        """
+        生成批量扫描中单只股票的基本评分和推荐信息
+        
+        Args:
+            code: 股票代码
+            df: 包含技术指标的DataFrame
+            score: 评分
+            rec: 投资建议
+            matched: 是否符合条件（达到最低评分且通过筛选），符合条件的等待后续分析
+            
+        Returns:
+            结果字典，数据为空时返回None
+        """
+        if df is None or len(df) == 0:
+            return None
+        
+        # 获取最新数据
+        latest_data = df.iloc[-1]
+        previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+        
+        # 价格变动绝对值
+        price_change_value = latest_data['Close'] - previous_data['Close']
+        
+        # 获取涨跌幅
+        change_percent = latest_data.get('Change_pct')
+        
+        return {
+            "stock_code": code,
+            "score": score,
+            "recommendation": rec,
+            "price": float(latest_data.get('Close', 0)),
+            "price_change_value": float(price_change_value),  # 价格变动绝对值
+            "price_change": change_percent,  # 兼容旧版前端，传递涨跌幅
+            "change_percent": change_percent,  # 涨跌幅百分比，新字段
+            "rsi": float(latest_data.get('RSI', 0)) if 'RSI' in latest_data else None,
+            "ma_trend": "UP" if latest_data.get('MA5', 0) > latest_data.get('MA20', 0) else "DOWN",
+            "macd_signal": "BUY" if latest_data.get('MACD', 0) > latest_data.get('MACD_Signal', 0) else "SELL",
+            "volume_status": "HIGH" if latest_data.get('Volume_Ratio', 1) > 1.5 else ("LOW" if latest_data.get('Volume_Ratio', 1) < 0.5 else "NORMAL"),
+            "status": "waiting" if matched else "completed"
+        }
+    
+    def _build_screener(self, screen: Optional[str], rules: Optional[List[Tuple[str, float]]]
+                        ) -> Tuple[Optional[StockScreener], Optional[str]]:
+        """
+        编译选股表达式和加权评分规则，并校验引用的指标列
+        
+        Args:
+            screen: 选股表达式
+            rules: 加权评分规则列表，每项为 (条件表达式, 权重)
+            
+        Returns:
+            (选股器, 错误信息) 的元组；表达式和规则均为空时选股器为None，有效时错误信息为None
+        """
+        if not screen and not rules:
+            return None, None
+        try:
+            screener = StockScreener(screen, rules)
+            self.indicator.resolve_indicators(screener.columns)
+        except ValueError as e:
+            error_msg = f"选股表达式无效: {str(e)}"
+            logger.error(error_msg)
+            return None, error_msg
+        return screener, None
+    
+    @staticmethod
+    def _latest_values(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+        """取出DataFrame最新一行中选股所需的列，缺少的列记为NaN"""
+        return np.array([df[column].iat[-1] if column in df.columns else np.nan for column in columns],
+                        dtype=np.float64)
+    
+    @staticmethod
+    def _screen_latest(screener: StockScreener, latest: Dict[str, np.ndarray]) -> Dict[str, Tuple[bool, float]]:
+        """
+        在扫描结果的最新数据表上一次完成选股过滤和规则评分
+        
+        Args:
+            screener: 选股器
+            latest: 股票代码 -> 选股所需列的最新值
+            
+        Returns:
+            股票代码 -> (是否通过过滤, 规则得分)
+        """
+        if not latest:
+            return {}
+        table = pd.DataFrame(np.vstack(list(latest.values())), index=pd.Index(list(latest), name='Code'),
+                             columns=screener.columns)
+        mask, scores = screener.evaluate(table)
+        return dict(zip(table.index, zip(mask.tolist(), scores.tolist())))
+    
+    @staticmethod
+    def _rank_key(score: int, screen_score: float = 0.0) -> Tuple[float, int]:
+        """Top-K排序键：先按规则得分，再按评分；没有评分规则时规则得分均为0，即按评分排序"""
+        return screen_score, score
+    
+    async def _iter_scan_results(self, stock_codes: List[str], market_type: str, extra_columns: Optional[List[str]] = None,
+                                 raw_frames: Optional[Dict[str, pd.DataFrame]] = None
+                                 ) -> AsyncGenerator[Tuple[str, Optional[pd.DataFrame], Optional[int], Optional[str], Optional[str]], None]:
+        """
+        批量扫描流水线，按完成顺序逐只返回指标和评分结果
+        
+        Args:
+            stock_codes: 股票代码列表
+            market_type: 市场类型
+            extra_columns: 评分之外还需要计算的指标列（调用方已校验）
+            raw_frames: 不为None时，将获取到的原始数据按代码存入其中
+            
+        Returns:
+            异步生成器，生成与_analyze_chunk相同的结果元组
+        """
+        # 流水线：数据获取 -> 技术指标与评分 -> 输出，各阶段通过有界队列衔接，
+        # 前面的股票在计算指标和评分时，后面的股票仍在下载
+        fetch_queue: asyncio.Queue = asyncio.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        analysis_queue: asyncio.Queue = asyncio.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        executor = get_compute_executor()
+        
+        async def fetch_stage():
+            error = None
+            try:
+                async for code, df in self.data_provider.iter_multiple_stocks_data(stock_codes, market_type):
+                    await fetch_queue.put((code, df))
+            except Exception as e:
+                error = e
+            await fetch_queue.put((_STAGE_END, error))
+        
+        async def analyze_chunk(chunk, slots):
+            # 指标和评分按批提交到计算执行器，减少调度开销
+            try:
+                results = await executor.run(_analyze_chunk, self.indicator.params, chunk, self.SCAN_TAIL_ROWS, extra_columns)
+            except Exception as e:
+                logger.error(f"批量计算技术指标时出错: {str(e)}")
+                results = [(code, None, None, None, f"计算技术指标时出错: {str(e)}") for code, _ in chunk]
+            finally:
+                slots.release()
+            for result in results:
+                await analysis_queue.put(result)
+        
+        async def analysis_stage():
+            slots = asyncio.Semaphore(executor.max_workers)
+            running = []
+            end_item = None
+            try:
+                while end_item is None:
+                    item = await fetch_queue.get()
+                    if item[0] is _STAGE_END:
+                        end_item = item
+                        break
+                    
+                    # 取出队列中已到达的数据凑成一批，不等待后续数据
+                    chunk = [item]
+                    while len(chunk) < self.SCAN_CHUNK_SIZE and not fetch_queue.empty():
+                        item = fetch_queue.get_nowait()
+                        if item[0] is _STAGE_END:
+                            end_item = item
+                            break
+                        chunk.append(item)
+                    
+                    if raw_frames is not None:
+                        for code, df in chunk:
+                            raw_frames[code] = df
+                    
+                    await slots.acquire()
+                    running.append(asyncio.create_task(analyze_chunk(chunk, slots)))
+                
+                await asyncio.gather(*running)
+                await analysis_queue.put((_STAGE_END, end_item[1], None, None, None))
+            finally:
+                # 调用方提前结束时，已提交的批次任务可能阻塞在已满的输出队列上，需要一并取消
+                for task in running:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+        
+        stages = [asyncio.create_task(fetch_stage()), asyncio.create_task(analysis_stage())]
+        try:
+            while True:
+                result = await analysis_queue.get()
+                if result[0] is _STAGE_END:
+                    if result[1] is not None:
+                        raise result[1]
+                    break
+                yield result
+        finally:
+            for stage in stages:
+                if not stage.done():
+                    stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+    
+    async def scan_stocks(self, stock_codes: List[str], market_type: str = 'A', min_score: int = 0, stream: bool = False,
+                          screen: Optional[str] = None, rules: Optional[List[Tuple[str, float]]] = None
+                          ) -> AsyncGenerator[str, None]:
         """
         批量扫描股票
         
@@ -201,6 +486,9 @@ class StockAnalyzerService:
             market_type: 市场类型
             min_score: 最低评分阈值
             stream: 是否使用流式响应
+            screen: 选股表达式，如 "RSI between 55 and 70 AND Volume_Ratio > 1.5"，只有通过筛选的股票计入结果
+            rules: 加权评分规则列表，每项为 (条件表达式, 权重)，结果附带screen_score，
+                   并优先按screen_score选出进行AI分析的股票
             
         Returns:
             异步生成器，生成扫描结果的JSON字符串
@@ -208,74 +496,93 @@ class StockAnalyzerService:
         try:
             logger.info(f"开始批量扫描 {len(stock_codes)} 只股票, 市场: {market_type}")
             
+            # 选股表达式在扫描开始前校验：语法错误或引用了无法计算的列时直接返回错误
+            screener, error_msg = self._build_screener(screen, rules)
+            if error_msg:
+                yield json.dumps({"error": error_msg})
+                return
+            
             # 输出初始状态 - 发送批量分析初始化消息
             yield json.dumps({
                 "stream_type": "batch",
                 "stock_codes": stock_codes,
                 "market_type": market_type,
-                "min_score": min_score
+                "min_score": min_score,
+                "screen": screen,
+                "rules": rules
             })
             
-            # 批量获取股票数据
-            stock_data_dict = await self.data_provider.get_multiple_stocks_data(stock_codes, market_type)
-            
-            # 计算技术指标
-            stock_with_indicators = {}
-            for code, df in stock_data_dict.items():
-                try:
-                    stock_with_indicators[code] = self.indicator.calculate_indicators(df)
-                except Exception as e:
-                    logger.error(f"计算 {code} 技术指标时出错: {str(e)}")
-                    # 发送错误状态
-                    yield json.dumps({
-                        "stock_code": code,
-                        "error": f"计算技术指标时出错: {str(e)}",
-                        "status": "error"
-                    })
-            
-            # 评分股票
-            results = self.scorer.batch_score_stocks(stock_with_indicators)
-            
-            # 过滤低于最低评分的股票
-            filtered_results = [r for r in results if r[1] >= min_score]
-            
-            # 为每只股票发送基本评分和推荐信息
-            for code, score, rec in results:
-                df = stock_with_indicators.get(code)
-                if df is not None and len(df) > 0:
-                    # 获取最新数据
-                    latest_data = df.iloc[-1]
-                    previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+            # 输出阶段：每只股票完成后立即发送，只保留评分最高的几只用于AI分析，不保存和排序全部结果
+            # 需要AI分析时保留原始数据，供计算完整指标；未进入Top-K的随即释放
+            raw_frames: Optional[Dict[str, pd.DataFrame]] = {} if stream else None
+            top_stocks = StreamingTopK(self.AI_ANALYSIS_TOP_K)
+            total_scanned = 0
+            total_matched = 0
+            # 有选股条件时，先收集全部股票的最新数据，扫描结束后在整张表上一次完成筛选再输出
+            pending: List[Tuple[str, int, Dict[str, Any]]] = []
+            latest: Dict[str, np.ndarray] = {}
+            extra_columns = screener.columns if screener is not None else None
+            async with aclosing(self._iter_scan_results(stock_codes, market_type, extra_columns, raw_frames)) as results:
+                async for code, df, score, rec, error in results:
+                    if raw_frames is not None and (error is not None or df is None):
+                        raw_frames.pop(code, None)
+                    
+                    if error is not None:
+                        # 发送错误状态
+                        yield json.dumps({
+                            "stock_code": code,
+                            "error": error,
+                            "status": "error"
+                        })
+                        continue
                     
-                    # 价格变动绝对值
-                    price_change_value = latest_data['Close'] - previous_data['Close']
+                    if df is None:
+                        continue
                     
-                    # 获取涨跌幅
-                    change_percent = latest_data.get('Change_pct')
+                    total_scanned += 1
+                    if screener is not None:
+                        scan_result = self._build_scan_result(code, df, score, rec, False)
+                        if scan_result is not None:
+                            pending.append((code, score, scan_result))
+                            latest[code] = self._latest_values(df, screener.columns)
+                        if raw_frames is not None and (scan_result is None or score < min_score):
+                            raw_frames.pop(code, None)
+                        continue
                     
-                    # 发送股票基本信息和评分
-                    yield json.dumps({
-                        "stock_code": code,
-                        "score": score,
-                        "recommendation": rec,
-                        "price": float(latest_data.get('Close', 0)),
-                        "price_change_value": float(price_change_value),  # 价格变动绝对值
-                        "price_change": change_percent,  # 兼容旧版前端，传递涨跌幅
-                        "change_percent": change_percent,  # 涨跌幅百分比，新字段
-                        "rsi": float(latest_data.get('RSI', 0)) if 'RSI' in latest_data else None,
-                        "ma_trend": "UP" if latest_data.get('MA5', 0) > latest_data.get('MA20', 0) else "DOWN",
-                        "macd_signal": "BUY" if latest_data.get('MACD', 0) > latest_data.get('MACD_Signal', 0) else "SELL",
-                        "volume_status": "HIGH" if latest_data.get('Volume_Ratio', 1) > 1.5 else ("LOW" if latest_data.get('Volume_Ratio', 1) < 0.5 else "NORMAL"),
-                        "status": "completed" if score < min_score else "waiting"
-                    })
-            
-            # 如果需要进一步分析，对评分较高的股票进行AI分析
-            if stream and filtered_results:
-                # 只分析前5只评分最高的股票，避免分析过多导致前端卡顿
-                top_stocks = filtered_results[:5]
-                
-                for stock_code, score, _ in top_stocks:
-                    df = stock_with_indicators.get(stock_code)
+                    matched = score >= min_score
+                    if matched:
+                        total_matched += 1
+                        dropped = top_stocks.push(self._rank_key(score), code)
+                    else:
+                        dropped = code
+                    if dropped is not None and raw_frames is not None:
+                        raw_frames.pop(dropped, None)
+                    
+                    scan_result = self._build_scan_result(code, df, score, rec, matched)
+                    if scan_result is not None:
+                        yield json.dumps(scan_result)
+            
+            if screener is not None:
+                screened = self._screen_latest(screener, latest)
+                for code, score, scan_result in pending:
+                    passed, screen_score = screened[code]
+                    matched = score >= min_score and passed
+                    if screener.rules:
+                        scan_result['screen_score'] = screen_score
+                    if matched:
+                        total_matched += 1
+                        scan_result['status'] = 'waiting'
+                        dropped = top_stocks.push(self._rank_key(score, screen_score), code)
+                    else:
+                        dropped = code
+                    if dropped is not None and raw_frames is not None:
+                        raw_frames.pop(dropped, None)
+                    yield json.dumps(scan_result)
+            
+            # 如果需要进一步分析，对评分最高的几只股票进行AI分析
+            if stream:
+                for score, stock_code in top_stocks.items():
+                    df = raw_frames.get(stock_code)
                     if df is not None:
                         # 输出正在分析的股票信息
                         yield json.dumps({
@@ -283,6 +590,9 @@ class StockAnalyzerService:
                             "status": "analyzing"
                         })
                         
+                        # 扫描阶段只计算了评分所需的最新指标，AI分析前计算完整指标
+                        df = await get_compute_executor().run(self.indicator.calculate_indicators_cached, df, tail=self.ANALYSIS_TAIL_ROWS)
+                        
                         # AI分析
                         async for analysis_chunk in self.ai_analyzer.get_ai_analysis(df, stock_code, market_type, stream):
                             yield analysis_chunk
@@ -290,14 +600,190 @@ class StockAnalyzerService:
             # 输出扫描完成信息
             yield json.dumps({
                 "scan_completed": True,
-                "total_scanned": len(results),
-                "total_matched": len(filtered_results)
+                "total_scanned": total_scanned,
+                "total_matched": total_matched
             })
             
-            logger.info(f"完成批量扫描 {len(stock_codes)} 只股票, 符合条件: {len(filtered_results)}")
+            logger.info(f"完成批量扫描 {len(stock_codes)} 只股票, 符合条件: {total_matched}")
             
         except Exception as e:
             error_msg = f"批量扫描股票时出错: {str(e)}"
             logger.error(error_msg)
             logger.exception(e)
             yield json.dumps({"error": error_msg})
+    
+    @staticmethod
+    def _universe_checkpoint(market_type: str) -> JSONCheckpoint:
+        """全市场扫描的检查点，保存在数据目录下"""
+        data_dir = os.getenv('STOCK_DATA_DIR', DEFAULT_DATA_DIR)
+        return JSONCheckpoint(os.path.join(data_dir, 'scan_checkpoints', f'universe_{market_type}.json'))
+    
+    async def scan_universe(self, market_type: str = 'A', min_score: int = 0, screen: Optional[str] = None,
+                            resume: bool = True, rules: Optional[List[Tuple[str, float]]] = None
+                            ) -> AsyncGenerator[str, None]:
+        """
+        全市场扫描
+        
+        枚举市场的全部股票，按批执行批量扫描流水线，每批完成后把进度、计数和当前Top-K写入检查点；
+        中断后以相同参数在同一交易日重新调用，会跳过已完成的批次继续扫描。
+        不逐只输出结果，每批输出一次进度和当前评分最高的股票，结束后重建当日指标索引
+        
+        Args:
+            market_type: 市场类型
+            min_score: 最低评分阈值
+            screen: 选股表达式，只有通过筛选的股票计入结果；每批股票的最新数据组成一张表一次完成筛选
+            resume: 是否从未完成的检查点继续，False时重新开始
+            rules: 加权评分规则列表，每项为 (条件表达式, 权重)，Top-K优先按规则得分排序
+            
+        Returns:
+            异步生成器，生成进度和结果的JSON字符串
+        """
+        if market_type in _running_universe_scans:
+            yield json.dumps({"error": f"{market_type} 全市场扫描正在进行中"})
+            return
+        
+        _running_universe_scans.add(market_type)
+        try:
+            screener, error_msg = self._build_screener(screen, rules)
+            if error_msg:
+                yield json.dumps({"error": error_msg})
+                return
+            
+            checkpoint = self._universe_checkpoint(market_type)
+            params = {
+                "market_type": market_type,
+                "min_score": min_score,
+                "screen": screen,
+                # 规则按JSON的形式保存，与检查点中读回的参数比较
+                "rules": [[text, float(weight)] for text, weight in rules] if rules else None,
+                "session_date": latest_session_date(market_type).isoformat()
+            }
+            
+            # 只有同一交易日、相同参数且未完成的扫描才继续，否则重新开始
+            state = checkpoint.load() if resume else None
+            resumed = state is not None and state.get('status') == 'running' and state.get('params') == params
+            if not resumed:
+                codes = await self.data_provider.get_universe(market_type)
+                if not codes:
+                    yield json.dumps({"error": f"无法获取 {market_type} 全市场股票列表"})
+                    return
+                state = {
+                    "params": params,
+                    "codes": codes,
+                    # 批大小随检查点保存，继续扫描时批次边界保持不变
+                    "batch_size": self.UNIVERSE_BATCH_SIZE,
+                    "completed_batches": 0,
+                    "total_scanned": 0,
+                    "total_matched": 0,
+                    "total_errors": 0,
+                    "top": [],
+                    "status": "running",
+                    "started_at": datetime.now().isoformat()
+                }
+                await get_io_executor().run(checkpoint.save, state)
+            
+            codes = state['codes']
+            batch_size = state['batch_size']
+            batches = (len(codes) + batch_size - 1) // batch_size
+            
+            # 检查点中的Top-K按评分降序保存，按顺序重新加入可保持同分股票的先后次序
+            top_stocks = StreamingTopK(self.UNIVERSE_TOP_K)
+            for result in state['top']:
+                top_stocks.push(self._rank_key(result['score'], result.get('screen_score', 0.0)), result)
+            
+            logger.info(f"{'继续' if resumed else '开始'}全市场扫描 {market_type} {len(codes)} 只股票，"
+                        f"共 {batches} 批，已完成 {state['completed_batches']} 批")
+            yield json.dumps({
+                "stream_type": "universe",
+                "market_type": market_type,
+                "min_score": min_score,
+                "screen": screen,
+                "rules": params['rules'],
+                "session_date": params['session_date'],
+                "total": len(codes),
+                "batches": batches,
+                "completed_batches": state['completed_batches'],
+                "resumed": resumed
+            })
+            
+            for batch in range(state['completed_batches'], batches):
+                batch_codes = codes[batch * batch_size:(batch + 1) * batch_size]
+                candidates: List[Tuple[str, int, Dict[str, Any]]] = []
+                latest: Dict[str, np.ndarray] = {}
+                extra_columns = screener.columns if screener is not None else None
+                async with aclosing(self._iter_scan_results(batch_codes, market_type, extra_columns)) as results:
+                    async for code, df, score, rec, error in results:
+                        if error is not None:
+                            state['total_errors'] += 1
+                            continue
+                        if df is None:
+                            continue
+                        
+                        state['total_scanned'] += 1
+                        if score >= min_score:
+                            # 全市场扫描不做AI分析，结果直接标记为完成
+                            candidates.append((code, score, self._build_scan_result(code, df, score, rec, False)))
+                            if screener is not None:
+                                latest[code] = self._latest_values(df, screener.columns)
+                
+                # 整批达到最低评分的股票的最新数据组成一张表，一次完成筛选和规则评分
+                screened = self._screen_latest(screener, latest) if screener is not None else {}
+                for code, score, scan_result in candidates:
+                    passed, screen_score = screened.get(code, (True, 0.0))
+                    if not passed:
+                        continue
+                    state['total_matched'] += 1
+                    if scan_result is not None:
+                        if screener is not None and screener.rules:
+                            scan_result['screen_score'] = screen_score
+                        top_stocks.push(self._rank_key(score, screen_score), scan_result)
+                
+                state['completed_batches'] = batch + 1
+                state['top'] = [result for _, result in top_stocks.items()]
+                state['updated_at'] = datetime.now().isoformat()
+                await get_io_executor().run(checkpoint.save, state)
+                
+                yield json.dumps({
+                    "stream_type": "universe_progress",
+                    "completed_batches": batch + 1,
+                    "batches": batches,
+                    "processed": min((batch + 1) * batch_size, len(codes)),
+                    "total": len(codes),
+                    "total_scanned": state['total_scanned'],
+                    "total_matched": state['total_matched'],
+                    "total_errors": state['total_errors'],
+                    "top": state['top'][:self.UNIVERSE_PROGRESS_TOP_K]
+                })
+            
+            state['status'] = 'completed'
+            state['completed_at'] = datetime.now().isoformat()
+            await get_io_executor().run(checkpoint.save, state)
+            
+            # 全市场数据已刷新到本地存储，重建当日指标索引
+            index_info = None
+            try:
+                index = await get_io_executor().run(refresh_daily_index, market_type)
+                if index is not None:
+                    index_info = {"date": str(index.as_of), "size": len(index)}
+            except Exception as e:
+                logger.warning(f"⚠️  [指标索引] 全市场扫描后建立{market_type}索引失败: {str(e)}")
+            
+            yield json.dumps({
+                "scan_completed": True,
+                "total": len(codes),
+                "total_scanned": state['total_scanned'],
+                "total_matched": state['total_matched'],
+                "total_errors": state['total_errors'],
+                "top": state['top'],
+                "index": index_info
+            })
+            
+            logger.info(f"完成全市场扫描 {market_type} {len(codes)} 只股票, 符合条件: {state['total_matched']}")
+            
+        except Exception as e:
+            error_msg = f"全市场扫描时出错: {str(e)}"
+            logger.error(error_msg)
+            logger.exception(e)
+            yield json.dumps({"error": error_msg})
+        finally:
+            _running_universe_scans.discard(market_type)
@@ -1,21 +1,174 @@
+import os
+import random
+import threading
 import pandas as pd
+import time
 from datetime import datetime, timedelta
 import asyncio
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, AsyncGenerator
 from utils.logger import get_logger
+from utils.cache import LRUCache
+from utils.concurrency import SingleFlight, AdaptiveLimiter
+from utils.executor import get_io_executor, get_process_executor
+from utils.settings import EnvSetting
+from utils.market_time import session_close, latest_session_date, next_session_start, market_now, TRADING_SESSIONS
+from services.stock_data_store import StockDataStore, get_default_store
+from services.indicator_index import get_index, refresh_daily_index
 
 # 获取日志器
 logger = get_logger()
 
+# 复权方式（前复权）
+ADJUST = 'qfq'
+
+# 进程内共享的行情数据缓存，所有StockDataProvider实例共用
+_data_cache: Optional[LRUCache] = None
+_data_cache_lock = threading.Lock()
+
+
+def _get_data_cache() -> LRUCache:
+    """获取行情数据缓存，容量可通过环境变量 STOCK_DATA_CACHE_MB 配置，默认256MB"""
+    global _data_cache
+    
+    with _data_cache_lock:
+        if _data_cache is None:
+            _data_cache = LRUCache(
+                max_bytes=int(os.getenv('STOCK_DATA_CACHE_MB', '256')) * 1024 * 1024,
+                name="stock_data"
+            )
+        return _data_cache
+
+# 相同请求的并发合并，同一只股票同时只向数据源发起一次请求
+_data_single_flight = SingleFlight(name="stock_data")
+
+# 各市场最近一次全市场快照的时间戳
+_snapshot_timestamps: Dict[str, float] = {}
+
+# 各市场共享的上游请求自适应并发限制器，所有批量请求共用同一份AIMD状态
+_upstream_limiters: Dict[str, AdaptiveLimiter] = {}
+_upstream_limiters_lock = threading.Lock()
+
+# 进程池工作进程中收集的上游请求结果，随数据一起传回主进程记录到限制器
+_upstream_outcomes = threading.local()
+
+def get_data_fetch_backend() -> str:
+    """
+    获取数据获取后端，通过环境变量 DATA_FETCH_BACKEND 配置：
+    thread（线程池，默认）或process（进程池，获取与标准化在工作进程中执行）
+    """
+    return os.getenv('DATA_FETCH_BACKEND', 'thread').lower()
+
+
+def _pack_frame(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    将DataFrame压缩为数组形式，减少进程间传输的序列化开销
+    
+    数值列合并为一个二维float64数组，其余列保留为对象数组
+    """
+    numeric_columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    other_columns = [col for col in df.columns if col not in numeric_columns]
+    
+    return {
+        'index': df.index.to_numpy(),
+        'index_name': df.index.name,
+        'columns': list(df.columns),
+        'numeric_columns': numeric_columns,
+        'values': df[numeric_columns].to_numpy(dtype='float64') if numeric_columns else None,
+        'others': {col: df[col].to_numpy() for col in other_columns},
+        'error': getattr(df, 'error', None),
+        'attrs': dict(df.attrs),
+    }
+
+
+def _unpack_frame(payload: Dict[str, Any]) -> pd.DataFrame:
+    """将_pack_frame的结果还原为DataFrame"""
+    if payload['error'] is not None:
+        df = pd.DataFrame()
+        df.error = payload['error']
+        return df
+    
+    index = pd.Index(payload['index'], name=payload['index_name'])
+    if payload['values'] is not None:
+        df = pd.DataFrame(payload['values'], index=index, columns=payload['numeric_columns'])
+    else:
+        df = pd.DataFrame(index=index)
+    for col, values in payload['others'].items():
+        df[col] = values
+    df = df[payload['columns']]
+    df.attrs.update(payload['attrs'])
+    return df
+
+
+def _get_stock_data_packed(stock_code: str, market_type: str,
+                           start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    在工作进程中获取并标准化股票数据，返回压缩后的数组
+    工作进程各自创建数据提供者，共享同一个本地存储文件
+    """
+    provider = StockDataProvider()
+    _upstream_outcomes.calls = []
+    try:
+        payload = _pack_frame(provider._get_stock_data_sync(stock_code, market_type, start_date, end_date))
+        payload['upstream'] = _upstream_outcomes.calls
+    finally:
+        _upstream_outcomes.calls = None
+    return payload
+
 class StockDataProvider:
     """
     异步股票数据提供服务
     负责获取股票、基金等金融产品的历史数据
     """
     
-    def __init__(self):
-        """初始化数据提供者服务"""
-        logger.debug("初始化StockDataProvider")
+    # 本地数据未覆盖到收盘时，两次向上游同步增量数据的最小间隔（秒）
+    STORE_REFRESH_INTERVAL = 300
+    
+    # 未收盘数据的内存缓存有效期（秒）；收盘后同步的最终数据缓存至下一个交易时段开始
+    CACHE_TTL_TRADING = EnvSetting('STOCK_DATA_CACHE_TTL', '60')
+    
+    # 上游请求自适应并发的上限（不超过上游请求线程数）
+    MAX_CONCURRENCY = EnvSetting('DATA_FETCH_MAX_CONCURRENCY', '8')
+    
+    # 上游请求自适应并发的初始值
+    INITIAL_CONCURRENCY = 5
+    
+    # 批量获取失败重试的基础等待时间（秒），按指数退避并加入随机抖动
+    RETRY_BASE_DELAY = 0.5
+    
+    # 批量获取的股票数达到该值时，先用一次全市场快照刷新最新K线
+    SNAPSHOT_MIN_CODES = EnvSetting('STOCK_SNAPSHOT_MIN_CODES', '20')
+    
+    # 两次全市场快照之间的最小间隔（秒）
+    SNAPSHOT_INTERVAL = 60
+    
+    # 支持全市场快照的市场类型
+    SNAPSHOT_MARKETS = ('A',)
+    
+    # A股实时行情列名映射
+    A_SPOT_COLUMNS = {
+        '代码': 'Code',
+        '今开': 'Open',
+        '最新价': 'Close',
+        '最高': 'High',
+        '最低': 'Low',
+        '成交量': 'Volume',
+        '成交额': 'Amount',
+        '振幅': 'Amplitude',
+        '涨跌幅': 'Change_pct',
+        '涨跌额': 'Change',
+        '换手率': 'Turnover',
+        '昨收': 'Prev_close',
+    }
+    
+    def __init__(self, data_store: Optional[StockDataStore] = None):
+        """
+        初始化数据提供者服务
+        
+        Args:
+            data_store: 本地行情数据存储，默认使用进程内共享的存储（可通过环境变量关闭）
+        """
+        self.data_store = data_store if data_store is not None else get_default_store()
+        logger.debug(f"初始化StockDataProvider，本地存储: {'已启用' if self.data_store else '未启用'}")
     
     async def get_stock_data(self, stock_code: str, market_type: str = 'A', 
                             start_date: Optional[str] = None, 
@@ -32,21 +185,411 @@ class StockDataProvider:
         Returns:
             包含历史数据的DataFrame
         """
-        # 使用线程池执行同步的akshare调用
-        return await asyncio.to_thread(
-            self._get_stock_data_sync, 
-            stock_code, 
-            market_type, 
-            start_date, 
-            end_date
+        start_date, end_date = self._normalize_date_range(start_date, end_date)
+        
+        cached = self._get_cached(stock_code, market_type, start_date, end_date)
+        if cached is not None:
+            return cached
+        
+        return await self._load_stock_data(stock_code, market_type, start_date, end_date)
+    
+    async def _load_stock_data(self, stock_code: str, market_type: str,
+                               start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        缓存未命中时从本地存储或数据源加载数据，并写入内存缓存
+        并发的相同请求共享同一次加载；加载前在事件循环中等待市场共享的自适应并发名额，
+        被限流的请求不会占用执行器的线程
+        """
+        async def load():
+            limiter = self._get_upstream_limiter(market_type)
+            await limiter.acquire()
+            try:
+                if get_data_fetch_backend() == 'process':
+                    # 获取与标准化在工作进程中执行，避免pandas处理占用事件循环所在进程的GIL
+                    payload = await get_process_executor().run(
+                        _get_stock_data_packed,
+                        stock_code,
+                        market_type,
+                        start_date,
+                        end_date
+                    )
+                    for latency, success in payload['upstream']:
+                        limiter.record(latency, success)
+                    df = _unpack_frame(payload)
+                else:
+                    # 使用上游请求专用线程池执行同步的akshare调用
+                    df = await get_io_executor().run(
+                        self._get_stock_data_sync, 
+                        stock_code, 
+                        market_type, 
+                        start_date, 
+                        end_date
+                    )
+            finally:
+                limiter.release()
+            self._set_cached(stock_code, market_type, start_date, end_date, df)
+            return df
+        
+        df = await _data_single_flight.run(
+            self._cache_key(stock_code, market_type, start_date, end_date), load
+        )
+        
+        # 合并的调用方共享同一个结果，各自返回浅拷贝（保留出错数据的error属性）
+        return df if hasattr(df, 'error') else df.copy(deep=False)
+    
+    @staticmethod
+    def _cache_key(stock_code: str, market_type: str, start_date: str, end_date: str) -> Tuple:
+        """生成内存缓存键"""
+        return (stock_code, market_type, start_date, end_date, ADJUST)
+    
+    def _get_cached(self, stock_code: str, market_type: str,
+                    start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """读取内存缓存，返回浅拷贝以免调用方增删列影响缓存"""
+        df = _get_data_cache().get(self._cache_key(stock_code, market_type, start_date, end_date))
+        if df is None:
+            return None
+        logger.debug(f"命中行情数据缓存: {market_type} {stock_code} {start_date}-{end_date}")
+        return df.copy(deep=False)
+    
+    def _set_cached(self, stock_code: str, market_type: str,
+                    start_date: str, end_date: str, df: pd.DataFrame):
+        """写入内存缓存，空数据和出错的数据不缓存"""
+        if df.empty or hasattr(df, 'error'):
+            return
+        
+        _get_data_cache().set(
+            self._cache_key(stock_code, market_type, start_date, end_date),
+            df.copy(deep=False),
+            size=int(df.memory_usage(deep=True).sum()),
+            expires_at=self._cache_expires_at(market_type, df.attrs.get('synced_at'))
+        )
+    
+    def _cache_expires_at(self, market_type: str, synced_at: Optional[float]) -> float:
+        """
+        计算内存缓存的过期时间
+        
+        只有当前不处于当日开盘到收盘落库缓冲结束之间，且数据是在最近一个交易日收盘（含缓冲）之后
+        与上游同步的，才视为最终数据并缓存到下一个交易时段开始；否则按交易时段的短有效期缓存
+        
+        Args:
+            market_type: 市场类型
+            synced_at: 数据最近一次与上游同步的时间戳，未知时为None
+            
+        Returns:
+            过期时间戳
+        """
+        now = market_now(market_type)
+        sessions = TRADING_SESSIONS.get(market_type, TRADING_SESSIONS['A'])
+        today_open = datetime.combine(now.date(), sessions[0][0], tzinfo=now.tzinfo)
+        in_session = now.weekday() < 5 and today_open <= now < session_close(market_type, now)
+        settled_close = session_close(market_type, latest_session_date(market_type, now))
+        
+        if not in_session and synced_at is not None and synced_at >= settled_close.timestamp():
+            # 收盘后数据不再变化，缓存到下一个交易时段开始
+            return next_session_start(market_type, now).timestamp()
+        return time.time() + self.CACHE_TTL_TRADING
+    
+    @staticmethod
+    def get_cache_stats() -> Dict[str, Any]:
+        """获取行情数据缓存的命中、未命中和淘汰统计"""
+        return _get_data_cache().stats()
+    
+    @staticmethod
+    def get_single_flight_stats() -> Dict[str, Any]:
+        """获取并发请求合并统计"""
+        return _data_single_flight.stats()
+    
+    async def refresh_market_snapshot(self, market_type: str = 'A') -> int:
+        """
+        拉取一次全市场实时行情，批量更新本地历史数据中的当日K线
+        
+        Args:
+            market_type: 市场类型，目前支持'A'股
+            
+        Returns:
+            更新的股票数量
+        """
+        if self.data_store is None or market_type not in self.SNAPSHOT_MARKETS:
+            return 0
+        
+        last_snapshot = _snapshot_timestamps.get(market_type)
+        if last_snapshot is not None and time.time() - last_snapshot < self.SNAPSHOT_INTERVAL:
+            logger.debug(f"{market_type}全市场快照在 {self.SNAPSHOT_INTERVAL} 秒内已刷新，跳过")
+            return 0
+        
+        return await _data_single_flight.run(
+            ('snapshot', market_type),
+            lambda: get_io_executor().run(self._refresh_market_snapshot_sync, market_type)
         )
     
+    async def get_universe(self, market_type: str = 'A') -> List[str]:
+        """
+        获取全市场股票代码列表
+
+        支持全市场快照的市场从实时行情列表获取（停牌股票不在其中）；
+        其余市场或实时行情获取失败时，使用本地存储中已有数据的股票
+
+        Args:
+            market_type: 市场类型
+
+        Returns:
+            按代码排序的股票代码列表
+        """
+        if market_type in self.SNAPSHOT_MARKETS:
+            try:
+                spot_df = await get_io_executor().run(self._get_spot_data_sync, market_type)
+                return sorted(spot_df['Code'].unique().tolist())
+            except Exception as e:
+                logger.warning(f"⚠️  [全市场列表] 获取{market_type}实时行情失败，改用本地存储的股票列表: {str(e)}")
+
+        if self.data_store is None or not self.data_store.supports(market_type):
+            return []
+        return await get_io_executor().run(self.data_store.list_symbols, market_type)
+
+    def _refresh_market_snapshot_sync(self, market_type: str) -> int:
+        """
+        全市场快照的同步实现
+        将被异步方法调用
+        """
+        now = market_now(market_type)
+        if now.weekday() >= 5 or now.time() < TRADING_SESSIONS[market_type][0][0]:
+            # 开盘前或周末的快照仍是上一交易日数据，逐只增量拉取即可
+            logger.info(f"📸 [全市场快照] {market_type} 今日尚未开盘，跳过快照")
+            return 0
+        
+        try:
+            spot_df = self._get_spot_data_sync(market_type)
+        except Exception as e:
+            logger.warning(f"⚠️  [全市场快照] 获取{market_type}实时行情失败，改为逐只拉取: {str(e)}")
+            return 0
+        
+        _snapshot_timestamps[market_type] = time.time()
+        
+        updated_codes = set(self.data_store.upsert_latest_bars(market_type, spot_df, now.date()))
+        if updated_codes:
+            # 内存缓存中这些股票的数据已过期
+            invalidated = _get_data_cache().invalidate(
+                lambda key: key[1] == market_type and key[0] in updated_codes
+            )
+            logger.debug(f"全市场快照使 {invalidated} 条内存缓存失效")
+        
+        logger.info(f"📸 [全市场快照] {market_type} 快照共 {len(spot_df)} 只，更新本地数据 {len(updated_codes)} 只")
+        
+        close_time = session_close(market_type, now)
+        index = get_index(market_type, now.date())
+        if updated_codes and now >= close_time and (index is None or index.built_at < close_time):
+            # 收盘后的快照即当日最终K线，收盘后建立一次指标索引，覆盖收盘前建立的同日索引
+            try:
+                refresh_daily_index(market_type, self.data_store)
+            except Exception as e:
+                logger.warning(f"⚠️  [指标索引] 建立{market_type}当日索引失败: {str(e)}")
+        
+        return len(updated_codes)
+    
+    def _get_spot_data_sync(self, market_type: str = 'A') -> pd.DataFrame:
+        """
+        获取全市场实时行情并标准化
+        
+        Returns:
+            以股票代码为索引的DataFrame，列与标准化后的日线数据一致，另含Prev_close（昨收）
+        """
+        import akshare as ak
+        
+        logger.info(f"📈 [AKSHARE-A股] 调用 ak.stock_zh_a_spot_em()")
+        df = ak.stock_zh_a_spot_em()
+        logger.info(f"📊 [AKSHARE-A股] 实时行情数据形状: {df.shape}")
+        
+        df = df.rename(columns=self.A_SPOT_COLUMNS)[list(self.A_SPOT_COLUMNS.values())]
+        df['Code'] = df['Code'].astype(str)
+        
+        # 停牌或无成交的股票没有有效的最新价
+        df = df[pd.to_numeric(df['Close'], errors='coerce') > 0]
+        return df.set_index('Code', drop=False)
+    
     def _get_stock_data_sync(self, stock_code: str, market_type: str = 'A', 
                            start_date: Optional[str] = None, 
                            end_date: Optional[str] = None) -> pd.DataFrame:
         """
         同步获取股票数据的实现
-        将被异步方法调用
+        将被异步方法调用，优先读取本地存储，仅向上游拉取缺失的日期区间
+        """
+        if self.data_store is None or not StockDataStore.supports(market_type):
+            return self._fetch_with_sync_time(stock_code, market_type, start_date, end_date)
+        
+        start_date, end_date = self._normalize_date_range(start_date, end_date)
+        
+        try:
+            return self._get_stock_data_incremental(stock_code, market_type, start_date, end_date)
+        except Exception as e:
+            logger.warning(f"⚠️  [本地存储] 读取 {market_type} {stock_code} 本地数据失败，改为直接从数据源获取: {str(e)}")
+            return self._fetch_with_sync_time(stock_code, market_type, start_date, end_date)
+    
+    def _fetch_with_sync_time(self, stock_code: str, market_type: str,
+                              start_date: Optional[str], end_date: Optional[str]) -> pd.DataFrame:
+        """直接从上游获取数据，并在attrs中记录同步时间（请求发起的时间）"""
+        synced_at = time.time()
+        df = self._fetch_stock_data_sync(stock_code, market_type, start_date, end_date)
+        df.attrs['synced_at'] = synced_at
+        return df
+    
+    @staticmethod
+    def _normalize_date_range(start_date: Optional[str], end_date: Optional[str]) -> Tuple[str, str]:
+        """补全默认日期并统一为YYYYMMDD格式"""
+        if start_date is None:
+            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y%m%d')
+        return start_date.replace('-', ''), end_date.replace('-', '')
+    
+    def _is_store_fresh(self, meta: Dict[str, Any], market_type: str, end_date: str) -> bool:
+        """
+        判断本地数据是否无需向上游同步
+        
+        本地数据必须包含结束日期之前（含）最近一个已收盘交易日的K线；在此前提下，
+        最近一次同步发生在结束日期收盘之后，说明结束日期及之前的数据都已是最终数据；
+        否则（盘中或收盘前）在同步间隔内复用本地数据
+        """
+        end_close = session_close(market_type, pd.to_datetime(end_date, format='%Y%m%d'))
+        required = latest_session_date(market_type, min(market_now(market_type), end_close))
+        if meta['last_date'].date() < required:
+            return False
+        if meta['checked_at'] >= end_close.timestamp():
+            return True
+        return time.time() - meta['checked_at'] < self.STORE_REFRESH_INTERVAL
+    
+    def _get_stock_data_incremental(self, stock_code: str, market_type: str,
+                                    start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        基于本地存储的增量获取
+        
+        - 本地无数据或请求起点早于本地覆盖范围：全量拉取并替换本地数据，
+          拉取范围延伸到本地已有的最新日期，不会删除结束日期之后已保存的K线
+        - 本地数据未覆盖到结束日期收盘：从倒数第二根K线开始拉取增量并追加，
+          以重叠的K线校验复权基准，基准变化时同样全量重新拉取
+        """
+        store = self.data_store
+        meta = store.get_meta(market_type, stock_code)
+        start_dt = pd.to_datetime(start_date, format='%Y%m%d')
+        
+        if meta is None:
+            logger.info(f"💾 [本地存储] {market_type} {stock_code} 本地无数据，全量拉取")
+            df = self._fetch_with_sync_time(stock_code, market_type, start_date, end_date)
+            if not df.empty and not hasattr(df, 'error'):
+                store.save(market_type, stock_code, df, start_date=start_date, replace=True)
+            return df
+        
+        if start_dt < meta['start_date']:
+            logger.info(f"💾 [本地存储] {market_type} {stock_code} 本地数据未覆盖 {start_date}，全量拉取")
+            return self._refetch_full(stock_code, market_type, meta, start_date, end_date)
+        
+        # 本地数据最近一次与上游同步的时间，成功拉取后更新为本次请求发起的时间
+        synced_at = meta['checked_at']
+        if not self._is_store_fresh(meta, market_type, end_date):
+            # 倒数第二根K线已收盘，用作与上游数据的对齐锚点
+            anchor = store.load(market_type, stock_code, tail=2).iloc[0]
+            anchor_date = anchor.name
+            delta_start = anchor_date.strftime('%Y%m%d')
+            logger.info(f"💾 [本地存储] {market_type} {stock_code} 本地最新日期 {meta['last_date'].strftime('%Y-%m-%d')}，增量拉取 {delta_start} 到 {end_date}")
+            
+            fetch_started = time.time()
+            delta = self._fetch_stock_data_sync(stock_code, market_type, delta_start, end_date)
+            
+            if hasattr(delta, 'error'):
+                logger.warning(f"⚠️  [本地存储] 增量拉取失败，使用本地已有数据: {delta.error}")
+            elif delta.empty:
+                store.touch(market_type, stock_code)
+                synced_at = fetch_started
+            elif anchor_date not in delta.index or not self._same_price(anchor['Close'], delta.loc[anchor_date, 'Close']):
+                # 复权基准发生变化（如除权除息），历史价格需要整体重新拉取
+                logger.info(f"💾 [本地存储] {market_type} {stock_code} 复权基准变化，全量重新拉取")
+                return self._refetch_full(stock_code, market_type, meta, start_date, end_date)
+            else:
+                store.save(market_type, stock_code, delta)
+                synced_at = fetch_started
+        else:
+            logger.info(f"💾 [本地存储] {market_type} {stock_code} 本地数据已是最新，跳过上游请求")
+        
+        df = store.load(market_type, stock_code, start_date, end_date)
+        df.attrs['synced_at'] = synced_at
+        logger.info(f"✅ [本地存储] 读取{market_type}数据 {stock_code}, 数据点数: {len(df)}")
+        return df
+    
+    def _refetch_full(self, stock_code: str, market_type: str, meta: Dict[str, Any],
+                      start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        全量重新拉取并替换本地数据
+        
+        拉取范围覆盖本次请求与本地已有数据的并集，替换后本地数据不会比原来短
+        """
+        fetch_start = min(meta['start_date'].strftime('%Y%m%d'), start_date)
+        fetch_end = max(meta['last_date'].strftime('%Y%m%d'), end_date)
+        df = self._fetch_with_sync_time(stock_code, market_type, fetch_start, fetch_end)
+        if hasattr(df, 'error') or df.empty:
+            return df
+        self.data_store.save(market_type, stock_code, df, start_date=fetch_start, replace=True)
+        
+        result = self.data_store.load(market_type, stock_code, start_date, end_date)
+        result.attrs['synced_at'] = df.attrs['synced_at']
+        return result
+    
+    @staticmethod
+    def _same_price(stored: Any, fetched: Any, tolerance: float = 1e-6) -> bool:
+        """比较本地与上游的同一根K线价格是否一致"""
+        try:
+            stored, fetched = float(stored), float(fetched)
+        except (TypeError, ValueError):
+            return False
+        return abs(stored - fetched) <= tolerance * max(abs(stored), abs(fetched), 1.0)
+    
+    @classmethod
+    def _get_upstream_limiter(cls, market_type: str) -> AdaptiveLimiter:
+        """获取市场共享的上游请求并发限制器，上限不超过上游请求线程数"""
+        with _upstream_limiters_lock:
+            limiter = _upstream_limiters.get(market_type)
+            if limiter is None:
+                max_limit = max(1, min(cls.MAX_CONCURRENCY, get_io_executor().max_workers))
+                limiter = AdaptiveLimiter(
+                    initial_limit=min(cls.INITIAL_CONCURRENCY, max_limit),
+                    max_limit=max_limit,
+                    name=f"upstream_{market_type}"
+                )
+                _upstream_limiters[market_type] = limiter
+            return limiter
+    
+    @staticmethod
+    def get_upstream_limiter_stats() -> Dict[str, Any]:
+        """获取各市场上游请求并发限制器的统计"""
+        with _upstream_limiters_lock:
+            limiters = dict(_upstream_limiters)
+        return {market_type: limiter.stats() for market_type, limiter in limiters.items()}
+    
+    def _fetch_stock_data_sync(self, stock_code: str, market_type: str = 'A', 
+                               start_date: Optional[str] = None, 
+                               end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        从数据源获取数据，并把请求的成败和耗时记录到市场共享的自适应并发限制器
+        限制器只统计上游请求本身，本地存储读取和排队时间不计入；
+        在进程池工作进程中执行时，结果随数据传回主进程再记录
+        """
+        started = time.monotonic()
+        success = False
+        try:
+            df = self._request_stock_data_sync(stock_code, market_type, start_date, end_date)
+            success = not hasattr(df, 'error')
+            return df
+        finally:
+            latency = time.monotonic() - started
+            calls = getattr(_upstream_outcomes, 'calls', None)
+            if calls is not None:
+                calls.append((latency, success))
+            else:
+                self._get_upstream_limiter(market_type).record(latency, success)
+    
+    def _request_stock_data_sync(self, stock_code: str, market_type: str = 'A', 
+                                 start_date: Optional[str] = None, 
+                                 end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        从数据源（akshare）获取并标准化股票数据
         """
         import akshare as ak
         
@@ -69,13 +612,13 @@ class StockDataProvider:
         
         try:
             if market_type == 'A':
-                logger.info(f"📈 [AKSHARE-A股] 调用 ak.stock_zh_a_hist(symbol={stock_code}, start_date={start_date}, end_date={end_date}, adjust='qfq')")
+                logger.info(f"📈 [AKSHARE-A股] 调用 ak.stock_zh_a_hist(symbol={stock_code}, start_date={start_date}, end_date={end_date}, adjust='{ADJUST}')")
                 
                 df = ak.stock_zh_a_hist(
                     symbol=stock_code,
                     start_date=start_date,
                     end_date=end_date,
-                    adjust="qfq"
+                    adjust=ADJUST
                 )
                 
                 # 🔍 添加A股原始数据日志
@@ -97,10 +640,10 @@ class StockDataProvider:
                     return pd.DataFrame()
                 
             elif market_type in ['HK']:
-                logger.info(f"📈 [AKSHARE-港股] 调用 ak.stock_hk_daily(symbol={stock_code}, adjust='qfq')")
+                logger.info(f"📈 [AKSHARE-港股] 调用 ak.stock_hk_daily(symbol={stock_code}, adjust='{ADJUST}')")
                 df = ak.stock_hk_daily(
                     symbol=stock_code,
-                    adjust="qfq"
+                    adjust=ADJUST
                 )
                 
                 # 🔍 添加港股原始数据日志
@@ -159,11 +702,11 @@ class StockDataProvider:
                         logger.warning(f"⚠️  [AKSHARE-港股] 日期过滤出错: {str(e)}，使用原始数据")
                 
             elif market_type in ['US']:
-                logger.info(f"📈 [AKSHARE-美股] 调用 ak.stock_us_daily(symbol={stock_code}, adjust='qfq')")
+                logger.info(f"📈 [AKSHARE-美股] 调用 ak.stock_us_daily(symbol={stock_code}, adjust='{ADJUST}')")
                 try:
                     df = ak.stock_us_daily(
                         symbol=stock_code,
-                        adjust="qfq"
+                        adjust=ADJUST
                     )
                     
                     # 🔍 添加美股原始数据日志
@@ -400,7 +943,8 @@ class StockDataProvider:
                                      market_type: str = 'A',
                                      start_date: Optional[str] = None, 
                                      end_date: Optional[str] = None,
-                                     max_concurrency: int = 5) -> Dict[str, pd.DataFrame]:
+                                     max_concurrency: Optional[int] = None,
+                                     max_retries: int = 2) -> Dict[str, pd.DataFrame]:
         """
         异步批量获取多只股票数据
         
@@ -409,27 +953,108 @@ class StockDataProvider:
             market_type: 市场类型，默认为'A'股
             start_date: 开始日期，格式YYYYMMDD
             end_date: 结束日期，格式YYYYMMDD
-            max_concurrency: 最大并发数，默认为5
+            max_concurrency: 同时进行的加载数，默认为上游请求线程数
+            max_retries: 失败重试次数，默认为2
             
         Returns:
             字典，键为股票代码，值为对应的DataFrame
         """
-        # 使用信号量控制并发数
-        semaphore = asyncio.Semaphore(max_concurrency)
+        results = {
+            code: df
+            async for code, df in self.iter_multiple_stocks_data(
+                stock_codes, market_type, start_date, end_date, max_concurrency, max_retries
+            )
+        }
         
-        async def get_with_semaphore(code):
-            async with semaphore:
-                try:
-                    return code, await self.get_stock_data(code, market_type, start_date, end_date)
-                except Exception as e:
-                    logger.error(f"获取股票 {code} 数据时出错: {str(e)}")
-                    return code, None
+        # 保持输入顺序
+        return {code: results[code] for code in stock_codes if code in results}
+    
+    async def iter_multiple_stocks_data(self, stock_codes: List[str], 
+                                        market_type: str = 'A',
+                                        start_date: Optional[str] = None, 
+                                        end_date: Optional[str] = None,
+                                        max_concurrency: Optional[int] = None,
+                                        max_retries: int = 2) -> AsyncGenerator[Tuple[str, pd.DataFrame], None]:
+        """
+        异步批量获取多只股票数据，按完成顺序逐只返回
+        
+        缓存命中的股票最先返回；同时进行的加载不超过max_concurrency，
+        实际发往上游的请求再由市场共享的自适应并发限制器约束
+        （数据源健康时逐步提高，出错或延迟突增时成倍降低）；
+        失败的股票按指数退避加随机抖动重试，请求异常的股票不返回
+        
+        Args:
+            stock_codes: 股票代码列表
+            market_type: 市场类型，默认为'A'股
+            start_date: 开始日期，格式YYYYMMDD
+            end_date: 结束日期，格式YYYYMMDD
+            max_concurrency: 同时进行的加载数，默认为上游请求线程数
+            max_retries: 失败重试次数，默认为2
+            
+        Returns:
+            异步生成器，生成(股票代码, DataFrame)元组
+        """
+        # 先查内存缓存，命中的股票不占用并发名额
+        start_date, end_date = self._normalize_date_range(start_date, end_date)
+        cached_results = {}
+        for code in stock_codes:
+            cached = self._get_cached(code, market_type, start_date, end_date)
+            if cached is not None:
+                cached_results[code] = cached
         
-        # 创建异步任务
-        tasks = [get_with_semaphore(code) for code in stock_codes]
+        pending_codes = [code for code in stock_codes if code not in cached_results]
+        logger.info(f"批量获取 {len(stock_codes)} 只股票数据，缓存命中 {len(cached_results)} 只")
         
-        # 等待所有任务完成
-        results = await asyncio.gather(*tasks)
+        # 股票较多时先用一次全市场快照刷新最新K线，避免逐只增量请求
+        if len(pending_codes) >= self.SNAPSHOT_MIN_CODES and end_date == datetime.now().strftime('%Y%m%d'):
+            await self.refresh_market_snapshot(market_type)
+        
+        # 加载任务数只需填满上游请求线程池，上游请求本身由共享的自适应限制器约束
+        slots = asyncio.Semaphore(max_concurrency or get_io_executor().max_workers)
+        
+        async def get_with_retry(code):
+            df = None
+            for attempt in range(max_retries + 1):
+                success = False
+                async with slots:
+                    try:
+                        df = await self._load_stock_data(code, market_type, start_date, end_date)
+                        success = not hasattr(df, 'error')
+                    except Exception as e:
+                        logger.error(f"获取股票 {code} 数据时出错: {str(e)}")
+                
+                if success:
+                    return code, df
+                
+                if attempt < max_retries:
+                    # 指数退避加全量随机抖动，避免重试请求集中打到数据源
+                    delay = random.uniform(0, self.RETRY_BASE_DELAY * (2 ** attempt))
+                    logger.info(f"获取股票 {code} 数据失败，{delay:.2f} 秒后第 {attempt + 1} 次重试")
+                    await asyncio.sleep(delay)
+            
+            return code, df
+        
+        # 先启动所有获取任务，再返回缓存命中的数据
+        tasks = [asyncio.ensure_future(get_with_retry(code)) for code in pending_codes]
+        failed_codes = []
+        
+        try:
+            for code, df in cached_results.items():
+                yield code, df
+            
+            # 按完成顺序返回，下游可以立即处理先到达的数据
+            for next_done in asyncio.as_completed(tasks):
+                code, df = await next_done
+                if df is None or hasattr(df, 'error'):
+                    failed_codes.append(code)
+                if df is not None:
+                    yield code, df
+        finally:
+            # 调用方提前结束迭代时取消未完成的任务
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
         
-        # 构建结果字典，过滤掉失败的请求
-        return {code: df for code, df in results if df is not None}
\ No newline at end of file
+        if failed_codes:
+            logger.warning(f"批量获取数据重试 {max_retries} 次后仍失败的股票: {failed_codes}")
+        logger.info(f"批量获取完成，上游自适应并发统计: {self._get_upstream_limiter(market_type).stats()}")
\ No newline at end of file
@@ -0,0 +1,381 @@
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from typing import Dict, List, Optional, Any
+from utils.logger import get_logger
+from utils.market_time import previous_weekday
+
+# 获取日志器
+logger = get_logger()
+
+# 默认数据目录（与Docker部署中挂载的 /app/data 一致）
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+class StockDataStore:
+    """
+    本地行情数据存储
+    使用SQLite按市场分表保存标准化后的日线数据，支持按日期增量追加
+    """
+
+    # 各市场标准化后的数据列（与StockDataProvider的标准化结果一致）
+    MARKET_COLUMNS = {
+        'A': ['Code', 'Open', 'Close', 'High', 'Low', 'Volume', 'Amount', 'Amplitude', 'Change_pct', 'Change', 'Turnover'],
+        'ETF': ['Open', 'Close', 'High', 'Low', 'Volume', 'Amount', 'Amplitude', 'Change_pct', 'Change', 'Turnover'],
+        'LOF': ['Open', 'Close', 'High', 'Low', 'Volume', 'Amount', 'Amplitude', 'Change_pct', 'Change', 'Turnover'],
+        'HK': ['Open', 'High', 'Low', 'Close', 'Volume', 'Amount'],
+        'US': ['Open', 'High', 'Low', 'Close', 'Volume', 'Amount'],
+    }
+
+    # 各市场日期索引名称
+    INDEX_NAMES = {'A': 'Date', 'ETF': 'Date', 'LOF': 'Date', 'HK': 'date', 'US': 'date'}
+
+    # 文本类型的列，其余均按数值存储
+    TEXT_COLUMNS = {'Code'}
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化本地行情数据存储
+
+        Args:
+            db_path: SQLite数据库文件路径，默认为 data/stock_bars.db
+        """
+        self.db_path = db_path or os.path.join(DEFAULT_DATA_DIR, "stock_bars.db")
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        # 写操作串行化，读操作依赖SQLite的WAL模式并发执行
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+        logger.debug(f"初始化StockDataStore，数据库: {self.db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接（每次操作独立连接，保证线程安全）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self):
+        """创建数据表"""
+        with self._write_lock, self._connect() as conn:
+            for market, columns in self.MARKET_COLUMNS.items():
+                column_defs = ", ".join(
+                    f'"{col}" {"TEXT" if col in self.TEXT_COLUMNS else "REAL"}' for col in columns
+                )
+                conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS "bars_{market}" ('
+                    f'symbol TEXT NOT NULL, date TEXT NOT NULL, {column_defs}, '
+                    f'PRIMARY KEY (symbol, date))'
+                )
+            # 元数据表：记录每只股票已覆盖的日期范围和最近一次与上游同步的时间
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                'market TEXT NOT NULL, symbol TEXT NOT NULL, '
+                'start_date TEXT NOT NULL, first_date TEXT, last_date TEXT, '
+                'checked_at REAL NOT NULL, PRIMARY KEY (market, symbol))'
+            )
+
+    @classmethod
+    def supports(cls, market_type: str) -> bool:
+        """判断市场类型是否支持本地存储"""
+        return market_type in cls.MARKET_COLUMNS
+
+    @staticmethod
+    def _to_db_date(value: Any) -> str:
+        """将日期转换为数据库中的 YYYY-MM-DD 格式"""
+        if isinstance(value, str) and value.isdigit() and len(value) == 8:
+            return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+    def get_meta(self, market_type: str, stock_code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取股票的本地存储元数据
+
+        Args:
+            market_type: 市场类型
+            stock_code: 股票代码
+
+        Returns:
+            元数据字典（start_date, first_date, last_date为Timestamp，checked_at为时间戳），不存在时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT start_date, first_date, last_date, checked_at FROM meta WHERE market = ? AND symbol = ?',
+                (market_type, stock_code)
+            ).fetchone()
+
+        if row is None or row[2] is None:
+            return None
+
+        return {
+            'start_date': pd.Timestamp(row[0]),
+            'first_date': pd.Timestamp(row[1]),
+            'last_date': pd.Timestamp(row[2]),
+            'checked_at': row[3],
+        }
+
+    def list_symbols(self, market_type: str) -> List[str]:
+        """
+        列出本地存储中已有行情数据的股票代码
+
+        Args:
+            market_type: 市场类型
+
+        Returns:
+            按代码排序的股票代码列表
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT symbol FROM meta WHERE market = ? AND last_date IS NOT NULL ORDER BY symbol',
+                (market_type,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, market_type: str, stock_code: str,
+             start_date: Optional[str] = None,
+             end_date: Optional[str] = None,
+             tail: Optional[int] = None) -> pd.DataFrame:
+        """
+        读取本地存储的行情数据
+
+        Args:
+            market_type: 市场类型
+            stock_code: 股票代码
+            start_date: 开始日期，格式YYYYMMDD或YYYY-MM-DD
+            end_date: 结束日期，格式YYYYMMDD或YYYY-MM-DD
+            tail: 仅返回最近的N条记录
+
+        Returns:
+            以日期为索引、按日期升序排列的DataFrame
+        """
+        column_names = ", ".join(f'"{c}"' for c in self.MARKET_COLUMNS[market_type])
+        sql = f'SELECT date, {column_names} FROM "bars_{market_type}" WHERE symbol = ?'
+        params: List[Any] = [stock_code]
+
+        if start_date:
+            sql += ' AND date >= ?'
+            params.append(self._to_db_date(start_date))
+        if end_date:
+            sql += ' AND date <= ?'
+            params.append(self._to_db_date(end_date))
+
+        if tail:
+            sql = f'SELECT * FROM ({sql} ORDER BY date DESC LIMIT ?) ORDER BY date'
+            params.append(int(tail))
+        else:
+            sql += ' ORDER BY date'
+
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+
+        df['date'] = pd.to_datetime(df['date'])
+        df.set_index('date', inplace=True)
+        df.index.name = self.INDEX_NAMES[market_type]
+        return df
+
+    def load_tails(self, market_type: str, tail: int,
+                   end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        一次查询读取全市场每只股票最近的N条记录
+
+        Args:
+            market_type: 市场类型
+            tail: 每只股票返回的记录数
+            end_date: 结束日期，格式YYYYMMDD或YYYY-MM-DD，None表示不限
+
+        Returns:
+            长表DataFrame，包含symbol、date（Timestamp）和行情列，按 (symbol, date) 升序排列
+        """
+        column_names = ", ".join(f'"{c}"' for c in self.MARKET_COLUMNS[market_type])
+        where = ''
+        params: List[Any] = []
+        if end_date:
+            where = 'WHERE date <= ?'
+            params.append(self._to_db_date(end_date))
+        params.append(int(tail))
+
+        sql = (
+            f'SELECT symbol, date, {column_names} FROM ('
+            f'SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS rn '
+            f'FROM "bars_{market_type}" {where}) WHERE rn <= ? ORDER BY symbol, date'
+        )
+
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def save(self, market_type: str, stock_code: str, df: pd.DataFrame,
+             start_date: Optional[str] = None, replace: bool = False):
+        """
+        写入行情数据，已存在的日期会被覆盖
+
+        Args:
+            market_type: 市场类型
+            stock_code: 股票代码
+            df: 以日期为索引的标准化行情数据
+            start_date: 本次拉取请求的开始日期，用于记录本地数据覆盖的起点
+            replace: 是否先清空该股票的已有数据（复权基准变化时使用）
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            logger.warning(f"⚠️  [本地存储] {market_type} {stock_code} 数据不是日期索引，跳过写入")
+            return
+
+        columns = self.MARKET_COLUMNS[market_type]
+        data = df.reindex(columns=columns)
+        data = data.astype(object).where(pd.notna(data), None)
+        dates = df.index.strftime('%Y-%m-%d')
+        rows = [(stock_code, d, *values) for d, values in zip(dates, data.values.tolist())]
+
+        placeholders = ", ".join(["?"] * (len(columns) + 2))
+        column_names = ", ".join(f'"{c}"' for c in columns)
+
+        with self._write_lock, self._connect() as conn:
+            if replace:
+                conn.execute(f'DELETE FROM "bars_{market_type}" WHERE symbol = ?', (stock_code,))
+            conn.executemany(
+                f'INSERT OR REPLACE INTO "bars_{market_type}" (symbol, date, {column_names}) VALUES ({placeholders})',
+                rows
+            )
+            self._update_meta(conn, market_type, stock_code, start_date, replace)
+
+        logger.info(f"💾 [本地存储] 写入 {market_type} {stock_code} {len(rows)} 条记录{'（全量替换）' if replace else ''}")
+
+    def _update_meta(self, conn: sqlite3.Connection, market_type: str, stock_code: str,
+                     start_date: Optional[str], replace: bool):
+        """根据数据表内容刷新元数据"""
+        first_date, last_date = conn.execute(
+            f'SELECT MIN(date), MAX(date) FROM "bars_{market_type}" WHERE symbol = ?', (stock_code,)
+        ).fetchone()
+        if first_date is None:
+            return
+
+        existing = conn.execute(
+            'SELECT start_date FROM meta WHERE market = ? AND symbol = ?', (market_type, stock_code)
+        ).fetchone()
+
+        # 覆盖起点取本次请求起点与已有起点中较早者，全量替换时以本次请求为准
+        covered_from = self._to_db_date(start_date) if start_date else first_date
+        if existing is not None and not replace:
+            covered_from = min(covered_from, existing[0])
+        covered_from = min(covered_from, first_date)
+
+        conn.execute(
+            'INSERT OR REPLACE INTO meta (market, symbol, start_date, first_date, last_date, checked_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (market_type, stock_code, covered_from, first_date, last_date, time.time())
+        )
+
+    def upsert_latest_bars(self, market_type: str, bars: pd.DataFrame, bar_date: Any) -> List[str]:
+        """
+        用全市场快照批量更新已有历史数据的最新K线
+
+        只更新满足以下条件的股票，其余股票留给逐只增量拉取处理：
+        - 本地已有历史数据，且前一根K线不早于前一个工作日（不会产生缺口）
+        - 快照的昨收价与本地前一根K线收盘价一致（复权基准未变化，快照不是过期数据）
+
+        Args:
+            market_type: 市场类型
+            bars: 以股票代码为索引的快照数据，包含标准化的行情列及Prev_close列
+            bar_date: 快照对应的交易日
+
+        Returns:
+            已更新的股票代码列表
+        """
+        bar_day = pd.Timestamp(bar_date).date()
+        db_date = bar_day.strftime('%Y-%m-%d')
+        min_prev_date = previous_weekday(bar_day).strftime('%Y-%m-%d')
+
+        columns = self.MARKET_COLUMNS[market_type]
+        column_names = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join(["?"] * (len(columns) + 2))
+
+        rows = []
+        updated_codes = []
+        with self._connect() as conn:
+            stored_codes = {
+                row[0] for row in conn.execute('SELECT symbol FROM meta WHERE market = ?', (market_type,))
+            }
+            for code, bar in bars.iterrows():
+                if code not in stored_codes:
+                    continue
+
+                prev = conn.execute(
+                    f'SELECT date, "Close", "Volume" FROM "bars_{market_type}" '
+                    f'WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT 1',
+                    (code, db_date)
+                ).fetchone()
+                if prev is None or prev[0] < min_prev_date:
+                    continue
+
+                prev_close, close, volume = prev[1], bar.get('Prev_close'), bar.get('Volume')
+                if pd.isna(prev_close) or pd.isna(close) or abs(prev_close - close) > 1e-6 * max(abs(prev_close), 1.0):
+                    continue
+                if prev[2] is not None and pd.notna(volume) and prev[2] == volume and prev[1] == bar.get('Close'):
+                    # 与前一根K线完全相同，快照很可能停留在上一交易日
+                    continue
+
+                values = bar.reindex(columns)
+                values = values.astype(object).where(pd.notna(values), None).tolist()
+                rows.append((code, db_date, *values))
+                updated_codes.append(code)
+
+        if not rows:
+            return []
+
+        now = time.time()
+        with self._write_lock, self._connect() as conn:
+            conn.executemany(
+                f'INSERT OR REPLACE INTO "bars_{market_type}" (symbol, date, {column_names}) VALUES ({placeholders})',
+                rows
+            )
+            conn.executemany(
+                'UPDATE meta SET last_date = MAX(last_date, ?), checked_at = ? WHERE market = ? AND symbol = ?',
+                [(db_date, now, market_type, code) for code in updated_codes]
+            )
+
+        logger.info(f"💾 [本地存储] 全市场快照更新 {market_type} {len(updated_codes)} 只股票的 {db_date} K线")
+        return updated_codes
+
+    def touch(self, market_type: str, stock_code: str):
+        """更新最近一次与上游同步的时间（上游无新数据时调用）"""
+        with self._write_lock, self._connect() as conn:
+            conn.execute(
+                'UPDATE meta SET checked_at = ? WHERE market = ? AND symbol = ?',
+                (time.time(), market_type, stock_code)
+            )
+
+
+# 进程内共享的默认存储实例
+_default_store: Optional[StockDataStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> Optional[StockDataStore]:
+    """
+    获取默认的本地行情数据存储
+
+    通过环境变量 STOCK_DATA_STORE_ENABLED=false 可关闭本地存储，
+    STOCK_DATA_DIR 可指定数据目录
+
+    Returns:
+        StockDataStore实例，关闭或初始化失败时返回None
+    """
+    global _default_store
+
+    if os.getenv('STOCK_DATA_STORE_ENABLED', 'true').lower() in ('false', '0', 'no', 'off'):
+        return None
+
+    with _default_store_lock:
+        if _default_store is None:
+            data_dir = os.getenv('STOCK_DATA_DIR', DEFAULT_DATA_DIR)
+            try:
+                _default_store = StockDataStore(os.path.join(data_dir, "stock_bars.db"))
+            except Exception as e:
+                logger.error(f"初始化本地行情数据存储失败，将直接从数据源获取数据: {str(e)}")
+                return None
+        return _default_store
@@ -1,5 +1,7 @@
+import heapq
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Sequence
 from utils.logger import get_logger
 
 # 获取日志器
@@ -11,6 +13,16 @@ class StockScorer:
     负责根据技术指标计算股票的综合评分
     """
     
+    # 评分所需的技术指标列
+    REQUIRED_COLUMNS = ('MA5', 'MA20', 'MA60', 'RSI', 'MACD', 'Signal', 'Volume_Ratio')
+    
+    # 批量评分矩阵的列顺序
+    SCORE_COLUMNS = ('MA5', 'MA20', 'MA60', 'Close', 'RSI', 'MACD', 'Signal', 'Volume_Ratio')
+    
+    # 投资建议的评分下限，从高到低
+    RECOMMENDATION_LEVELS = ((80, "强烈推荐"), (70, "推荐"), (60, "谨慎推荐"), (40, "观望"), (20, "不推荐"))
+    LOWEST_RECOMMENDATION = "强烈不推荐"
+    
     def __init__(self):
         """初始化股票评分服务"""
         logger.debug("初始化StockScorer股票评分服务")
@@ -101,27 +113,188 @@ class StockScorer:
         else:
             return "强烈不推荐"
             
-    def batch_score_stocks(self, stock_dfs: Dict[str, pd.DataFrame]) -> List[Tuple[str, int, str]]:
+    def score_matrix(self, values: np.ndarray) -> np.ndarray:
         """
-        批量评分多只股票
+        向量化评分：一次计算N只股票的评分，规则与calculate_score完全一致
         
         Args:
-            stock_dfs: 字典，键为股票代码，值为DataFrame
+            values: 形状为 (N, 8) 的数组，列顺序为SCORE_COLUMNS；
+                    NaN与逐只评分时一样，使所有比较条件不成立
             
         Returns:
-            评分结果列表，每项为(股票代码, 评分, 推荐)的三元组
+            长度为N的整数评分数组
         """
-        results = []
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.SCORE_COLUMNS))
+        return self._score_arrays(*values.T).astype(np.int64)
+    
+    def score_history(self, df: pd.DataFrame) -> pd.Series:
+        """
+        计算每个交易日的评分（每一行都按calculate_score的规则评分）
         
+        Args:
+            df: 包含技术指标的DataFrame
+            
+        Returns:
+            与df索引对齐的int8评分序列
+        """
+        arrays = [df[column].to_numpy(dtype=np.float64) for column in self.SCORE_COLUMNS]
+        return pd.Series(self._score_arrays(*arrays), index=df.index, name='Score')
+    
+    def score_history_panel(self, panel: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        计算面板中每只股票每个交易日的评分
+        
+        Args:
+            panel: 列名 -> (日期数, 股票数) 数组，需包含SCORE_COLUMNS中的各列
+                   （可由TechnicalIndicator.calculate_panel的结果加上收盘价面板组成）
+            
+        Returns:
+            形状为 (日期数, 股票数) 的int8评分数组
+        """
+        arrays = [np.asarray(panel[column], dtype=np.float64) for column in self.SCORE_COLUMNS]
+        return self._score_arrays(*arrays)
+    
+    @staticmethod
+    def _score_arrays(ma5, ma20, ma60, close, rsi, macd, signal, volume_ratio) -> np.ndarray:
+        """
+        评分规则的向量化实现，各参数为形状相同的数组
+        
+        Returns:
+            同形状的int8评分数组（满分100，int8足够）
+        """
+        # 移动平均线评分（25分）
+        ma_score = np.select(
+            [(ma5 > ma20) & (ma20 > ma60), ma5 > ma20, close > ma20],
+            [25, 15, 10],
+            default=0
+        )
+        
+        # RSI评分（25分）
+        rsi_score = np.select(
+            [(45 <= rsi) & (rsi <= 55), (55 < rsi) & (rsi < 70), (30 < rsi) & (rsi < 45), rsi >= 70, rsi <= 30],
+            [15, 25, 10, 5, 15],
+            default=0
+        )
+        
+        # MACD得分（20分）
+        macd_score = np.where(macd > signal, 20, 0)
+        
+        # 成交量得分（30分）
+        volume_score = np.select([volume_ratio > 1.5, volume_ratio > 1], [30, 15], default=0)
+        
+        return (ma_score + rsi_score + macd_score + volume_score).astype(np.int8)
+    
+    def get_recommendations(self, scores: Sequence[int]) -> List[str]:
+        """
+        批量获取投资建议，阈值与get_recommendation一致
+        
+        Args:
+            scores: 评分序列
+            
+        Returns:
+            投资建议文本列表
+        """
+        scores = np.asarray(scores)
+        labels = np.select(
+            [scores >= threshold for threshold, _ in self.RECOMMENDATION_LEVELS],
+            [label for _, label in self.RECOMMENDATION_LEVELS],
+            default=self.LOWEST_RECOMMENDATION
+        )
+        return labels.tolist()
+    
+    def latest_matrix(self, stock_dfs: Dict[str, pd.DataFrame]) -> Tuple[List[str], np.ndarray]:
+        """
+        提取每只股票最新一行的评分字段，组成评分矩阵
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为包含技术指标的DataFrame
+            
+        Returns:
+            (股票代码列表, 形状为 (N, 8) 的数组) 的元组；数据为空或缺列的股票会被跳过并记录错误
+        """
+        codes = []
+        rows = []
         for stock_code, df in stock_dfs.items():
             try:
-                score = self.calculate_score(df)
-                recommendation = self.get_recommendation(score)
-                results.append((stock_code, score, recommendation))
+                rows.append([df[column].iat[-1] for column in self.SCORE_COLUMNS])
+                codes.append(stock_code)
             except Exception as e:
                 logger.error(f"评分股票 {stock_code} 时出错: {str(e)}")
-                
-        # 按评分降序排序
-        results.sort(key=lambda x: x[1], reverse=True)
         
-        return results 
\ No newline at end of file
+        return codes, np.array(rows, dtype=np.float64).reshape(-1, len(self.SCORE_COLUMNS))
+    
+    @staticmethod
+    def top_k_indices(scores: np.ndarray, k: int, min_score: Optional[float] = None) -> np.ndarray:
+        """
+        部分选择：返回评分最高的k个位置，按评分降序排列
+        
+        基于argpartition，复杂度O(N + k log k)；评分相同时位置靠前的优先，
+        结果与稳定降序排序后取前k个一致
+        
+        Args:
+            scores: 评分数组
+            k: 需要的个数
+            min_score: 最低评分，低于该值的不入选
+            
+        Returns:
+            位置索引数组
+        """
+        scores = np.asarray(scores)
+        candidates = np.arange(len(scores))
+        if min_score is not None:
+            candidates = candidates[scores >= min_score]
+        
+        if k <= 0 or len(candidates) == 0:
+            return candidates[:0]
+        
+        candidate_scores = scores[candidates]
+        if k < len(candidates):
+            # 第k大的评分，只保留不低于它的候选项再排序
+            kth = np.partition(candidate_scores, len(candidates) - k)[len(candidates) - k]
+            keep = candidate_scores >= kth
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+        
+        order = np.argsort(-candidate_scores, kind='stable')[:k]
+        return candidates[order]
+    
+    @staticmethod
+    def select_top_k(results: Sequence[Tuple[str, int, str]], k: int,
+                     min_score: Optional[int] = None) -> List[Tuple[str, int, str]]:
+        """
+        从评分结果中选出评分最高的k个，不对全部结果排序
+        
+        Args:
+            results: (股票代码, 评分, 推荐)列表
+            k: 需要的个数
+            min_score: 最低评分，低于该值的不入选
+            
+        Returns:
+            按评分降序排列的结果列表，评分相同时保持原顺序
+        """
+        if min_score is not None:
+            results = (r for r in results if r[1] >= min_score)
+        return heapq.nlargest(k, results, key=lambda x: x[1])
+    
+    def batch_score_stocks(self, stock_dfs: Dict[str, pd.DataFrame],
+                           top_k: Optional[int] = None) -> List[Tuple[str, int, str]]:
+        """
+        批量评分多只股票
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为DataFrame
+            top_k: 只返回评分最高的top_k只股票，默认返回全部
+            
+        Returns:
+            评分结果列表，每项为(股票代码, 评分, 推荐)的三元组，按评分降序排列
+        """
+        codes, values = self.latest_matrix(stock_dfs)
+        scores = self.score_matrix(values)
+        
+        if top_k is None:
+            # 按评分降序排序
+            order = np.argsort(-scores, kind='stable')
+        else:
+            order = self.top_k_indices(scores, top_k)
+        
+        selected = scores[order].tolist()
+        return list(zip([codes[i] for i in order], selected, self.get_recommendations(selected))) 
\ No newline at end of file
@@ -0,0 +1,378 @@
+import functools
+import operator
+import re
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class ScreenSyntaxError(ValueError):
+    """选股表达式语法错误"""
+
+
+# 词法规则：数字、标识符（指标列名或关键字）、运算符和括号
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>>=|<=|==|!=|<>|[<>=+\-*/()])
+    )''', re.VERBOSE)
+
+_KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN'}
+
+_COMPARISONS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+}
+
+_ARITHMETIC = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+}
+
+# 数值节点：table -> 数组或标量；条件节点：table -> (取值, 是否可判定)
+NumericNode = Callable[[Mapping[str, np.ndarray]], Any]
+ConditionNode = Callable[[Mapping[str, np.ndarray]], Tuple[Any, Any]]
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    """将表达式切分为 (类型, 文本) 列表，类型为number、ident、keyword或op"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise ScreenSyntaxError(f"无法识别的字符: {text[position:position + 10]!r}（位置 {position}）")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'ident' and value.upper() in _KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    递归下降解析器，将选股表达式编译为基于NumPy的向量化函数
+
+    语法（关键字不区分大小写）：
+        expr       := and_expr (OR and_expr)*
+        and_expr   := not_expr (AND not_expr)*
+        not_expr   := NOT not_expr | primary
+        primary    := comparison | '(' expr ')'
+        comparison := arith (BETWEEN arith AND arith | cmp_op arith)
+        arith      := term (('+' | '-') term)*
+        term       := unary (('*' | '/') unary)*
+        unary      := '-' unary | NUMBER | COLUMN | '(' arith ')'
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.columns: List[str] = []
+
+    def parse(self) -> ConditionNode:
+        if not self.tokens:
+            raise ScreenSyntaxError("选股表达式为空")
+        node = self._parse_or()
+        if self.position < len(self.tokens):
+            raise ScreenSyntaxError(f"多余的内容: {self.tokens[self.position][1]!r}")
+        return node
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _accept(self, kind: str, value: Optional[str] = None) -> Optional[str]:
+        token = self._peek()
+        if token is not None and token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return token[1]
+        return None
+
+    def _expect(self, kind: str, value: str):
+        if self._accept(kind, value) is None:
+            token = self._peek()
+            found = repr(token[1]) if token else '表达式结尾'
+            raise ScreenSyntaxError(f"期望 {value!r}，实际为 {found}")
+
+    def _parse_or(self) -> ConditionNode:
+        node = self._parse_and()
+        while self._accept('keyword', 'OR'):
+            node = _or(node, self._parse_and())
+        return node
+
+    def _parse_and(self) -> ConditionNode:
+        node = self._parse_not()
+        while self._accept('keyword', 'AND'):
+            node = _and(node, self._parse_not())
+        return node
+
+    def _parse_not(self) -> ConditionNode:
+        if self._accept('keyword', 'NOT'):
+            return _not(self._parse_not())
+        return self._parse_primary()
+
+    def _parse_primary(self) -> ConditionNode:
+        start = self.position
+        try:
+            return self._parse_comparison()
+        except ScreenSyntaxError:
+            # 括号既可以包裹算术表达式也可以包裹条件，比较解析失败时回溯按条件分组解析
+            if start >= len(self.tokens) or self.tokens[start] != ('op', '('):
+                raise
+        self.position = start + 1
+        node = self._parse_or()
+        self._expect('op', ')')
+        return node
+
+    def _parse_comparison(self) -> ConditionNode:
+        left = self._parse_arith()
+        if self._accept('keyword', 'BETWEEN'):
+            low = self._parse_arith()
+            self._expect('keyword', 'AND')
+            high = self._parse_arith()
+            return _and(_compare(operator.ge, left, low), _compare(operator.le, left, high))
+
+        token = self._peek()
+        if token is None or token[0] != 'op' or token[1] not in _COMPARISONS:
+            found = repr(token[1]) if token else '表达式结尾'
+            raise ScreenSyntaxError(f"期望比较运算符，实际为 {found}")
+        self.position += 1
+        return _compare(_COMPARISONS[token[1]], left, self._parse_arith())
+
+    def _parse_arith(self) -> NumericNode:
+        node = self._parse_term()
+        while True:
+            op = self._accept('op', '+') or self._accept('op', '-')
+            if op is None:
+                return node
+            node = _binary(_ARITHMETIC[op], node, self._parse_term())
+
+    def _parse_term(self) -> NumericNode:
+        node = self._parse_unary()
+        while True:
+            op = self._accept('op', '*') or self._accept('op', '/')
+            if op is None:
+                return node
+            node = _binary(_ARITHMETIC[op], node, self._parse_unary())
+
+    def _parse_unary(self) -> NumericNode:
+        if self._accept('op', '-'):
+            operand = self._parse_unary()
+            return lambda table: -operand(table)
+
+        number = self._accept('number')
+        if number is not None:
+            value = float(number)
+            return lambda table: value
+
+        column = self._accept('ident')
+        if column is not None:
+            if column not in self.columns:
+                self.columns.append(column)
+            return lambda table: table[column]
+
+        if self._accept('op', '('):
+            node = self._parse_arith()
+            self._expect('op', ')')
+            return node
+
+        token = self._peek()
+        found = repr(token[1]) if token else '表达式结尾'
+        raise ScreenSyntaxError(f"期望数字或指标列名，实际为 {found}")
+
+
+# 条件节点采用三值逻辑：任一操作数为NaN时比较结果不可判定，
+# AND/OR/NOT按Kleene规则传播，最终不可判定的股票不入选
+
+def _binary(func, left: NumericNode, right: NumericNode) -> NumericNode:
+    def node(table):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return func(left(table), right(table))
+    return node
+
+
+def _compare(func, left: NumericNode, right: NumericNode) -> ConditionNode:
+    def node(table):
+        a, b = left(table), right(table)
+        known = ~(np.isnan(a) | np.isnan(b))
+        with np.errstate(invalid='ignore'):
+            return func(a, b) & known, known
+    return node
+
+
+def _and(left: ConditionNode, right: ConditionNode) -> ConditionNode:
+    def node(table):
+        (a, known_a), (b, known_b) = left(table), right(table)
+        # 任一侧确定为假时结果确定为假
+        known = (known_a & known_b) | (known_a & ~a) | (known_b & ~b)
+        return a & b, known
+    return node
+
+
+def _or(left: ConditionNode, right: ConditionNode) -> ConditionNode:
+    def node(table):
+        (a, known_a), (b, known_b) = left(table), right(table)
+        # 任一侧确定为真时结果确定为真
+        known = (known_a & known_b) | a | b
+        return a | b, known
+    return node
+
+
+def _not(operand: ConditionNode) -> ConditionNode:
+    def node(table):
+        value, known = operand(table)
+        return ~value & known, known
+    return node
+
+
+class CompiledExpression:
+    """编译后的选股表达式"""
+
+    def __init__(self, text: str):
+        parser = _Parser(text)
+        self.text = text
+        self._node = parser.parse()
+        # 表达式引用的指标列，按出现顺序
+        self.columns: List[str] = parser.columns
+
+    def evaluate(self, table: Mapping[str, np.ndarray], size: int) -> np.ndarray:
+        """
+        在列数组表上计算布尔掩码
+
+        Args:
+            table: 列名 -> float64数组
+            size: 行数
+
+        Returns:
+            长度为size的布尔数组，不可判定的行为False
+        """
+        value, known = self._node(table)
+        return np.broadcast_to(np.asarray(value & known, dtype=bool), (size,))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(text: str) -> CompiledExpression:
+    """
+    编译选股表达式（相同表达式只编译一次）
+
+    Args:
+        text: 表达式，如 "RSI between 55 and 70 AND Volume_Ratio > 1.5 AND MA5 > MA20"
+
+    Returns:
+        CompiledExpression
+
+    Raises:
+        ScreenSyntaxError: 表达式语法错误
+    """
+    return CompiledExpression(text)
+
+
+class StockScreener:
+    """
+    声明式选股器
+    由一个过滤条件和若干加权评分规则组成，对全市场最新数据表一次完成向量化计算
+    """
+
+    def __init__(self, expression: Optional[str] = None,
+                 rules: Optional[Sequence[Tuple[str, float]]] = None):
+        """
+        初始化选股器
+
+        Args:
+            expression: 过滤条件表达式，None表示不过滤
+            rules: 加权评分规则列表，每项为 (条件表达式, 权重)，满足条件的股票得到对应权重
+
+        Raises:
+            ScreenSyntaxError: 表达式语法错误
+        """
+        self.filter = compile_expression(expression) if expression else None
+        self.rules = [(compile_expression(text), float(weight)) for text, weight in (rules or [])]
+
+        columns = list(self.filter.columns) if self.filter else []
+        for rule, _ in self.rules:
+            columns.extend(column for column in rule.columns if column not in columns)
+        # 过滤条件和评分规则引用的全部列
+        self.columns: List[str] = columns
+
+    def _column_arrays(self, table: pd.DataFrame) -> Dict[str, np.ndarray]:
+        missing = [column for column in self.columns if column not in table.columns]
+        if missing:
+            raise ValueError(f"数据表缺少选股所需的列: {', '.join(missing)}")
+        return {column: table[column].to_numpy(dtype=np.float64) for column in self.columns}
+
+    def evaluate(self, table: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算过滤掩码和规则得分
+
+        Args:
+            table: 最新数据表，每行一只股票，列为指标
+
+        Returns:
+            (布尔掩码, 规则得分) 的元组，均为长度等于行数的数组
+        """
+        arrays = self._column_arrays(table)
+        size = len(table)
+
+        mask = self.filter.evaluate(arrays, size) if self.filter else np.ones(size, dtype=bool)
+        scores = np.zeros(size)
+        for rule, weight in self.rules:
+            scores += weight * rule.evaluate(arrays, size)
+
+        return mask, scores
+
+    def screen(self, table: pd.DataFrame) -> pd.DataFrame:
+        """
+        选股：返回满足过滤条件的行，附加screen_score列；有评分规则时按得分降序排列
+
+        Args:
+            table: 最新数据表，每行一只股票，列为指标
+
+        Returns:
+            筛选后的数据表
+        """
+        mask, scores = self.evaluate(table)
+        result = table.loc[mask].assign(screen_score=scores[mask])
+        if self.rules:
+            result = result.sort_values('screen_score', ascending=False, kind='stable')
+        return result
+
+    @staticmethod
+    def latest_table(stock_dfs: Dict[str, pd.DataFrame], columns: Sequence[str]) -> pd.DataFrame:
+        """
+        将多只股票的最新一行组成数据表
+
+        Args:
+            stock_dfs: 字典，键为股票代码，值为包含指标的DataFrame
+            columns: 需要的列，股票缺少的列或空数据记为NaN
+
+        Returns:
+            以股票代码为索引的数据表
+        """
+        columns = list(columns)
+        codes = list(stock_dfs)
+        values = np.full((len(codes), len(columns)), np.nan)
+        for i, code in enumerate(codes):
+            df = stock_dfs[code]
+            if df is None or df.empty:
+                continue
+            for j, column in enumerate(columns):
+                if column in df.columns:
+                    values[i, j] = df[column].iat[-1]
+
+        return pd.DataFrame(values, index=pd.Index(codes, name='Code'), columns=columns)
@@ -1,16 +1,50 @@
+import itertools
+import json
+import os
+import threading
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Sequence, Hashable
+from pandas._libs.internals import BlockPlacement
+from pandas.core.internals import BlockManager
+from pandas.core.internals.blocks import new_block
 from utils.logger import get_logger
+from utils.cache import LRUCache
+from utils.settings import EnvSetting
+from services import indicator_kernels as kernels
 
 # 获取日志器
 logger = get_logger()
 
+# 进程内共享的技术指标结果缓存，按输入数据指纹命中
+_indicator_cache: Optional[LRUCache] = None
+_indicator_cache_lock = threading.Lock()
+
+
+def _get_indicator_cache() -> LRUCache:
+    """获取技术指标结果缓存，容量可通过环境变量 INDICATOR_CACHE_MB 配置，默认64MB"""
+    global _indicator_cache
+
+    with _indicator_cache_lock:
+        if _indicator_cache is None:
+            _indicator_cache = LRUCache(
+                max_bytes=int(os.getenv('INDICATOR_CACHE_MB', '64')) * 1024 * 1024,
+                name="indicators"
+            )
+        return _indicator_cache
+
 class TechnicalIndicator:
     """
     技术指标计算服务
     负责计算常见的股票技术指标
     """
     
+    # 尾部计算模式下EMA类指标（MACD）默认的预热行数
+    EMA_WARMUP = EnvSetting('INDICATOR_EMA_WARMUP', '120')
+    
+    # 原始价格数据列
+    RAW_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume', 'Amount', 'Change_pct', 'Code')
+    
     def __init__(self, params: Optional[Dict[str, Any]] = None):
         """
         初始化技术指标计算服务
@@ -30,6 +64,101 @@ class TechnicalIndicator:
         
         logger.debug(f"初始化TechnicalIndicator技术指标计算服务，参数: {self.params}")
     
+    def get_indicator_specs(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取指标注册表
+        
+        每个指标声明输出列、所需的原始数据列、依赖的其他指标和回看长度；
+        回看长度为计算最后一行精确结果所需的最少行数，EMA类指标的记忆无限长，记为None。
+        注册表的顺序即计算顺序和输出列顺序，依赖项总是排在前面
+        
+        Returns:
+            字典，键为指标名，值为指标说明
+        """
+        params = self.params
+        specs: Dict[str, Dict[str, Any]] = {}
+        
+        for name, period in params['ma_periods'].items():
+            specs[f'MA{period}'] = {
+                'outputs': [f'MA{period}'], 'inputs': ['Close'], 'depends': [], 'lookback': period
+            }
+        
+        specs['RSI'] = {
+            'outputs': ['RSI'], 'inputs': ['Close'], 'depends': [], 'lookback': params['rsi_period'] + 1
+        }
+        specs['MACD'] = {
+            'outputs': ['MACD', 'Signal', 'Histogram'], 'inputs': ['Close'], 'depends': [], 'lookback': None
+        }
+        specs['BB'] = {
+            'outputs': ['BB_Middle', 'BB_Upper', 'BB_Lower'], 'inputs': ['Close'], 'depends': [],
+            'lookback': params['bollinger_period']
+        }
+        specs['Volume_MA'] = {
+            'outputs': ['Volume_MA'], 'inputs': ['Volume'], 'depends': [], 'lookback': params['volume_ma_period']
+        }
+        specs['Volume_Ratio'] = {
+            'outputs': ['Volume_Ratio'], 'inputs': ['Volume'], 'depends': ['Volume_MA'],
+            'lookback': params['volume_ma_period']
+        }
+        specs['ATR'] = {
+            'outputs': ['ATR'], 'inputs': ['High', 'Low', 'Close'], 'depends': [], 'lookback': params['atr_period'] + 1
+        }
+        specs['Volatility'] = {
+            'outputs': ['Volatility'], 'inputs': ['Close'], 'depends': [], 'lookback': 20
+        }
+        
+        return specs
+    
+    def resolve_indicators(self, columns: Sequence[str]) -> List[str]:
+        """
+        根据需要的输出列解析出最少需要计算的指标（含依赖）
+        
+        Args:
+            columns: 需要的列名，原始数据列（如Close）会被忽略
+            
+        Returns:
+            按计算顺序排列的指标名列表
+            
+        Raises:
+            ValueError: 存在未知的列名
+        """
+        specs = self.get_indicator_specs()
+        producers = {output: name for name, spec in specs.items() for output in spec['outputs']}
+        
+        needed = set()
+        pending = []
+        for column in columns:
+            if column in producers:
+                pending.append(producers[column])
+            elif column not in self.RAW_COLUMNS:
+                raise ValueError(f"未知的技术指标列: {column}")
+        
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(specs[name]['depends'])
+        
+        return [name for name in specs if name in needed]
+    
+    def get_required_rows(self, indicators: Sequence[str], tail: int = 1, ema_warmup: Optional[int] = None) -> int:
+        """
+        计算最后tail行指标所需的数据行数
+        
+        Args:
+            indicators: 指标名列表
+            tail: 需要的结果行数
+            ema_warmup: EMA类指标的预热行数，默认为EMA_WARMUP
+            
+        Returns:
+            所需的数据行数
+        """
+        specs = self.get_indicator_specs()
+        warmup = self.EMA_WARMUP if ema_warmup is None else ema_warmup
+        lookbacks = [specs[name]['lookback'] for name in indicators]
+        lookback = max((warmup + 1 if lb is None else lb for lb in lookbacks), default=1)
+        return tail - 1 + lookback
+    
     def calculate_ema(self, series: pd.Series, period: int) -> pd.Series:
         """
         计算指数移动平均线
@@ -129,58 +258,438 @@ class TechnicalIndicator:
         
         return atr
     
-    def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
+    def calculate_indicators(self, df: pd.DataFrame, columns: Optional[Sequence[str]] = None,
+                             tail: Optional[int] = None, ema_warmup: Optional[int] = None) -> pd.DataFrame:
         """
-        计算所有技术指标
+        计算技术指标
         
         Args:
             df: 原始价格数据，包含Open, High, Low, Close, Volume列
+            columns: 需要的指标列，默认计算所有指标；指定时只计算这些列及其依赖
+            tail: 只计算并返回最后tail行，只截取各指标回看长度所需的数据；
+                  基于简单移动平均的指标结果精确，MACD等EMA类指标按预热行数近似
+            ema_warmup: 尾部模式下EMA类指标的预热行数，默认为EMA_WARMUP
             
         Returns:
-            添加了技术指标的DataFrame
+            添加了技术指标的DataFrame（尾部模式下只含最后tail行）
         """
+        if tail is not None:
+            return self._calculate_tail(df, columns, tail, ema_warmup)
+        
+        if columns is not None:
+            return self._calculate_selected(df, self.resolve_indicators(columns))
+        
         try:
-            # 复制数据框
-            result_df = df.copy()
+            # 指标列先收集起来，最后一次性拼接，避免逐列插入和复制原始数据
+            indicators: Dict[str, pd.Series] = {}
+            close = df['Close']
             
             # 移动平均线
             for name, period in self.params['ma_periods'].items():
-                result_df[f'MA{period}'] = result_df['Close'].rolling(window=period).mean()
+                indicators[f'MA{period}'] = close.rolling(window=period).mean()
             
             # RSI
-            result_df['RSI'] = self.calculate_rsi(result_df['Close'], self.params['rsi_period'])
+            indicators['RSI'] = self.calculate_rsi(close, self.params['rsi_period'])
             
             # MACD
-            macd, signal, histogram = self.calculate_macd(result_df['Close'])
-            result_df['MACD'] = macd
-            result_df['Signal'] = signal
-            result_df['Histogram'] = histogram
+            macd, signal, histogram = self.calculate_macd(close)
+            indicators['MACD'] = macd
+            indicators['Signal'] = signal
+            indicators['Histogram'] = histogram
             
             # 布林带
             middle, upper, lower = self.calculate_bollinger_bands(
-                result_df['Close'], 
+                close, 
                 self.params['bollinger_period'], 
                 self.params['bollinger_std']
             )
-            result_df['BB_Middle'] = middle
-            result_df['BB_Upper'] = upper
-            result_df['BB_Lower'] = lower
+            indicators['BB_Middle'] = middle
+            indicators['BB_Upper'] = upper
+            indicators['BB_Lower'] = lower
             
             # 成交量移动平均
-            result_df['Volume_MA'] = result_df['Volume'].rolling(window=self.params['volume_ma_period']).mean()
+            indicators['Volume_MA'] = df['Volume'].rolling(window=self.params['volume_ma_period']).mean()
             
             # 成交量比率
-            result_df['Volume_Ratio'] = result_df['Volume'] / result_df['Volume_MA']
+            indicators['Volume_Ratio'] = df['Volume'] / indicators['Volume_MA']
             
             # ATR
-            result_df['ATR'] = self.calculate_atr(result_df, self.params['atr_period'])
+            indicators['ATR'] = self.calculate_atr(df, self.params['atr_period'])
             
             # 波动率 (过去20天收盘价的标准差/均值)
-            result_df['Volatility'] = result_df['Close'].rolling(window=20).std() / result_df['Close'].rolling(window=20).mean() * 100
+            indicators['Volatility'] = close.rolling(window=20).std() / close.rolling(window=20).mean() * 100
             
-            return result_df
+            return self._join_indicators(df, pd.DataFrame(indicators, index=df.index))
             
         except Exception as e:
             logger.error(f"计算技术指标时出错: {str(e)}")
             logger.exception(e)
-            raise 
\ No newline at end of file
+            raise
+    
+    def calculate_indicators_fused(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        融合计算所有技术指标，结果与calculate_indicators一致
+        
+        收盘价、成交量、涨跌幅和真实波幅各只做一次累加和，
+        所有滚动均值和标准差都由共享的累加和得到，不再重复滚动计算
+        
+        Args:
+            df: 原始价格数据，包含Open, High, Low, Close, Volume列
+            
+        Returns:
+            添加了技术指标的DataFrame
+        """
+        return self._calculate_selected(df, list(self.get_indicator_specs()))
+    
+    def calculate_indicators_cached(self, df: pd.DataFrame, columns: Optional[Sequence[str]] = None,
+                                    tail: Optional[int] = None, ema_warmup: Optional[int] = None) -> pd.DataFrame:
+        """
+        带缓存的calculate_indicators：K线未变化时直接返回上次的计算结果
+        
+        缓存键是输入数据的指纹（行数、首尾日期、最新收盘价和成交量、列名）加上指标参数和计算选项，
+        计算开销与数据长度无关
+        
+        Args:
+            df: 原始价格数据
+            columns: 需要的指标列，默认计算所有指标
+            tail: 只计算并返回最后tail行
+            ema_warmup: 尾部模式下EMA类指标的预热行数
+            
+        Returns:
+            添加了技术指标的DataFrame（浅拷贝，调用方增删列不影响缓存）
+        """
+        key = self._fingerprint(df, columns, tail, ema_warmup)
+        if key is not None:
+            cached = _get_indicator_cache().get(key)
+            if cached is not None:
+                return cached.copy(deep=False)
+        
+        result_df = self.calculate_indicators(df, columns=columns, tail=tail, ema_warmup=ema_warmup)
+        
+        if key is not None:
+            _get_indicator_cache().set(key, result_df.copy(deep=False), size=int(result_df.memory_usage(deep=True).sum()))
+        return result_df
+    
+    def _fingerprint(self, df: pd.DataFrame, columns: Optional[Sequence[str]], tail: Optional[int],
+                     ema_warmup: Optional[int]) -> Optional[Hashable]:
+        """
+        生成输入数据的廉价指纹，空数据或缺少价格列时返回None（不缓存）
+        """
+        if df.empty or 'Close' not in df.columns or 'Volume' not in df.columns:
+            return None
+        
+        return (
+            len(df),
+            df.index[0],
+            df.index[-1],
+            float(df['Close'].iat[-1]),
+            float(df['Volume'].iat[-1]),
+            tuple(df.columns),
+            json.dumps(self.params, sort_keys=True),
+            None if columns is None else tuple(columns),
+            tail,
+            ema_warmup,
+        )
+    
+    @staticmethod
+    def get_cache_stats() -> Dict[str, Any]:
+        """获取技术指标缓存的命中、未命中和淘汰统计（进程池计算后端下只含本进程的统计）"""
+        return _get_indicator_cache().stats()
+    
+    def _calculate_tail(self, df: pd.DataFrame, columns: Optional[Sequence[str]], tail: int,
+                        ema_warmup: Optional[int]) -> pd.DataFrame:
+        """
+        尾部模式：截取最后若干行数据计算指标，只返回最后tail行
+        
+        Args:
+            df: 原始价格数据
+            columns: 需要的指标列，None表示所有指标
+            tail: 需要的结果行数
+            ema_warmup: EMA类指标的预热行数
+            
+        Returns:
+            最后tail行的指标DataFrame
+        """
+        if tail < 1:
+            raise ValueError(f"tail必须为正整数: {tail}")
+        
+        if columns is None:
+            indicators = list(self.get_indicator_specs())
+        else:
+            indicators = self.resolve_indicators(columns)
+        
+        rows = self.get_required_rows(indicators, tail, ema_warmup)
+        window = df.iloc[-rows:] if rows < len(df) else df
+        return self._calculate_selected(window, indicators).iloc[-tail:]
+    
+    def _calculate_selected(self, df: pd.DataFrame, indicators: List[str]) -> pd.DataFrame:
+        """
+        用融合路径计算指定的指标并添加到DataFrame
+        
+        Args:
+            df: 原始价格数据
+            indicators: 指标名列表（已含依赖）
+            
+        Returns:
+            添加了技术指标的DataFrame
+        """
+        try:
+            specs = self.get_indicator_specs()
+            input_columns = {column for name in indicators for column in specs[name]['inputs']}
+            inputs = {column: df[column].to_numpy(dtype=np.float64) for column in input_columns}
+            arrays = self._compute_indicator_arrays(inputs, indicators)
+            
+            # 所有指标列写入一个预分配的二维数组，作为单个数据块拼接到原始数据
+            block = np.empty((len(df), len(arrays)))
+            for i, values in enumerate(arrays.values()):
+                block[:, i] = values
+            
+            return self._join_indicators(df, pd.DataFrame(block, index=df.index, columns=list(arrays), copy=False))
+            
+        except Exception as e:
+            logger.error(f"融合计算技术指标时出错: {str(e)}")
+            logger.exception(e)
+            raise
+    
+    @staticmethod
+    def expand_param_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+        """
+        将参数网格展开为参数组合列表（笛卡尔积）
+        
+        Args:
+            grid: 参数名 -> 候选值列表，如 {'rsi_period': [6, 14], 'bollinger_std': [2, 2.5]}
+            
+        Returns:
+            参数覆盖项列表，可直接传给calculate_sweep
+        """
+        keys = list(grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    
+    def calculate_sweep(self, df: pd.DataFrame, param_sets: Sequence[Dict[str, Any]],
+                        columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict[str, Any]], List[str], np.ndarray]:
+        """
+        参数扫描：对同一只股票一次计算多组参数下的技术指标
+        
+        各组参数共享累加和、涨跌幅、真实波幅和MACD等与参数无关的中间结果，
+        相同窗口的滚动统计只计算一次
+        
+        Args:
+            df: 原始价格数据，包含High, Low, Close, Volume列
+            param_sets: 参数组合列表，每项是对self.params的覆盖（未给出的参数沿用self.params）；
+                        各组的ma_periods必须使用相同的键
+            columns: 需要的输出列，默认全部；均线列按ma_periods的键命名，如MA_short、MA_medium、MA_long
+            
+        Returns:
+            (完整参数列表, 输出列名列表, 形状为 (参数组数, 日期数, 列数) 的数组) 的元组
+            
+        Raises:
+            ValueError: 各组ma_periods的键不一致或存在未知的输出列
+        """
+        full_params = [{**self.params, **overrides} for overrides in param_sets]
+        ma_roles = list(self.params['ma_periods'])
+        for params in full_params:
+            if list(params['ma_periods']) != ma_roles:
+                raise ValueError(f"参数扫描要求各组ma_periods的键一致: {ma_roles}")
+        
+        # 输出列：均线按角色命名，其余沿用注册表中的列名
+        specs = self.get_indicator_specs()
+        output_names = [f'MA_{role}' for role in ma_roles]
+        ma_specs = {f'MA{period}' for period in self.params['ma_periods'].values()}
+        output_names += [output for name, spec in specs.items() if name not in ma_specs for output in spec['outputs']]
+        if columns is not None:
+            unknown = [column for column in columns if column not in output_names]
+            if unknown:
+                raise ValueError(f"未知的技术指标列: {', '.join(unknown)}")
+            output_names = list(columns)
+        
+        inputs = {column: df[column].to_numpy(dtype=np.float64) for column in ('Close', 'High', 'Low', 'Volume')}
+        shared: Dict[str, Any] = {}
+        result = np.empty((len(full_params), len(df), len(output_names)))
+        
+        for i, params in enumerate(full_params):
+            indicator = TechnicalIndicator(params)
+            # 角色名 -> 该组参数下的实际列名
+            column_map = {f'MA_{role}': f'MA{period}' for role, period in params['ma_periods'].items()}
+            source_columns = [column_map.get(column, column) for column in output_names]
+            
+            arrays = indicator._compute_indicator_arrays(inputs, indicator.resolve_indicators(source_columns), shared)
+            for j, column in enumerate(source_columns):
+                result[i, :, j] = arrays[column]
+        
+        return full_params, output_names, result
+    
+    @staticmethod
+    def _join_indicators(df: pd.DataFrame, indicator_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        将指标列拼接到原始数据右侧
+        
+        原始数据列不复制，结果与输入共享内存，指标数据保持为一个数据块；输入中已有的同名指标列会被替换。
+        pandas 2.2 的 concat 和逐列赋值都会合并或拆分数据块（复制数据），这里直接用两者已有的数据块组装结果
+        
+        Args:
+            df: 原始价格数据
+            indicator_df: 指标数据，索引与df相同
+            
+        Returns:
+            拼接后的DataFrame
+        """
+        # 浅拷贝只复制列索引，删除已有的指标列只拆分为视图，不影响输入本身
+        left = df.copy(deep=False)
+        for column in df.columns.intersection(indicator_df.columns):
+            del left[column]
+        
+        offset = len(left.columns)
+        blocks = list(left._mgr.blocks)
+        for block in indicator_df._mgr.blocks:
+            blocks.append(new_block(block.values, placement=BlockPlacement(block.mgr_locs.as_array + offset), ndim=2))
+        manager = BlockManager(tuple(blocks), [left.columns.append(indicator_df.columns), left.index])
+        return pd.DataFrame._from_mgr(manager, axes=manager.axes)
+    
+    def calculate_panel(self, close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                        volume: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        面板模式：用一组NumPy运算同时计算多只股票的技术指标
+        
+        输入为按日期对齐的二维数组，形状为 (日期数, 股票数)，未上市或停牌的日期填NaN；
+        对于连续无缺失的股票，结果与逐只调用calculate_indicators一致
+        
+        Args:
+            close: 收盘价面板
+            high: 最高价面板
+            low: 最低价面板
+            volume: 成交量面板
+            
+        Returns:
+            字典，键为指标列名（与calculate_indicators一致），值为同形状的二维数组
+        """
+        try:
+            inputs = {
+                'Close': np.asarray(close, dtype=np.float64),
+                'High': np.asarray(high, dtype=np.float64),
+                'Low': np.asarray(low, dtype=np.float64),
+                'Volume': np.asarray(volume, dtype=np.float64)
+            }
+            return self._compute_indicator_arrays(inputs, list(self.get_indicator_specs()))
+            
+        except Exception as e:
+            logger.error(f"面板模式计算技术指标时出错: {str(e)}")
+            logger.exception(e)
+            raise
+    
+    def _compute_indicator_arrays(self, inputs: Dict[str, np.ndarray], indicators: List[str],
+                                  shared: Optional[Dict[str, Any]] = None) -> Dict[str, np.ndarray]:
+        """
+        基于共享累加和计算指定的技术指标，输入为一维序列或 (日期数, 股票数) 面板
+        
+        Args:
+            inputs: 原始数据列名 -> 数组，只需包含所选指标声明的输入列
+            indicators: 指标名列表（已含依赖，按注册表顺序）
+            shared: 与参数无关的中间结果（累加和、涨跌幅、真实波幅、MACD），
+                    同一份输入用多组参数计算时传入同一个字典即可复用
+            
+        Returns:
+            字典，键为指标列名，值为与输入同形状的数组
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        selected = set(indicators)
+        close = inputs.get('Close')
+        shared = {} if shared is None else shared
+        
+        def shared_value(key: str, factory):
+            if key not in shared:
+                shared[key] = factory()
+            return shared[key]
+        
+        def close_sums() -> kernels.RollingSums:
+            return shared_value('close_sums', lambda: kernels.RollingSums(close))
+        
+        # 移动平均线
+        for name, period in self.params['ma_periods'].items():
+            if f'MA{period}' in selected:
+                arrays[f'MA{period}'] = close_sums().mean(period)
+        
+        # RSI：差分缺失时涨跌记为0（与calculate_rsi一致），但首个有效价格之前保持NaN
+        if 'RSI' in selected:
+            def gain_loss_sums():
+                delta = kernels.diff(close)
+                listed = np.maximum.accumulate(~np.isnan(close), axis=0)
+                gain = np.where(listed, np.where(delta > 0, delta, 0.0), np.nan)
+                loss = np.where(listed, np.where(delta < 0, -delta, 0.0), np.nan)
+                return kernels.RollingSums(gain), kernels.RollingSums(loss)
+            
+            gain_sums, loss_sums = shared_value('gain_loss_sums', gain_loss_sums)
+            rsi_period = self.params['rsi_period']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                arrays['RSI'] = 100 - (100 / (1 + gain_sums.mean(rsi_period) / loss_sums.mean(rsi_period)))
+        
+        # MACD（参数固定为12/26/9）
+        if 'MACD' in selected:
+            def macd_lines():
+                macd = kernels.ema(close, 12) - kernels.ema(close, 26)
+                return macd, kernels.ema(macd, 9)
+            
+            macd, signal = shared_value('macd', macd_lines)
+            arrays['MACD'] = macd
+            arrays['Signal'] = signal
+            arrays['Histogram'] = macd - signal
+        
+        # 布林带
+        if 'BB' in selected:
+            bb_period = self.params['bollinger_period']
+            middle = close_sums().mean(bb_period)
+            std = close_sums().std(bb_period)
+            arrays['BB_Middle'] = middle
+            arrays['BB_Upper'] = middle + self.params['bollinger_std'] * std
+            arrays['BB_Lower'] = middle - self.params['bollinger_std'] * std
+        
+        # 成交量移动平均与成交量比率
+        if 'Volume_MA' in selected:
+            volume_sums = shared_value('volume_sums', lambda: kernels.RollingSums(inputs['Volume']))
+            arrays['Volume_MA'] = volume_sums.mean(self.params['volume_ma_period'])
+        if 'Volume_Ratio' in selected:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                arrays['Volume_Ratio'] = inputs['Volume'] / arrays['Volume_MA']
+        
+        # ATR：真实波幅用逐元素fmax代替三列拼接后取最大值
+        if 'ATR' in selected:
+            tr_sums = shared_value(
+                'tr_sums', lambda: kernels.RollingSums(kernels.true_range(inputs['High'], inputs['Low'], close))
+            )
+            arrays['ATR'] = tr_sums.mean(self.params['atr_period'])
+        
+        # 波动率 (过去20天收盘价的标准差/均值)
+        if 'Volatility' in selected:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                arrays['Volatility'] = close_sums().std(20) / close_sums().mean(20) * 100
+        
+        return arrays
+    
+    @staticmethod
+    def build_panel(stock_dfs: Dict[str, pd.DataFrame],
+                    columns: Sequence[str] = ('Close', 'High', 'Low', 'Volume')) -> Tuple[pd.DatetimeIndex, List[str], Dict[str, np.ndarray]]:
+        """
+        将多只股票的DataFrame按日期对齐为面板数组
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为以日期为索引的DataFrame
+            columns: 需要提取的列
+            
+        Returns:
+            (日期索引, 股票代码列表, 列名 -> (日期数, 股票数)二维数组) 的元组
+        """
+        codes = [code for code, df in stock_dfs.items() if df is not None and not df.empty]
+        if not codes:
+            return pd.DatetimeIndex([]), [], {col: np.empty((0, 0)) for col in columns}
+        
+        dates = stock_dfs[codes[0]].index
+        for code in codes[1:]:
+            dates = dates.union(stock_dfs[code].index)
+        
+        panel = {}
+        for col in columns:
+            panel[col] = np.column_stack([
+                stock_dfs[code][col].reindex(dates).to_numpy(dtype=np.float64) for code in codes
+            ])
+        
+        return dates, codes, panel
+
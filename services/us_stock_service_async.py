@@ -1,7 +1,7 @@
-import asyncio
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from utils.logger import get_logger
+from utils.executor import get_io_executor
 
 # 获取日志器
 logger = get_logger()
@@ -33,8 +33,8 @@ class USStockServiceAsync:
         try:
             logger.info(f"异步搜索美股: {keyword}")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_us_stocks_data)
+            # 使用上游请求专用线程池执行同步的akshare调用
+            df = await get_io_executor().run(self._get_us_stocks_data)
             
             # 模糊匹配搜索
             mask = df['name'].str.contains(keyword, case=False, na=False)
@@ -115,8 +115,8 @@ class USStockServiceAsync:
         try:
             logger.info(f"获取美股详情: {symbol}")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_us_stocks_data)
+            # 使用上游请求专用线程池执行同步的akshare调用
+            df = await get_io_executor().run(self._get_us_stocks_data)
             
             # 精确匹配股票代码
             result = df[df['symbol'] == symbol]
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.backtester import ScoreBacktester
+from services.stock_data_store import StockDataStore
+
+
+def _loop_backtest(close, scores, valid, entry, exit_score, lag, cost=0.0):
+    """逐日逐股票的参考实现"""
+    T, N = close.shape
+    target = np.zeros((T, N))
+    for j in range(N):
+        state = 0.0
+        for t in range(T):
+            if valid[t, j]:
+                if scores[t, j] >= entry:
+                    state = 1.0
+                elif scores[t, j] < exit_score:
+                    state = 0.0
+            target[t, j] = state
+
+    held = np.zeros((T, N))
+    last_close = np.full(N, np.nan)
+    drifted = np.zeros(N)
+    net, turnover = [], []
+    for t in range(T):
+        weights = np.zeros(N)
+        returns = np.zeros(N)
+        for j in range(N):
+            # 调仓日停牌无法成交，沿用原有仓位
+            if t > 0 and np.isnan(close[t - 1, j]):
+                held[t, j] = held[t - 1, j]
+                weights[j] = drifted[j] if held[t, j] else 0.0
+            elif t >= lag:
+                held[t, j] = target[t - lag, j]
+            if not np.isnan(close[t, j]):
+                if not np.isnan(last_close[j]):
+                    returns[j] = close[t, j] / last_close[j] - 1
+                last_close[j] = close[t, j]
+        free = [j for j in range(N) if held[t, j] and not (t > 0 and np.isnan(close[t - 1, j]))]
+        frozen_total = weights.sum()
+        for j in free:
+            weights[j] = (1 - frozen_total) / len(free)
+        ret = sum(weights[j] * returns[j] for j in range(N))
+        traded = sum(abs(weights[j] - drifted[j]) for j in range(N))
+        drifted = weights * (1 + returns) / (1 + ret)
+        net.append(ret - cost * traded)
+        turnover.append(0.5 * traded)
+    return target, held, np.array(net), np.array(turnover)
+
+
+@pytest.mark.parametrize('lag', [1, 3])
+def test_run_matches_loop(lag):
+    rng = np.random.default_rng(lag)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, (60, 7)), axis=0))
+    close[:10, 2] = np.nan
+    close[30:33, 4] = np.nan
+    close[40:45, 5] = np.nan
+    scores = rng.choice([30, 50, 65, 75, 85], close.shape).astype(np.int8)
+    valid = ~np.isnan(close)
+
+    backtester = ScoreBacktester(entry_score=70, exit_score=60, lag=lag, cost=0.001)
+    result = backtester.run(close, scores)
+
+    target, held, net, turnover = _loop_backtest(close, scores, valid, 70, 60, lag, cost=0.001)
+    np.testing.assert_array_equal(backtester.positions(scores, valid), target)
+    np.testing.assert_array_equal(result['positions'].to_numpy(), held.sum(axis=1))
+    np.testing.assert_allclose(result['turnover'].to_numpy(), turnover, atol=1e-12)
+    np.testing.assert_allclose(result['equity'].to_numpy(), np.cumprod(1 + net))
+    assert result['summary']['max_drawdown'] == pytest.approx(result['drawdown'].min())
+    assert result['drawdown'].max() <= 0
+
+
+def test_frequent_suspensions_match_loop():
+    rng = np.random.default_rng(7)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, (120, 6)), axis=0))
+    close[rng.random(close.shape) < 0.2] = np.nan
+    scores = rng.choice([30, 75, 85], close.shape).astype(np.int8)
+    valid = ~np.isnan(close)
+
+    result = ScoreBacktester(entry_score=70, exit_score=60, cost=0.002).run(close, scores)
+
+    _, held, net, turnover = _loop_backtest(close, scores, valid, 70, 60, 1, cost=0.002)
+    np.testing.assert_allclose(result['turnover'].to_numpy(), turnover, atol=1e-12)
+    np.testing.assert_allclose(result['equity'].to_numpy(), np.cumprod(1 + net))
+
+
+def test_bucket_stats_and_turnover():
+    close = np.array([[10.0, 10.0], [11.0, 9.0], [12.0, 9.0], [12.0, 10.0]])
+    scores = np.array([[85, 10], [85, 65], [30, 65], [30, 65]], dtype=np.int8)
+
+    result = ScoreBacktester(entry_score=80, exit_score=40, horizons=(1,), cost=0.01).run(close, scores)
+
+    buckets = result['buckets']
+    assert list(buckets.index) == ['强烈推荐', '推荐', '谨慎推荐', '观望', '不推荐', '强烈不推荐']
+    assert buckets.loc['强烈推荐', 'count_1d'] == 2
+    assert buckets.loc['强烈推荐', 'return_1d'] == pytest.approx((0.1 + 1 / 11) / 2)
+    assert buckets.loc['强烈推荐', 'hit_rate_1d'] == 1.0
+    assert buckets.loc['谨慎推荐', 'hit_rate_1d'] == 0.5
+    assert buckets.loc['推荐', 'count_1d'] == 0
+
+    # 第0日收盘买入第一只，第2日收盘卖出
+    assert result['turnover'].tolist() == [0.0, 0.5, 0.0, 0.5]
+    assert result['equity'].iloc[-1] == pytest.approx((1.1 - 0.01) * (12 / 11) * (1 - 0.01))
+    assert result['entries']['entries'] == 1
+
+
+def test_turnover_counts_weight_drift():
+    # 两只股票一直持有，第1日涨跌不同，收盘再平衡到等权
+    close = np.array([[10.0, 10.0], [12.0, 8.0], [12.0, 8.0]])
+    scores = np.full(close.shape, 85, dtype=np.int8)
+
+    result = ScoreBacktester(entry_score=80, exit_score=40, cost=0.01).run(close, scores)
+
+    # 漂移后权重为 0.6/0.4，调回0.5/0.5需要双边成交0.2
+    assert result['turnover'].tolist() == pytest.approx([0.0, 0.5, 0.1])
+    assert result['equity'].iloc[-1] == pytest.approx((1 - 0.01) * (1 - 0.002))
+
+
+def test_suspension_carries_position_and_charges_gap():
+    close = np.array([[10.0], [10.0], [np.nan], [np.nan], [8.0], [8.0]])
+    # 停牌日的评分无效，持仓延续到复牌
+    scores = np.array([[85], [85], [0], [0], [85], [85]], dtype=np.int8)
+
+    result = ScoreBacktester(entry_score=80, exit_score=40).run(close, scores)
+
+    assert result['positions'].tolist() == [0, 1, 1, 1, 1, 1]
+    # 停牌期间的跌幅在复牌当日计入
+    assert result['equity'].tolist() == pytest.approx([1.0, 1.0, 1.0, 1.0, 0.8, 0.8])
+    assert result['turnover'].tolist() == [0.0, 0.5, 0.0, 0.0, 0.0, 0.0]
+
+
+def test_entry_stats_start_from_entry_bar():
+    close = np.array([[10.0], [10.0], [10.0], [20.0], [20.0]])
+    scores = np.array([[85], [65], [65], [65], [65]], dtype=np.int8)
+
+    result = ScoreBacktester(entry_score=80, exit_score=60, lag=3, horizons=(1,)).run(close, scores)
+
+    # 第0日的信号在第2日收盘成交
+    assert result['entries']['entries'] == 1
+    assert result['entries']['return_1d'] == pytest.approx(1.0)
+
+
+def test_invalid_thresholds():
+    with pytest.raises(ValueError):
+        ScoreBacktester(entry_score=50, exit_score=60)
+    with pytest.raises(ValueError):
+        ScoreBacktester(lag=0)
+
+
+def test_run_from_store(tmp_path):
+    store = StockDataStore(str(tmp_path / 'bars.db'))
+    rng = np.random.default_rng(0)
+    for i, length in enumerate([200, 150]):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        df = pd.DataFrame({
+            'Open': close, 'Close': close, 'High': close * 1.01, 'Low': close * 0.99,
+            'Volume': rng.integers(100_000, 1_000_000, length).astype(float),
+        }, index=pd.bdate_range(end='2024-06-28', periods=length, name='Date'))
+        store.save('A', f'00000{i}', df)
+
+    result = ScoreBacktester().run_from_store(market_type='A', start_date='20240101', store=store)
+
+    assert result['summary']['codes'] == ['000000', '000001']
+    assert result['summary']['days'] == len(pd.bdate_range('2024-01-01', '2024-06-28'))
+    assert result['buckets']['count_5d'].sum() > 0
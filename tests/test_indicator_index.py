@@ -0,0 +1,135 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import services.indicator_index as index_module
+from services.indicator_index import IndicatorIndex, build_index_from_store, get_index, publish_index
+from services.stock_data_store import StockDataStore
+from services.stock_scorer import StockScorer
+from services.technical_indicator import TechnicalIndicator
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(0)
+    size = 500
+    rsi = rng.choice([20.0, 30.0, 35.0, 40.0, 60.0, np.nan], size)
+    volume_ratio = rng.choice([0.5, 1.0, 2.0, 3.0, np.nan], size)
+    return pd.DataFrame({
+        'RSI': rsi,
+        'Volume_Ratio': volume_ratio,
+        'Volatility': rng.random(size),
+        'Score': rng.integers(0, 100, size),
+    }, index=pd.Index([f'{i:06d}' for i in range(size)], name='Code'))
+
+
+@pytest.mark.parametrize('conditions', [
+    {'RSI': (30, 40)},
+    {'RSI': (30, 40, 'neither'), 'Volume_Ratio': (2, None, 'neither')},
+    {'RSI': (30, 40, 'left'), 'Volume_Ratio': (2, None), 'Score': (None, 60, 'right')},
+    {'Volatility': (0.9, 0.1)},
+    {},
+])
+def test_query_matches_full_scan(table, conditions):
+    index = IndicatorIndex(table, as_of='2024-06-28')
+
+    mask = np.ones(len(table), dtype=bool)
+    for column, bounds in conditions.items():
+        low, high, inclusive = (tuple(bounds) + ('both',))[:3]
+        series = table[column]
+        mask &= series.between(-np.inf if low is None else low, np.inf if high is None else high, inclusive=inclusive)
+
+    assert index.query(conditions).index.tolist() == table.index[mask].tolist()
+
+
+def test_invalid_column_and_inclusive(table):
+    index = IndicatorIndex(table)
+
+    with pytest.raises(ValueError):
+        index.query({'MA5': (1, 2)})
+    with pytest.raises(ValueError):
+        index.range_positions('RSI', 1, 2, inclusive='all')
+
+
+def test_build_from_store_matches_per_symbol(tmp_path):
+    store = StockDataStore(str(tmp_path / 'bars.db'))
+    rng = np.random.default_rng(1)
+    frames = {}
+    for i, length in enumerate([300, 150, 90, 200]):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        df = pd.DataFrame({
+            'Open': close, 'Close': close, 'High': close * 1.01, 'Low': close * 0.99,
+            'Volume': rng.integers(100_000, 1_000_000, length).astype(float),
+        }, index=pd.bdate_range(end='2024-06-28', periods=length, name='Date'))
+        if i == 1:
+            # 中途停牌
+            df = df.drop(df.index[-40:-30])
+        if i == 3:
+            # 最新交易日停牌，不进入当日索引
+            df = df.iloc[:-1]
+        frames[f'00000{i}'] = df
+        store.save('A', f'00000{i}', df)
+
+    index = build_index_from_store('A', store=store)
+
+    assert index.as_of == pd.Timestamp('2024-06-28').date()
+    assert index.table.index.tolist() == ['000000', '000001', '000002']
+
+    indicator = TechnicalIndicator()
+    rows = indicator.get_required_rows(list(indicator.get_indicator_specs()))
+    for code, row in index.table.iterrows():
+        expected = indicator.calculate_indicators(frames[code].iloc[-rows:])
+        for column in ('RSI', 'Volume_Ratio', 'Volatility', 'MACD', 'MA60'):
+            np.testing.assert_allclose(row[column], expected[column].iloc[-1], rtol=1e-9)
+        assert row['Score'] == StockScorer().calculate_score(expected)
+
+
+def _save_frames(store, ends):
+    rng = np.random.default_rng(2)
+    frames = {}
+    for i, end in enumerate(ends):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, 150)))
+        df = pd.DataFrame({
+            'Open': close, 'Close': close, 'High': close * 1.01, 'Low': close * 0.99,
+            'Volume': rng.integers(100_000, 1_000_000, 150).astype(float),
+        }, index=pd.bdate_range(end=end, periods=150, name='Date'))
+        frames[f'00000{i}'] = df
+        store.save('A', f'00000{i}', df)
+    return frames
+
+
+def test_build_from_store_anchors_to_session_date(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_module, 'latest_session_date', lambda market_type: date(2024, 6, 28))
+    store = StockDataStore(str(tmp_path / 'bars.db'))
+    # 000001 已写入下一交易日盘中的K线，000002 在2024-06-28停牌
+    frames = _save_frames(store, ['2024-06-28', '2024-07-01', '2024-06-27', '2024-06-28'])
+
+    index = build_index_from_store('A', store=store)
+
+    assert index.as_of == date(2024, 6, 28)
+    assert index.table.index.tolist() == ['000000', '000001', '000003']
+    indicator = TechnicalIndicator()
+    expected = indicator.calculate_indicators(frames['000001'].loc[:'2024-06-28'])
+    assert index.table.loc['000001', 'Close'] == expected['Close'].iloc[-1]
+    np.testing.assert_allclose(index.table.loc['000001', 'RSI'], expected['RSI'].iloc[-1], rtol=1e-9)
+
+    # 指定截止日期
+    assert build_index_from_store('A', store=store, end_date='20240627').table.index.tolist() == \
+        ['000000', '000001', '000002', '000003']
+    # 索引日期休市、没有任何K线时使用之前最近的交易日
+    monkeypatch.setattr(index_module, 'latest_session_date', lambda market_type: date(2024, 6, 29))
+    assert build_index_from_store('A', store=store).as_of == date(2024, 6, 28)
+
+
+def test_publish_keeps_latest(table):
+    for day in ('2024-06-26', '2024-06-27', '2024-06-28'):
+        publish_index('TEST', IndicatorIndex(table, as_of=day))
+
+    assert get_index('TEST').as_of == pd.Timestamp('2024-06-28').date()
+    assert get_index('TEST', '20240627').as_of == pd.Timestamp('2024-06-27').date()
+    assert get_index('TEST', '2024-01-01') is None
+    for bad in ('yesterday', '2024-13-01', ''):
+        with pytest.raises(ValueError):
+            get_index('TEST', bad)
@@ -0,0 +1,392 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import services.indicator_index as index_module
+import services.stock_data_provider as provider_module
+from services.indicator_index import IndicatorIndex, get_index, publish_index
+from services.stock_data_provider import StockDataProvider
+from services.stock_data_store import StockDataStore
+from utils.cache import LRUCache
+from utils.concurrency import AdaptiveLimiter, SingleFlight
+from utils.executor import get_io_executor
+from utils.market_time import get_market_timezone
+
+TZ = get_market_timezone('A')
+
+
+def _at(*args) -> datetime:
+    return datetime(*args, tzinfo=TZ)
+
+
+@pytest.mark.parametrize('now, synced_at, expected', [
+    # 收盘后落库缓冲期内拉取的数据不是最终数据
+    (_at(2024, 6, 28, 15, 10), _at(2024, 6, 28, 15, 10), None),
+    # 晚间读取14:59同步的本地数据
+    (_at(2024, 6, 28, 20, 0), _at(2024, 6, 28, 14, 59), None),
+    # 收盘缓冲后同步的数据缓存到下一个交易时段开始
+    (_at(2024, 6, 27, 20, 0), _at(2024, 6, 27, 15, 40), _at(2024, 6, 28, 9, 30)),
+    (_at(2024, 6, 29, 10, 0), _at(2024, 6, 28, 16, 0), _at(2024, 7, 1, 9, 30)),
+    # 开盘前读取上一交易日收盘后同步的数据
+    (_at(2024, 7, 1, 8, 0), _at(2024, 6, 28, 16, 0), _at(2024, 7, 1, 9, 30)),
+    # 盘中
+    (_at(2024, 7, 1, 10, 0), _at(2024, 7, 1, 10, 0), None),
+])
+def test_cache_expires_at(monkeypatch, now, synced_at, expected):
+    monkeypatch.setenv('STOCK_DATA_STORE_ENABLED', 'false')
+    monkeypatch.setattr(provider_module, 'market_now', lambda market_type='A': now)
+    provider = StockDataProvider()
+
+    expires_at = provider._cache_expires_at('A', synced_at.timestamp())
+
+    if expected is None:
+        assert expires_at == pytest.approx(time.time() + StockDataProvider.CACHE_TTL_TRADING, abs=5)
+    else:
+        assert expires_at == expected.timestamp()
+
+
+def test_upstream_limiter_is_shared_and_capped(monkeypatch):
+    monkeypatch.setenv('STOCK_DATA_STORE_ENABLED', 'false')
+    monkeypatch.setattr(provider_module, '_upstream_limiters', {})
+    monkeypatch.setattr(StockDataProvider, 'MAX_CONCURRENCY', 1000)
+
+    def request(self, code, market_type, start_date, end_date):
+        if code == 'bad':
+            df = pd.DataFrame()
+            df.error = 'upstream failed'
+            return df
+        return pd.DataFrame({'Close': [1.0]})
+
+    monkeypatch.setattr(StockDataProvider, '_request_stock_data_sync', request)
+
+    StockDataProvider()._fetch_stock_data_sync('000001', 'A')
+    StockDataProvider()._fetch_stock_data_sync('bad', 'A')
+    StockDataProvider()._fetch_stock_data_sync('000002', 'HK')
+
+    stats = StockDataProvider.get_upstream_limiter_stats()
+    assert stats['A']['successes'] == 1 and stats['A']['failures'] == 1
+    assert stats['HK']['successes'] == 1
+    assert provider_module._upstream_limiters['A'].max_limit == get_io_executor().max_workers
+
+    # 进程池后端在工作进程中收集结果，随数据传回主进程再记录
+    payload = provider_module._get_stock_data_packed('000003', 'A', '20240101', '20240628')
+    assert [success for _, success in payload['upstream']] == [True]
+    assert StockDataProvider.get_upstream_limiter_stats()['A']['successes'] == 1
+
+
+def test_adaptive_limiter_bounds_tasks():
+    limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+    peak = []
+
+    async def work():
+        await limiter.acquire()
+        try:
+            peak.append(limiter.stats()['inflight'])
+            await asyncio.sleep(0.01)
+            limiter.record(0.01, True)
+        finally:
+            limiter.release()
+
+    async def run():
+        await asyncio.gather(*[work() for _ in range(20)])
+
+    asyncio.run(run())
+
+    assert max(peak) <= 3
+    assert limiter.stats()['inflight'] == 0 and limiter.successes == 20
+
+
+def test_throttled_loads_wait_outside_io_threads(monkeypatch):
+    monkeypatch.setenv('STOCK_DATA_STORE_ENABLED', 'false')
+    monkeypatch.setattr(provider_module, '_data_cache', LRUCache(max_bytes=1 << 20, name='test'))
+    monkeypatch.setattr(provider_module, '_upstream_limiters', {})
+    monkeypatch.setattr(StockDataProvider, 'MAX_CONCURRENCY', 1)
+
+    def load(self, code, market_type, start_date, end_date):
+        time.sleep(0.05)
+        return pd.DataFrame({'Close': [1.0]})
+
+    monkeypatch.setattr(StockDataProvider, '_get_stock_data_sync', load)
+
+    async def run():
+        provider = StockDataProvider()
+        loads = asyncio.gather(*[provider.get_stock_data(f'{i:06d}', 'A', '20240101', '20240628') for i in range(6)])
+        await asyncio.sleep(0.02)
+        # 被限流的加载在事件循环中等待，执行器中同时只有一个请求，其他任务不会被饿死
+        executor_stats = get_io_executor().stats()
+        started = time.monotonic()
+        await get_io_executor().run(lambda: None)
+        other_wait = time.monotonic() - started
+        await loads
+        return executor_stats, other_wait
+
+    executor_stats, other_wait = asyncio.run(run())
+
+    assert executor_stats['active_workers'] <= 1 and executor_stats['queue_depth'] == 0
+    assert other_wait < 0.05
+    assert StockDataProvider.get_upstream_limiter_stats()['A']['inflight'] == 0
+
+
+def test_post_close_snapshot_replaces_earlier_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(index_module, '_daily_indexes', {})
+    monkeypatch.setattr(provider_module, 'market_now', lambda market_type='A': _at(2024, 6, 28, 15, 40))
+    monkeypatch.setattr(StockDataProvider, '_get_spot_data_sync', lambda self, market_type='A': pd.DataFrame())
+    store = StockDataStore(str(tmp_path / 'bars.db'))
+    monkeypatch.setattr(store, 'upsert_latest_bars', lambda market_type, bars, bar_date: ['000001'])
+
+    builds = []
+
+    def refresh(market_type, store=None):
+        index = IndicatorIndex(pd.DataFrame({'Score': [80]}, index=['000001']), as_of='2024-06-28')
+        builds.append(index)
+        publish_index(market_type, index)
+        return index
+
+    monkeypatch.setattr(provider_module, 'refresh_daily_index', refresh)
+
+    # 盘中建立的同日索引在收盘后被覆盖
+    early = IndicatorIndex(pd.DataFrame({'Score': [50]}, index=['000001']), as_of='2024-06-28')
+    early.built_at = _at(2024, 6, 28, 14, 0)
+    publish_index('A', early)
+
+    provider = StockDataProvider(data_store=store)
+    provider._refresh_market_snapshot_sync('A')
+    provider._refresh_market_snapshot_sync('A')
+
+    assert len(builds) == 1
+    assert get_index('A', '2024-06-28') is builds[0]
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    """以一份完整行情模拟上游，记录每次请求的日期范围"""
+    monkeypatch.setattr(provider_module, 'market_now', lambda market_type='A': _at(2024, 7, 1, 20, 0))
+    dates = pd.bdate_range('2023-01-02', '2024-06-28', name='Date')
+    close = pd.Series(range(len(dates)), index=dates, dtype=float) + 10
+    state = {'bars': pd.DataFrame({'Open': close, 'Close': close, 'High': close, 'Low': close, 'Volume': 1000.0}),
+             'calls': []}
+
+    def request(self, code, market_type, start_date, end_date):
+        state['calls'].append((start_date, end_date))
+        return state['bars'].loc[pd.Timestamp(start_date):pd.Timestamp(end_date)].copy()
+
+    monkeypatch.setattr(StockDataProvider, '_request_stock_data_sync', request)
+    state['provider'] = StockDataProvider(data_store=StockDataStore(str(tmp_path / 'bars.db')))
+    return state
+
+
+def _load(upstream, start_date, end_date):
+    df = upstream['provider']._get_stock_data_sync('000001', 'A', start_date, end_date)
+    expected = upstream['bars'].loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+    pd.testing.assert_series_equal(df['Close'], expected['Close'], check_names=False, check_freq=False)
+    return df
+
+
+def test_store_appends_delta_from_anchor(upstream):
+    _load(upstream, '20240101', '20240614')
+    # 上次同步发生在2024-06-28收盘之后，但本地数据只到2024-06-14
+    _load(upstream, '20240101', '20240628')
+    _load(upstream, '20240301', '20240628')
+
+    assert upstream['calls'] == [('20240101', '20240614'), ('20240613', '20240628')]
+
+
+def test_store_backfill_keeps_later_bars(upstream):
+    _load(upstream, '20230701', '20240628')
+    _load(upstream, '20230101', '20231231')
+    df = _load(upstream, '20230701', '20240628')
+
+    assert df.index[-1] == pd.Timestamp('2024-06-28')
+    assert upstream['calls'] == [('20230701', '20240628'), ('20230101', '20240628')]
+
+
+def test_store_refetches_when_adjustment_anchor_changes(upstream):
+    _load(upstream, '20240101', '20240614')
+    # 除权除息后前复权价格整体变化
+    upstream['bars'] = upstream['bars'] * 0.5
+    df = _load(upstream, '20240101', '20240628')
+
+    assert upstream['calls'] == [('20240101', '20240614'), ('20240613', '20240628'), ('20240101', '20240628')]
+    assert df.attrs['synced_at'] > 0
+
+
+def test_concurrent_requests_share_one_load(monkeypatch):
+    monkeypatch.setenv('STOCK_DATA_STORE_ENABLED', 'false')
+    monkeypatch.setattr(provider_module, '_data_cache', LRUCache(max_bytes=1 << 20, name='test'))
+    calls = []
+
+    def load(self, code, market_type, start_date, end_date):
+        calls.append(code)
+        time.sleep(0.05)
+        return pd.DataFrame({'Close': [1.0, 2.0]})
+
+    monkeypatch.setattr(StockDataProvider, '_get_stock_data_sync', load)
+
+    async def fetch():
+        provider = StockDataProvider()
+        return await asyncio.gather(*[provider.get_stock_data('000001', 'A', '20240101', '20240628') for _ in range(5)])
+
+    results = asyncio.run(fetch())
+
+    assert calls == ['000001']
+    assert all(df['Close'].tolist() == [1.0, 2.0] for df in results)
+    # 各调用方得到独立的浅拷贝
+    results[0]['MA5'] = 0.0
+    assert 'MA5' not in results[1].columns
+
+
+def test_single_flight_propagates_errors_and_forgets_failed_task():
+    flight = SingleFlight(name='test')
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError('upstream failed')
+
+    async def run():
+        first = await asyncio.gather(*[flight.run('key', fail) for _ in range(3)], return_exceptions=True)
+        second = await asyncio.gather(flight.run('key', fail), return_exceptions=True)
+        return first + second
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 2
+    assert flight.stats()['coalesced'] == 2 and flight.stats()['inflight'] == 0
+
+
+def test_upsert_latest_bars_only_extends_consistent_history(tmp_path):
+    store = StockDataStore(str(tmp_path / 'bars.db'))
+    dates = pd.bdate_range(end='2024-06-27', periods=5, name='Date')
+    for code in ('000001', '000002', '000003', '000004'):
+        history = pd.DataFrame({'Close': [10.0, 10.5, 11.0, 11.5, 12.0], 'Volume': 1000.0}, index=dates)
+        if code == '000004':
+            # 本地数据停在2024-06-25，直接写入快照会留下缺口
+            history = history.iloc[:-2]
+        store.save('A', code, history)
+
+    spot = pd.DataFrame({
+        'Close': [12.5, 12.5, 12.0, 12.5, 12.5],
+        'Prev_close': [12.0, 11.8, 12.0, 11.0, 12.0],
+        'Volume': [2000.0, 2000.0, 1000.0, 2000.0, 2000.0],
+    }, index=['000001', '000002', '000003', '000004', '000009'])
+
+    updated = store.upsert_latest_bars('A', spot, '2024-06-28')
+
+    # 000002 昨收与本地不一致（复权基准变化），000003 与前一根K线完全相同（快照停留在上一交易日）
+    assert updated == ['000001']
+    assert store.get_meta('A', '000001')['last_date'] == pd.Timestamp('2024-06-28')
+    assert store.load('A', '000001', tail=1)['Close'].iloc[0] == 12.5
+    for code in ('000002', '000003', '000004'):
+        assert store.load('A', code)['Close'].index[-1] < pd.Timestamp('2024-06-28')
+    assert store.get_meta('A', '000009') is None
+
+
+@pytest.mark.parametrize('now', [_at(2024, 6, 29, 12, 0), _at(2024, 7, 1, 9, 0)])
+def test_snapshot_skipped_outside_trading_days(monkeypatch, tmp_path, now):
+    monkeypatch.setattr(provider_module, 'market_now', lambda market_type='A': now)
+
+    def spot(self, market_type='A'):
+        raise AssertionError('非交易时段不应拉取快照')
+
+    monkeypatch.setattr(StockDataProvider, '_get_spot_data_sync', spot)
+    provider = StockDataProvider(data_store=StockDataStore(str(tmp_path / 'bars.db')))
+
+    assert provider._refresh_market_snapshot_sync('A') == 0
+
+
+def test_settings_are_read_after_import(monkeypatch):
+    # web_server在导入服务模块之后才加载.env
+    monkeypatch.setenv('DATA_FETCH_BACKEND', 'process')
+    monkeypatch.setenv('STOCK_DATA_CACHE_TTL', '5')
+
+    assert provider_module.get_data_fetch_backend() == 'process'
+    assert StockDataProvider.CACHE_TTL_TRADING == 5
+
+
+def test_pack_frame_round_trip():
+    df = pd.DataFrame({
+        'Open': [1.0, 2.0], 'Close': [1.5, float('nan')], 'Volume': [100, 200], 'Code': ['000001', '000001'],
+    }, index=pd.DatetimeIndex(['2024-06-27', '2024-06-28'], name='Date'))
+    df.attrs['synced_at'] = 123.0
+
+    restored = provider_module._unpack_frame(provider_module._pack_frame(df))
+
+    # 数值列统一为float64，其余列和列顺序保持不变
+    pd.testing.assert_frame_equal(restored, df.astype({'Volume': 'float64'}))
+    assert restored.attrs == {'synced_at': 123.0}
+    assert not hasattr(restored, 'error')
+
+
+def test_pack_frame_keeps_error():
+    df = pd.DataFrame()
+    df.error = 'upstream failed'
+
+    restored = provider_module._unpack_frame(provider_module._pack_frame(df))
+
+    assert restored.empty and restored.error == 'upstream failed'
+
+
+@pytest.fixture
+def batch_provider(monkeypatch):
+    monkeypatch.setenv('STOCK_DATA_STORE_ENABLED', 'false')
+    monkeypatch.setattr(provider_module, '_data_cache', LRUCache(max_bytes=1 << 20, name='test'))
+    monkeypatch.setattr(StockDataProvider, 'RETRY_BASE_DELAY', 0)
+    return StockDataProvider()
+
+
+def test_iter_multiple_stocks_data_retries_and_yields_in_completion_order(monkeypatch, batch_provider):
+    attempts = {}
+    delays = {'000001': 0.06, '000002': 0.0, '000003': 0.03}
+
+    async def load(self, code, market_type, start_date, end_date):
+        attempts[code] = attempts.get(code, 0) + 1
+        await asyncio.sleep(delays[code])
+        if code == '000002' and attempts[code] < 3:
+            df = pd.DataFrame()
+            df.error = 'upstream failed'
+            return df
+        return pd.DataFrame({'Close': [1.0]})
+
+    monkeypatch.setattr(StockDataProvider, '_load_stock_data', load)
+    cached = pd.DataFrame({'Close': [2.0]})
+    cached.attrs['synced_at'] = time.time()
+    batch_provider._set_cached('000004', 'A', '20240101', '20240628', cached)
+
+    async def collect():
+        return [code async for code, df in batch_provider.iter_multiple_stocks_data(
+            ['000001', '000002', '000003', '000004'], 'A', '20240101', '20240628', max_retries=2)]
+
+    # 缓存命中的最先返回，其余按完成顺序；000002 第三次请求才成功
+    assert asyncio.run(collect()) == ['000004', '000002', '000003', '000001']
+    assert attempts == {'000001': 1, '000002': 3, '000003': 1}
+
+
+def test_iter_multiple_stocks_data_cancels_pending_loads_on_close(monkeypatch, batch_provider):
+    cancelled = []
+
+    async def load(self, code, market_type, start_date, end_date):
+        try:
+            await asyncio.sleep(0 if code == '000001' else 10)
+        except asyncio.CancelledError:
+            cancelled.append(code)
+            raise
+        return pd.DataFrame({'Close': [1.0]})
+
+    monkeypatch.setattr(StockDataProvider, '_load_stock_data', load)
+    codes = [f'{i:06d}' for i in range(1, 6)]
+
+    async def first_only():
+        results = batch_provider.iter_multiple_stocks_data(codes, 'A', '20240101', '20240628')
+        code, _ = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)
+        return code
+
+    assert asyncio.run(first_only()) == '000001'
+    assert sorted(cancelled) == codes[1:]
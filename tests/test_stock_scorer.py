@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.stock_scorer import StockScorer
+from services.technical_indicator import TechnicalIndicator
+from utils.top_k import StreamingTopK
+
+
+def _random_latest_values(count: int, seed: int) -> np.ndarray:
+    """生成覆盖各评分分支边界和NaN的最新数据矩阵"""
+    rng = np.random.default_rng(seed)
+    close = rng.choice([9.0, 10.0, 11.0], count)
+    ma5 = rng.choice([9.0, 10.0, 11.0, np.nan], count)
+    ma20 = rng.choice([9.0, 10.0, 11.0, np.nan], count)
+    ma60 = rng.choice([9.0, 10.0, 11.0, np.nan], count)
+    rsi = rng.choice([0.0, 29.9, 30.0, 30.1, 44.9, 45.0, 50.0, 55.0, 55.1, 69.9, 70.0, 100.0, np.nan], count)
+    macd = rng.choice([-1.0, 0.0, 1.0, np.nan], count)
+    signal = rng.choice([-1.0, 0.0, 1.0, np.nan], count)
+    volume_ratio = rng.choice([0.0, 0.5, 1.0, 1.2, 1.5, 2.0, np.inf, np.nan], count)
+    return np.column_stack([ma5, ma20, ma60, close, rsi, macd, signal, volume_ratio])
+
+
+def test_score_matrix_matches_scalar_rules():
+    scorer = StockScorer()
+    values = _random_latest_values(2000, seed=0)
+
+    scores = scorer.score_matrix(values)
+
+    for row, score in zip(values, scores):
+        df = pd.DataFrame([row], columns=list(StockScorer.SCORE_COLUMNS))
+        assert score == scorer.calculate_score(df), dict(zip(StockScorer.SCORE_COLUMNS, row))
+
+
+@pytest.mark.parametrize('score', [-5, 0, 19, 20, 39, 40, 59, 60, 69, 70, 79, 80, 100])
+def test_recommendations_match_scalar_thresholds(score):
+    scorer = StockScorer()
+
+    assert scorer.get_recommendations([score]) == [scorer.get_recommendation(score)]
+
+
+def test_batch_score_stocks_matches_scalar_loop():
+    scorer = StockScorer()
+    values = _random_latest_values(200, seed=1)
+    stock_dfs = {
+        f'{i:06d}': pd.DataFrame([row * 0.99, row], columns=list(StockScorer.SCORE_COLUMNS))
+        for i, row in enumerate(values)
+    }
+    stock_dfs['empty'] = pd.DataFrame(columns=list(StockScorer.SCORE_COLUMNS))
+
+    expected = []
+    for code, df in stock_dfs.items():
+        if df.empty:
+            continue
+        score = scorer.calculate_score(df)
+        expected.append((code, score, scorer.get_recommendation(score)))
+    expected.sort(key=lambda x: x[1], reverse=True)
+
+    assert scorer.batch_score_stocks(stock_dfs) == expected
+
+
+def test_score_matrix_empty():
+    scorer = StockScorer()
+
+    assert scorer.score_matrix(np.empty((0, len(StockScorer.SCORE_COLUMNS)))).shape == (0,)
+    assert scorer.get_recommendations([]) == []
+
+
+@pytest.mark.parametrize('k', [0, 1, 5, 50, 1000])
+def test_top_k_matches_stable_sort(k):
+    rng = np.random.default_rng(k)
+    scores = rng.integers(0, 20, 300) * 5
+    codes = [f'{i:06d}' for i in range(len(scores))]
+    results = [(code, int(score), '') for code, score in zip(codes, scores)]
+    expected = sorted(results, key=lambda x: x[1], reverse=True)
+
+    assert [codes[i] for i in StockScorer.top_k_indices(scores, k)] == [r[0] for r in expected[:k]]
+    assert StockScorer.select_top_k(results, k) == expected[:k]
+    assert StockScorer.select_top_k(results, k, min_score=60) == [r for r in expected if r[1] >= 60][:k]
+    assert [codes[i] for i in StockScorer.top_k_indices(scores, k, min_score=60)] == \
+        [r[0] for r in expected if r[1] >= 60][:k]
+
+    streaming = StreamingTopK(k)
+    dropped = [streaming.push(score, code) for code, score, _ in results]
+    assert [code for _, code in streaming.items()] == [r[0] for r in expected[:k]]
+    assert len([d for d in dropped if d is not None]) == len(results) - min(k, len(results))
+
+
+def _make_indicator_frame(length: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    df = pd.DataFrame({
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+        'Volume': rng.integers(100_000, 10_000_000, length).astype(float)
+    }, index=pd.bdate_range('2022-01-03', periods=length, name='Date'))
+    return TechnicalIndicator().calculate_indicators(df)
+
+
+def test_score_history_matches_per_row_scores():
+    scorer = StockScorer()
+    df = _make_indicator_frame(150, seed=8)
+
+    history = scorer.score_history(df)
+
+    assert history.dtype == np.int8
+    assert history.index.equals(df.index)
+    assert history.tolist() == [scorer.calculate_score(df.iloc[:i + 1]) for i in range(len(df))]
+
+
+def test_score_history_panel_matches_per_symbol():
+    scorer = StockScorer()
+    frames = [_make_indicator_frame(120, seed=seed) for seed in range(4)]
+    panel = {column: np.column_stack([df[column].to_numpy() for df in frames]) for column in StockScorer.SCORE_COLUMNS}
+
+    result = scorer.score_history_panel(panel)
+
+    assert result.shape == (120, 4) and result.dtype == np.int8
+    for j, df in enumerate(frames):
+        np.testing.assert_array_equal(result[:, j], scorer.score_history(df).to_numpy())
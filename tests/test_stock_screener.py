@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.stock_screener import StockScreener, ScreenSyntaxError
+
+
+@pytest.fixture
+def table():
+    return pd.DataFrame({
+        'RSI': [60.0, 50.0, np.nan, 65.0, 55.0],
+        'Volume_Ratio': [2.0, 2.0, 2.0, 1.0, np.nan],
+        'MA5': [2.0, 2.0, 2.0, 2.0, 2.0],
+        'MA20': [1.0, 1.0, 1.0, 3.0, 1.0],
+    }, index=pd.Index(['a', 'b', 'c', 'd', 'e'], name='Code'))
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('RSI between 55 and 70 AND Volume_Ratio > 1.5 AND MA5 > MA20', ['a']),
+    ('rsi_between', None),
+    ('RSI BETWEEN 55 AND 65', ['a', 'd', 'e']),
+    ('MA5 > MA20 * 1.5', ['a', 'b', 'c', 'e']),
+    ('(MA5 - MA20) / MA20 >= 1', ['a', 'b', 'c', 'e']),
+    ('NOT (RSI > 55)', ['b', 'e']),
+    ('RSI > 55 OR Volume_Ratio > 1.5', ['a', 'b', 'c', 'd']),
+    ('(RSI > 62 OR RSI < 52) AND NOT Volume_Ratio < 1.5', ['b']),
+    ('-RSI <= -60', ['a', 'd']),
+])
+def test_screen_expressions(table, expression, expected):
+    if expected is None:
+        with pytest.raises(ScreenSyntaxError):
+            StockScreener(expression)
+        return
+
+    assert list(StockScreener(expression).screen(table).index) == expected
+
+
+def test_nan_is_unknown_not_false(table):
+    # c的RSI缺失：NOT不会把缺失变成满足条件；但OR的另一侧为真时结果为真
+    assert 'c' not in StockScreener('NOT RSI > 100').screen(table).index
+    assert 'c' in StockScreener('RSI > 100 OR MA5 > MA20').screen(table).index
+    assert 'e' not in StockScreener('Volume_Ratio > 0 AND RSI > 0').screen(table).index
+    assert 'e' not in StockScreener('NOT (Volume_Ratio > 0 AND RSI > 0)').screen(table).index
+    assert 'e' in StockScreener('NOT (Volume_Ratio > 0 AND RSI > 60)').screen(table).index
+
+
+@pytest.mark.parametrize('expression', ['   ', 'RSI >', 'RSI >> 3', '(RSI > 5', 'RSI > 5)', 'RSI 5', 'RSI > 5 AND', 'RSI $ 3'])
+def test_syntax_errors(expression):
+    with pytest.raises(ScreenSyntaxError):
+        StockScreener(expression)
+
+
+def test_weighted_rules(table):
+    screener = StockScreener('MA5 > 0', rules=[('RSI > 55', 10), ('Volume_Ratio > 1.5', 5)])
+
+    result = screener.screen(table)
+
+    assert list(result.index) == ['a', 'd', 'b', 'c', 'e']
+    assert list(result['screen_score']) == [15.0, 10.0, 5.0, 5.0, 0.0]
+    assert screener.columns == ['MA5', 'RSI', 'Volume_Ratio']
+
+
+def test_latest_table():
+    stock_dfs = {
+        '000001': pd.DataFrame({'RSI': [40.0, 60.0], 'MA5': [1.0, 2.0]}),
+        '000002': pd.DataFrame({'RSI': [30.0]}),
+        '000003': pd.DataFrame(),
+    }
+
+    table = StockScreener.latest_table(stock_dfs, ['RSI', 'MA5'])
+
+    assert list(table.index) == ['000001', '000002', '000003']
+    np.testing.assert_array_equal(table.to_numpy(), [[60.0, 2.0], [30.0, np.nan], [np.nan, np.nan]])
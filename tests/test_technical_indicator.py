@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import technical_indicator
+from services.incremental_indicator import IncrementalIndicator
+from services.technical_indicator import TechnicalIndicator
+from utils.cache import LRUCache
+
+
+def _make_price_df(length: int, seed: int) -> pd.DataFrame:
+    """生成随机游走的日线数据"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    high = close * (1 + rng.uniform(0, 0.03, length))
+    low = close * (1 - rng.uniform(0, 0.03, length))
+    volume = rng.integers(100_000, 10_000_000, length).astype(float)
+    index = pd.bdate_range('2020-01-01', periods=length, name='Date')
+    return pd.DataFrame({
+        'Open': close, 'High': high, 'Low': low, 'Close': close, 'Volume': volume
+    }, index=index)
+
+
+def _assert_frame_close(actual: pd.DataFrame, expected: pd.DataFrame):
+    assert list(actual.columns) == list(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_allclose(
+            actual[column].to_numpy(dtype=float),
+            expected[column].to_numpy(dtype=float),
+            rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=column
+        )
+
+
+@pytest.mark.parametrize('length', [1, 10, 30, 120, 1500])
+def test_fused_matches_reference(length):
+    indicator = TechnicalIndicator()
+    df = _make_price_df(length, seed=length)
+
+    _assert_frame_close(indicator.calculate_indicators_fused(df), indicator.calculate_indicators(df))
+
+
+def test_fused_matches_reference_with_edge_cases():
+    indicator = TechnicalIndicator()
+    df = _make_price_df(200, seed=7)
+    # 停牌：价格不变、成交量为0；以及中间缺失的收盘价
+    df.iloc[40:70, df.columns.get_indexer(['High', 'Low', 'Close'])] = 50.0
+    df.iloc[40:70, df.columns.get_loc('Volume')] = 0.0
+    df.iloc[120, df.columns.get_loc('Close')] = np.nan
+
+    _assert_frame_close(indicator.calculate_indicators_fused(df), indicator.calculate_indicators(df))
+
+
+def test_fused_with_custom_params():
+    params = {
+        'ma_periods': {'short': 3, 'medium': 10, 'long': 30},
+        'rsi_period': 6,
+        'bollinger_period': 15,
+        'bollinger_std': 2.5,
+        'volume_ma_period': 5,
+        'atr_period': 7
+    }
+    indicator = TechnicalIndicator(params)
+    df = _make_price_df(300, seed=3)
+
+    _assert_frame_close(indicator.calculate_indicators_fused(df), indicator.calculate_indicators(df))
+
+
+def test_panel_matches_per_symbol():
+    indicator = TechnicalIndicator()
+    stock_dfs = {f'{i:06d}': _make_price_df(length, seed=i) for i, length in enumerate([250, 80, 15, 400])}
+    # 不同上市日期：截掉部分股票的开头
+    stock_dfs['000001'] = stock_dfs['000001'].iloc[30:]
+
+    dates, codes, panel = TechnicalIndicator.build_panel(stock_dfs)
+    result = indicator.calculate_panel(panel['Close'], panel['High'], panel['Low'], panel['Volume'])
+
+    for j, code in enumerate(codes):
+        expected = indicator.calculate_indicators(stock_dfs[code])
+        actual = pd.DataFrame({column: values[:, j] for column, values in result.items()}, index=dates)
+        actual = actual.reindex(expected.index)
+        _assert_frame_close(actual, expected[list(result)])
+
+
+@pytest.mark.parametrize('tail', [1, 2, 14])
+def test_tail_mode_exact_for_sma_indicators(tail):
+    indicator = TechnicalIndicator()
+    df = _make_price_df(500, seed=11)
+    sma_columns = ['MA5', 'MA20', 'MA60', 'RSI', 'BB_Middle', 'BB_Upper', 'BB_Lower',
+                   'Volume_MA', 'Volume_Ratio', 'ATR', 'Volatility']
+
+    expected = indicator.calculate_indicators(df).iloc[-tail:]
+    actual = indicator.calculate_indicators(df, columns=sma_columns, tail=tail)
+
+    assert len(actual) == tail
+    assert actual.index.equals(expected.index)
+    _assert_frame_close(actual[sma_columns], expected[sma_columns])
+
+
+def test_tail_mode_macd_converges_with_warmup():
+    indicator = TechnicalIndicator()
+    df = _make_price_df(1000, seed=5)
+
+    expected = indicator.calculate_indicators(df).iloc[-2:]
+    actual = indicator.calculate_indicators(df, tail=2, ema_warmup=300)
+
+    for column in ['MACD', 'Signal', 'Histogram']:
+        np.testing.assert_allclose(actual[column], expected[column], atol=1e-6, err_msg=column)
+
+
+def test_tail_mode_with_short_history():
+    indicator = TechnicalIndicator()
+    df = _make_price_df(30, seed=2)
+
+    _assert_frame_close(indicator.calculate_indicators(df, tail=50), indicator.calculate_indicators(df))
+
+
+@pytest.mark.parametrize('method', ['calculate_indicators', 'calculate_indicators_fused'])
+def test_indicators_do_not_copy_price_columns(method):
+    indicator = TechnicalIndicator()
+    df = _make_price_df(100, seed=9)
+
+    result = getattr(indicator, method)(df)
+
+    # 价格数据块原样保留，全部指标列只占一个数据块
+    assert result._mgr.nblocks == df._mgr.nblocks + 1
+    assert list(result.columns[:len(df.columns)]) == list(df.columns)
+    assert np.shares_memory(result['Close'].to_numpy(), df['Close'].to_numpy())
+    # 重复计算时替换已有的指标列
+    columns = list(result.columns)
+    again = getattr(indicator, method)(result)
+    assert again._mgr.nblocks == df._mgr.nblocks + 1
+    assert list(again.columns) == columns
+    assert list(result.columns) == columns
+    assert np.shares_memory(again['Close'].to_numpy(), df['Close'].to_numpy())
+
+
+def test_sweep_matches_individual_runs():
+    indicator = TechnicalIndicator()
+    df = _make_price_df(300, seed=4)
+    grid = TechnicalIndicator.expand_param_grid({
+        'ma_periods': [{'short': 5, 'medium': 20, 'long': 60}, {'short': 3, 'medium': 10, 'long': 30}],
+        'rsi_period': [6, 14],
+        'bollinger_std': [2, 2.5],
+    })
+
+    params, columns, result = indicator.calculate_sweep(df, grid)
+
+    assert result.shape == (len(grid), len(df), len(columns))
+    for i, param_set in enumerate(params):
+        expected = TechnicalIndicator(param_set).calculate_indicators(df)
+        column_map = {f'MA_{role}': f'MA{period}' for role, period in param_set['ma_periods'].items()}
+        for j, column in enumerate(columns):
+            np.testing.assert_allclose(
+                result[i, :, j], expected[column_map.get(column, column)].to_numpy(),
+                rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=f'{i} {column}'
+            )
+
+
+@pytest.mark.parametrize('length', [1, 30, 300])
+def test_incremental_matches_reference(length):
+    indicator = TechnicalIndicator()
+    df = _make_price_df(length, seed=length)
+    if length > 100:
+        # 停牌：价格不变、成交量为0
+        df.iloc[40:70, df.columns.get_indexer(['High', 'Low', 'Close'])] = 50.0
+        df.iloc[40:70, df.columns.get_loc('Volume')] = 0.0
+        df.iloc[150:155, df.columns.get_loc('Volume')] = 0.0
+
+    state = IncrementalIndicator()
+    rows = [state.update(bar) for _, bar in df.iterrows()]
+    actual = pd.DataFrame(rows, index=df.index)
+    expected = indicator.calculate_indicators(df)
+
+    # 预热期的NaN也逐行比较
+    _assert_frame_close(actual, expected[actual.columns])
+    assert state.last_index == df.index[-1]
+
+
+def test_cached_indicators_follow_fingerprint(monkeypatch):
+    monkeypatch.setattr(technical_indicator, '_indicator_cache', LRUCache(max_bytes=1 << 24, name='test'))
+    indicator = TechnicalIndicator()
+    df = _make_price_df(120, seed=11)
+
+    first = indicator.calculate_indicators_cached(df)
+    again = indicator.calculate_indicators_cached(df.copy())
+    assert TechnicalIndicator.get_cache_stats()['hits'] == 1
+    _assert_frame_close(again, first)
+
+    # 追加一根新K线，以及盘中更新最新K线的收盘价，都不能命中旧结果
+    appended = _make_price_df(121, seed=11)
+    _assert_frame_close(indicator.calculate_indicators_cached(appended), indicator.calculate_indicators(appended))
+    updated = df.copy()
+    updated.iloc[-1, updated.columns.get_loc('Close')] *= 1.01
+    _assert_frame_close(indicator.calculate_indicators_cached(updated), indicator.calculate_indicators(updated))
+
+    stats = TechnicalIndicator.get_cache_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 3
+    # 参数不同的计算器不共享结果
+    other = TechnicalIndicator({**indicator.params, 'rsi_period': 6})
+    other.calculate_indicators_cached(df)
+    assert TechnicalIndicator.get_cache_stats()['misses'] == 4
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.stock_analyzer_service import StockAnalyzerService
+from services.stock_data_provider import StockDataProvider
+from services.stock_screener import StockScreener
+
+
+@pytest.fixture
+def fake_market(monkeypatch, tmp_path):
+    monkeypatch.setenv('STOCK_DATA_STORE_ENABLED', 'false')
+    monkeypatch.setenv('STOCK_DATA_DIR', str(tmp_path))
+
+    def get_stock_data(self, code, market_type, start_date, end_date):
+        rng = np.random.default_rng(int(code))
+        close = 100 + rng.standard_normal(120).cumsum()
+        return pd.DataFrame({
+            'Open': close, 'Close': close, 'High': close + 1, 'Low': close - 1,
+            'Volume': rng.integers(100, 1000, 120).astype(float)
+        }, index=pd.date_range('2025-01-01', periods=120))
+
+    async def get_universe(self, market_type):
+        return [f'{i:06d}' for i in range(1, 31)]
+
+    monkeypatch.setattr(StockDataProvider, '_get_stock_data_sync', get_stock_data)
+    monkeypatch.setattr(StockDataProvider, 'get_universe', get_universe)
+    monkeypatch.setattr(StockAnalyzerService, 'UNIVERSE_BATCH_SIZE', 7)
+    return tmp_path
+
+
+def _run(stop_after=None, **kwargs):
+    async def collect():
+        messages = []
+        async for line in StockAnalyzerService().scan_universe('A', min_score=40, **kwargs):
+            messages.append(json.loads(line))
+            if stop_after is not None and len(messages) >= stop_after:
+                break
+        return messages
+    return asyncio.run(collect())
+
+
+def test_resume_after_interruption(fake_market):
+    # 初始化消息 + 两批进度后中断
+    interrupted = _run(stop_after=3)
+    assert interrupted[-1]['completed_batches'] == 2
+
+    resumed = _run()
+    assert resumed[0]['resumed'] and resumed[0]['completed_batches'] == 2
+    assert [m['completed_batches'] for m in resumed[1:-1]] == [3, 4, 5]
+
+    fresh = _run(resume=False)
+    assert not fresh[0]['resumed']
+
+    for key in ('total_scanned', 'total_matched', 'total_errors'):
+        assert resumed[-1][key] == fresh[-1][key]
+    assert resumed[-1]['total_scanned'] == 30
+    assert sorted((r['score'], r['stock_code']) for r in resumed[-1]['top']) == \
+        sorted((r['score'], r['stock_code']) for r in fresh[-1]['top'])
+
+
+def test_changed_parameters_start_over(fake_market):
+    _run(stop_after=2)
+
+    messages = _run(screen='RSI > 0')
+
+    assert not messages[0]['resumed']
+    assert messages[-1]['scan_completed']
+
+
+def test_closing_scan_early_cancels_pipeline_tasks(fake_market, monkeypatch):
+    monkeypatch.setattr(StockAnalyzerService, 'PIPELINE_QUEUE_SIZE', 1)
+    monkeypatch.setattr(StockAnalyzerService, 'SCAN_CHUNK_SIZE', 2)
+
+    async def scan():
+        service = StockAnalyzerService()
+        results = service._iter_scan_results([f'{i:06d}' for i in range(1, 31)], 'A')
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return first, pending
+
+    first, pending = asyncio.run(scan())
+
+    assert first[4] is None
+    assert pending == []
+
+
+def test_scan_stocks_screens_latest_table_once(fake_market, monkeypatch):
+    monkeypatch.setattr(StockAnalyzerService, 'SCAN_CHUNK_SIZE', 2)
+    calls = []
+    evaluate = StockScreener.evaluate
+
+    def counting_evaluate(self, table):
+        calls.append(len(table))
+        return evaluate(self, table)
+
+    monkeypatch.setattr(StockScreener, 'evaluate', counting_evaluate)
+
+    async def collect():
+        return [json.loads(line) async for line in StockAnalyzerService().scan_stocks(
+            [f'{i:06d}' for i in range(1, 31)], 'A', min_score=0,
+            screen='RSI > 50', rules=[('RSI > 60', 10), ('Volume_Ratio > 1', 5)])]
+
+    messages = asyncio.run(collect())
+    results = [m for m in messages if 'score' in m]
+
+    assert calls == [30]
+    assert len(results) == 30
+    for result in results:
+        assert (result['status'] == 'waiting') == (result['rsi'] > 50)
+        assert result['screen_score'] in (0.0, 5.0, 10.0, 15.0)
+        if result['rsi'] <= 60:
+            assert result['screen_score'] in (0.0, 5.0)
+    assert messages[-1]['total_matched'] == sum(r['rsi'] > 50 for r in results)
+
+
+def test_universe_scan_ranks_top_by_rule_score(fake_market):
+    messages = _run(resume=False, rules=[('RSI > 50', 10)])
+
+    top = messages[-1]['top']
+    keys = [(r['screen_score'], r['score']) for r in top]
+    assert keys == sorted(keys, reverse=True)
+    assert all(r['screen_score'] == (10.0 if r['rsi'] > 50 else 0.0) for r in top)
+    assert messages[0]['rules'] == [['RSI > 50', 10.0]]
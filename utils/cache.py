@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class LRUCache:
+    """
+    进程内LRU缓存
+    按条目占用的字节数控制总容量，支持逐条设置过期时间，并统计命中率
+    """
+
+    def __init__(self, max_bytes: int, name: str = "cache"):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存容量上限（字节）
+            name: 缓存名称，用于日志和统计
+        """
+        self.max_bytes = max_bytes
+        self.name = name
+
+        # key -> (value, size, expires_at)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        logger.debug(f"初始化LRUCache[{name}]，容量上限: {max_bytes / 1024 / 1024:.1f}MB")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存值，未命中或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size: int, expires_at: Optional[float] = None):
+        """
+        写入缓存，超出容量时按最近最少使用淘汰
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            size: 条目占用的字节数
+            expires_at: 过期时间戳（time.time()），None表示不过期
+        """
+        if size > self.max_bytes:
+            logger.debug(f"LRUCache[{self.name}] 条目大小 {size} 超过容量上限，跳过缓存")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, expires_at)
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        删除满足条件的缓存条目
+
+        Args:
+            predicate: 以缓存键为参数的判断函数
+
+        Returns:
+            删除的条目数
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def _remove(self, key: Hashable):
+        """删除条目（调用方需持有锁）"""
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class JSONCheckpoint:
+    """
+    JSON文件检查点
+    保存长时间任务的进度，进程中断后可以从最近一次保存的状态继续；
+    先写入临时文件再原子替换，中途崩溃不会留下损坏的检查点
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化检查点
+
+        Args:
+            path: 检查点文件路径，所在目录不存在时自动创建
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        读取检查点
+
+        Returns:
+            保存的状态字典，文件不存在或无法解析时返回None
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  [检查点] 读取 {self.path} 失败，将重新开始: {str(e)}")
+            return None
+        return state if isinstance(state, dict) else None
+
+    def save(self, state: Dict[str, Any]):
+        """
+        保存检查点
+
+        Args:
+            state: 可JSON序列化的状态字典
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+    def clear(self):
+        """删除检查点"""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class SingleFlight:
+    """
+    并发请求合并
+    相同键的并发请求共享同一个进行中的任务，只有第一个请求真正执行
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        """
+        初始化请求合并器
+
+        Args:
+            name: 名称，用于日志和统计
+        """
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入相同键的进行中任务
+
+        Args:
+            key: 请求键
+            func: 无参数的协程函数，仅在没有进行中的相同请求时调用
+
+        Returns:
+            任务结果（所有合并的调用方得到同一个结果）
+        """
+        task = self._inflight.get(key)
+
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+            logger.debug(f"SingleFlight[{self.name}] 合并请求: {key}")
+
+        # shield保证单个调用方被取消时不会取消其他调用方共享的任务
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        """任务完成后移除，之后的请求会重新执行"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """获取请求合并统计信息"""
+        return {
+            'name': self.name,
+            'inflight': len(self._inflight),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+        }
+
+
+def _resolve_waiter(waiter: asyncio.Future):
+    """在等待者所属的事件循环中唤醒等待者"""
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制器（AIMD）
+    上游健康时每完成一轮请求将并发上限加1，出错或延迟突增时将并发上限成倍降低；
+    在事件循环中等待并发名额（等待期间不占用任何线程），请求结果可在任意线程中记录，
+    只应记录上游请求本身的结果和耗时
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int = 1, max_limit: int = 32,
+                 decrease_ratio: float = 0.5, latency_factor: float = 2.0,
+                 name: str = "adaptive_limiter"):
+        """
+        初始化自适应并发限制器
+
+        Args:
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            decrease_ratio: 降低时的乘数
+            latency_factor: 单次延迟超过平均延迟的倍数时视为延迟突增
+            name: 名称，用于日志
+        """
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.decrease_ratio = decrease_ratio
+        self.latency_factor = latency_factor
+        self.name = name
+
+        # 请求结果可能在工作线程中记录，状态用线程锁保护
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._waiters: List[asyncio.Future] = []
+        self._latency_avg: Optional[float] = None
+        self._samples = 0
+        self._last_decrease = 0.0
+
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+
+    async def acquire(self):
+        """等待并占用一个并发名额"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._inflight < int(self.limit):
+                    self._inflight += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append(waiter)
+
+            try:
+                await waiter
+            finally:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+    def release(self):
+        """释放并发名额"""
+        with self._lock:
+            self._inflight -= 1
+            self._wake_waiters()
+
+    def record(self, latency: float, success: bool):
+        """
+        根据一次上游请求的结果调整并发上限
+
+        Args:
+            latency: 请求耗时（秒）
+            success: 请求是否成功
+        """
+        with self._lock:
+            spike = (
+                success and self._samples >= 3 and self._latency_avg is not None
+                and latency > self._latency_avg * self.latency_factor
+            )
+
+            if success:
+                self.successes += 1
+                self._samples += 1
+                self._latency_avg = latency if self._latency_avg is None else 0.8 * self._latency_avg + 0.2 * latency
+            else:
+                self.failures += 1
+
+            if not success or spike:
+                # 同一波失败只降低一次，避免并发中的多个请求同时失败导致上限被连续减半
+                now = time.monotonic()
+                if now - self._last_decrease > (self._latency_avg or 1.0):
+                    self.limit = max(self.min_limit, self.limit * self.decrease_ratio)
+                    self._last_decrease = now
+                    self.decreases += 1
+                    logger.info(f"AdaptiveLimiter[{self.name}] {'请求失败' if not success else '延迟突增'}，并发上限降至 {int(self.limit)}")
+            else:
+                # 加性增：每完成约一轮（limit个）成功请求，上限加1
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self._wake_waiters()
+
+    def _wake_waiters(self):
+        """唤醒等待中的调用方重新检查名额（调用方需持有锁）"""
+        for waiter in self._waiters:
+            if not waiter.done() and not waiter.get_loop().is_closed():
+                waiter.get_loop().call_soon_threadsafe(_resolve_waiter, waiter)
+        self._waiters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取并发限制器统计信息"""
+        return {
+            'name': self.name,
+            'limit': int(self.limit),
+            'waiting': len(self._waiters),
+            'inflight': self._inflight,
+            'avg_latency_seconds': self._latency_avg or 0.0,
+            'successes': self.successes,
+            'failures': self.failures,
+            'decreases': self.decreases,
+        }
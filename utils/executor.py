@@ -0,0 +1,242 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict) -> Tuple[float, float, Any]:
+    """在工作进程中执行函数并记录开始时间和耗时"""
+    started = time.time()
+    result = func(*args, **kwargs)
+    return started, time.time() - started, result
+
+
+class MonitoredExecutor:
+    """
+    带运行指标的专用执行器
+    用于隔离阻塞的上游数据请求，避免占满默认线程池，并统计排队深度、活跃线程数和排队等待时间
+    支持线程池和进程池两种后端，进程池后端要求函数和参数可被pickle
+    """
+
+    def __init__(self, max_workers: int, name: str = "executor", use_processes: bool = False):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 最大线程数（或进程数）
+            name: 执行器名称，用于线程命名和统计
+            use_processes: 是否使用进程池
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        if use_processes:
+            # 使用spawn启动工作进程，避免fork继承日志等后台线程的状态
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+        # 进程池无法在工作进程中更新计数，按已提交未完成的任务数估算排队和活跃数
+        self.inflight = 0
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+        self.total_run = 0.0
+
+        logger.debug(f"初始化MonitoredExecutor[{name}]，后端: {'进程池' if use_processes else '线程池'}，最大并发: {max_workers}")
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        在执行器中执行阻塞函数
+
+        Args:
+            func: 阻塞函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        loop = asyncio.get_running_loop()
+
+        if self.use_processes:
+            return await self._run_in_process(loop, func, args, kwargs)
+
+        submitted = time.monotonic()
+
+        with self._lock:
+            self.queued += 1
+
+        def call():
+            started = time.monotonic()
+            wait = started - submitted
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.total_wait += wait
+                self.last_wait = wait
+                self.max_wait = max(self.max_wait, wait)
+
+            succeeded = False
+            try:
+                result = func(*args, **kwargs)
+                succeeded = True
+                return result
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.total_run += time.monotonic() - started
+                    if not succeeded:
+                        self.failed += 1
+
+        return await loop.run_in_executor(self._executor, call)
+
+    async def _run_in_process(self, loop: asyncio.AbstractEventLoop, func: Callable,
+                              args: tuple, kwargs: dict) -> Any:
+        """在进程池中执行函数，开始时间由工作进程回传"""
+        submitted = time.time()
+        with self._lock:
+            self.inflight += 1
+
+        try:
+            started, elapsed, result = await loop.run_in_executor(
+                self._executor, _timed_call, func, args, kwargs
+            )
+        except BaseException:
+            with self._lock:
+                self.inflight -= 1
+                self.completed += 1
+                self.failed += 1
+            raise
+
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self.inflight -= 1
+            self.completed += 1
+            self.total_wait += wait
+            self.last_wait = wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += elapsed
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """获取执行器运行指标"""
+        with self._lock:
+            if self.use_processes:
+                queue_depth = max(0, self.inflight - self.max_workers)
+                active = min(self.inflight, self.max_workers)
+            else:
+                queue_depth, active = self.queued, self.active
+
+            return {
+                'name': self.name,
+                'backend': 'process' if self.use_processes else 'thread',
+                'max_workers': self.max_workers,
+                'queue_depth': queue_depth,
+                'active_workers': active,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_seconds': self.total_wait / self.completed if self.completed else 0.0,
+                'max_wait_seconds': self.max_wait,
+                'last_wait_seconds': self.last_wait,
+                'avg_run_seconds': self.total_run / self.completed if self.completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭执行器"""
+        self._executor.shutdown(wait=wait)
+
+
+# 进程内共享的上游数据请求线程池
+_io_executor: Optional[MonitoredExecutor] = None
+_io_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> MonitoredExecutor:
+    """
+    获取上游数据请求专用线程池
+
+    线程数可通过环境变量 DATA_FETCH_WORKERS 配置，默认8，
+    应根据数据源能承受的并发量调整
+
+    Returns:
+        MonitoredExecutor实例
+    """
+    global _io_executor
+
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = MonitoredExecutor(
+                max_workers=int(os.getenv('DATA_FETCH_WORKERS', '8')),
+                name="data_fetch"
+            )
+        return _io_executor
+
+
+# 进程内共享的数据获取与标准化进程池
+_process_executor: Optional[MonitoredExecutor] = None
+_process_executor_lock = threading.Lock()
+
+
+def get_process_executor() -> MonitoredExecutor:
+    """
+    获取数据获取与标准化专用进程池
+
+    进程数可通过环境变量 DATA_FETCH_PROCESSES 配置，默认为CPU核数
+
+    Returns:
+        MonitoredExecutor实例
+    """
+    global _process_executor
+
+    with _process_executor_lock:
+        if _process_executor is None:
+            _process_executor = MonitoredExecutor(
+                max_workers=int(os.getenv('DATA_FETCH_PROCESSES', str(os.cpu_count() or 2))),
+                name="data_fetch_process",
+                use_processes=True
+            )
+        return _process_executor
+
+
+# 进程内共享的CPU密集型计算执行器（技术指标、评分）
+_compute_executor: Optional[MonitoredExecutor] = None
+_compute_executor_lock = threading.Lock()
+
+
+def get_compute_executor() -> MonitoredExecutor:
+    """
+    获取技术指标和评分计算专用执行器，避免CPU密集型计算阻塞事件循环
+
+    通过环境变量 COMPUTE_BACKEND 选择 thread（线程池，默认）或 process（进程池），
+    COMPUTE_WORKERS 配置并发数，默认为CPU核数
+
+    Returns:
+        MonitoredExecutor实例
+    """
+    global _compute_executor
+
+    with _compute_executor_lock:
+        if _compute_executor is None:
+            _compute_executor = MonitoredExecutor(
+                max_workers=int(os.getenv('COMPUTE_WORKERS', str(os.cpu_count() or 2))),
+                name="compute",
+                use_processes=os.getenv('COMPUTE_BACKEND', 'thread').lower() == 'process'
+            )
+        return _compute_executor
@@ -0,0 +1,129 @@
+from datetime import datetime, date, time, timedelta, timezone
+from typing import Optional, Union
+from zoneinfo import ZoneInfo
+
+# 各市场所在时区
+MARKET_TIMEZONES = {
+    'A': ZoneInfo('Asia/Shanghai'),
+    'ETF': ZoneInfo('Asia/Shanghai'),
+    'LOF': ZoneInfo('Asia/Shanghai'),
+    'HK': ZoneInfo('Asia/Hong_Kong'),
+    'US': ZoneInfo('America/New_York'),
+}
+
+# 各市场收盘时间（当地时间），留出数据源落库的缓冲
+SESSION_CLOSE_TIMES = {
+    'A': time(15, 30),
+    'ETF': time(15, 30),
+    'LOF': time(15, 30),
+    'HK': time(16, 30),
+    'US': time(16, 30),
+}
+
+
+def get_market_timezone(market_type: str) -> ZoneInfo:
+    """获取市场所在时区，未知市场按A股处理"""
+    return MARKET_TIMEZONES.get(market_type, MARKET_TIMEZONES['A'])
+
+
+def market_now(market_type: str = 'A') -> datetime:
+    """获取市场当地的当前时间（带时区）"""
+    return datetime.now(get_market_timezone(market_type))
+
+
+def session_close(market_type: str, day: Union[date, datetime]) -> datetime:
+    """
+    获取指定交易日的收盘时间
+
+    Args:
+        market_type: 市场类型
+        day: 交易日
+
+    Returns:
+        带时区的收盘时间
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    close_time = SESSION_CLOSE_TIMES.get(market_type, SESSION_CLOSE_TIMES['A'])
+    return datetime.combine(day, close_time, tzinfo=get_market_timezone(market_type))
+
+
+
+# 各市场连续交易时段（当地时间）
+TRADING_SESSIONS = {
+    'A': [(time(9, 30), time(11, 30)), (time(13, 0), time(15, 0))],
+    'ETF': [(time(9, 30), time(11, 30)), (time(13, 0), time(15, 0))],
+    'LOF': [(time(9, 30), time(11, 30)), (time(13, 0), time(15, 0))],
+    'HK': [(time(9, 30), time(12, 0)), (time(13, 0), time(16, 0))],
+    'US': [(time(9, 30), time(16, 0))],
+}
+
+
+def is_trading_time(market_type: str, now: Optional[datetime] = None) -> bool:
+    """
+    判断当前是否处于交易时段（仅按工作日判断，不考虑节假日）
+
+    Args:
+        market_type: 市场类型
+        now: 指定时间，默认为当前时间
+
+    Returns:
+        是否处于交易时段
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(get_market_timezone(market_type))
+    if now.weekday() >= 5:
+        return False
+    sessions = TRADING_SESSIONS.get(market_type, TRADING_SESSIONS['A'])
+    return any(start <= now.time() < end for start, end in sessions)
+
+
+def next_session_start(market_type: str, now: Optional[datetime] = None) -> datetime:
+    """
+    获取下一个交易时段的开始时间（仅按工作日判断，不考虑节假日）
+
+    Args:
+        market_type: 市场类型
+        now: 指定时间，默认为当前时间
+
+    Returns:
+        带时区的下一个交易时段开始时间
+    """
+    tz = get_market_timezone(market_type)
+    now = (now or datetime.now(timezone.utc)).astimezone(tz)
+    sessions = TRADING_SESSIONS.get(market_type, TRADING_SESSIONS['A'])
+
+    day = now.date()
+    for _ in range(8):
+        if day.weekday() < 5:
+            for start, _end in sessions:
+                candidate = datetime.combine(day, start, tzinfo=tz)
+                if candidate > now:
+                    return candidate
+        day += timedelta(days=1)
+    return now + timedelta(days=1)
+
+
+def previous_weekday(day: date) -> date:
+    """获取前一个工作日（不考虑节假日）"""
+    day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def latest_session_date(market_type: str, now: Optional[datetime] = None) -> date:
+    """
+    获取最近一个已收盘的交易日（仅按工作日判断，不考虑节假日）
+
+    Args:
+        market_type: 市场类型
+        now: 指定时间，默认为当前时间
+
+    Returns:
+        交易日日期
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(get_market_timezone(market_type))
+    day = now.date()
+    if day.weekday() < 5 and now >= session_close(market_type, day):
+        return day
+    return previous_weekday(day)
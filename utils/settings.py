@@ -0,0 +1,26 @@
+import os
+from typing import Any, Callable, Optional
+
+
+class EnvSetting:
+    """
+    从环境变量读取的类属性配置
+    每次访问时读取环境变量，而不是在模块导入时读取，
+    这样服务模块先于 load_dotenv() 导入时，.env 中的配置同样生效
+    """
+
+    def __init__(self, name: str, default: str, cast: Callable[[str], Any] = int):
+        """
+        初始化配置项
+
+        Args:
+            name: 环境变量名
+            default: 未设置时使用的默认值（字符串，与环境变量一样经过cast转换）
+            cast: 类型转换函数
+        """
+        self.name = name
+        self.default = default
+        self.cast = cast
+
+    def __get__(self, instance: Optional[object], owner: type) -> Any:
+        return self.cast(os.getenv(self.name, self.default))
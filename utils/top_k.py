@@ -0,0 +1,61 @@
+import heapq
+import itertools
+from typing import Any, List, Optional, Tuple
+
+
+class StreamingTopK:
+    """
+    流式Top-K：逐个接收(评分, 条目)，只保留评分最高的k个
+
+    使用容量为k的小顶堆，每次插入O(log k)；评分相同时先到的条目优先，
+    结果与对全部条目按评分做稳定降序排序后取前k个一致
+    """
+
+    def __init__(self, k: int):
+        """
+        初始化流式Top-K
+
+        Args:
+            k: 保留的条目数
+        """
+        self.k = k
+        # 堆元素为 (评分, -到达序号, 条目)，堆顶是最先被淘汰的条目
+        self._heap: List[Tuple[Any, int, Any]] = []
+        self._counter = itertools.count()
+
+    def push(self, score: Any, item: Any) -> Optional[Any]:
+        """
+        加入一个条目
+
+        Args:
+            score: 评分
+            item: 条目
+
+        Returns:
+            因此被丢弃的条目（新条目未入选时就是它本身），没有丢弃时返回None
+        """
+        if self.k <= 0:
+            return item
+
+        entry = (score, -next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return None
+
+        if entry[:2] > self._heap[0][:2]:
+            return heapq.heapreplace(self._heap, entry)[2]
+        return item
+
+    @property
+    def threshold(self) -> Optional[Any]:
+        """当前入选所需超过的最低评分，未满k个时返回None"""
+        if len(self._heap) < self.k:
+            return None
+        return self._heap[0][0]
+
+    def items(self) -> List[Tuple[Any, Any]]:
+        """按评分降序返回 (评分, 条目) 列表"""
+        return [(score, item) for score, _, item in sorted(self._heap, reverse=True)]
+
+    def __len__(self) -> int:
+        return len(self._heap)
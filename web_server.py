@@ -4,10 +4,14 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Generator
+from typing import List, Optional, Dict, Any, Generator, Tuple
 from services.stock_analyzer_service import StockAnalyzerService
 from services.us_stock_service_async import USStockServiceAsync
 from services.fund_service_async import FundServiceAsync
+from services.stock_data_provider import StockDataProvider, get_data_fetch_backend
+from services.technical_indicator import TechnicalIndicator
+from services.indicator_index import get_index, refresh_daily_index, get_index_stats
+from utils.executor import get_io_executor, get_process_executor, get_compute_executor
 import os
 import httpx
 from utils.logger import get_logger
@@ -59,11 +63,29 @@ fund_service = FundServiceAsync()
 class AnalyzeRequest(BaseModel):
     stock_codes: List[str]
     market_type: str = "A"
+    screen: Optional[str] = None
+    # 加权评分规则，每项为 [条件表达式, 权重]
+    rules: Optional[List[Tuple[str, float]]] = None
     api_url: Optional[str] = None
     api_key: Optional[str] = None
     api_model: Optional[str] = None
     api_timeout: Optional[str] = None
 
+class UniverseScanRequest(BaseModel):
+    market_type: str = "A"
+    min_score: int = 0
+    screen: Optional[str] = None
+    # 加权评分规则，每项为 [条件表达式, 权重]
+    rules: Optional[List[Tuple[str, float]]] = None
+    resume: bool = True
+
+class IndexQueryRequest(BaseModel):
+    market_type: str = "A"
+    # 列名 -> [下界, 上界] 或 [下界, 上界, 包含方式]，界限为null表示不限
+    conditions: Dict[str, List[Any]] = Field(default_factory=dict)
+    date: Optional[str] = None
+    limit: Optional[int] = None
+
 class TestAPIRequest(BaseModel):
     api_url: str
     api_key: str
@@ -243,7 +265,9 @@ async def analyze(request: AnalyzeRequest, username: str = Depends(verify_token)
                     [code.strip() for code in stock_codes], 
                     min_score=0, 
                     market_type=market_type,
-                    stream=True
+                    stream=True,
+                    screen=request.screen,
+                    rules=request.rules
                 ):
                     chunk_count += 1
                     yield chunk + '\n'
@@ -289,6 +313,63 @@ async def search_funds(keyword: str = "", market_type: str = "", username: str =
         logger.error(f"搜索基金代码时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 全市场扫描（分批保存检查点，中断后可继续）
+@app.post("/api/scan/universe")
+async def scan_universe(request: UniverseScanRequest, username: str = Depends(verify_token)):
+    try:
+        logger.info(f"开始全市场扫描请求: market_type={request.market_type}, min_score={request.min_score}, resume={request.resume}")
+        analyzer = StockAnalyzerService()
+        
+        async def generate_stream():
+            async for chunk in analyzer.scan_universe(
+                request.market_type,
+                min_score=request.min_score,
+                screen=request.screen,
+                resume=request.resume,
+                rules=request.rules
+            ):
+                yield chunk + '\n'
+        
+        return StreamingResponse(generate_stream(), media_type='application/json')
+        
+    except Exception as e:
+        error_msg = f"全市场扫描时出错: {str(e)}"
+        logger.error(error_msg)
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+# 基于当日指标索引的区间选股
+@app.post("/api/index/query")
+async def query_indicator_index(request: IndexQueryRequest, username: str = Depends(verify_token)):
+    try:
+        try:
+            index = get_index(request.market_type, request.date)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"日期格式无效: {str(e)}")
+        if index is None and request.date is None:
+            # 尚未建立索引时从本地存储建立一次
+            index = await get_io_executor().run(refresh_daily_index, request.market_type)
+        if index is None:
+            raise HTTPException(status_code=404, detail=f"{request.market_type} 没有可用的指标索引")
+        
+        try:
+            matched = index.query(request.conditions)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        matched_count = len(matched)
+        if request.limit is not None:
+            matched = matched.head(request.limit)
+        
+        records = json.loads(matched.reset_index().to_json(orient='records'))
+        return {"date": str(index.as_of), "total": len(index), "matched": matched_count, "results": records}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询指标索引时出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # 获取美股详情
 @app.get("/api/us_stock_detail/{symbol}")
 async def get_us_stock_detail(symbol: str, username: str = Depends(verify_token)):
@@ -388,6 +469,20 @@ async def test_api_connection(request: TestAPIRequest, username: str = Depends(v
             content={"success": False, "message": f"API 测试连接时出错: {str(e)}"}
         )
 
+# 数据获取运行指标
+@app.get("/api/metrics")
+async def get_metrics(username: str = Depends(verify_token)):
+    """返回数据获取与计算执行器、行情缓存、请求合并和指标缓存的运行指标"""
+    return {
+        "data_fetch_executor": (get_process_executor() if get_data_fetch_backend() == 'process' else get_io_executor()).stats(),
+        "compute_executor": get_compute_executor().stats(),
+        "stock_data_cache": StockDataProvider.get_cache_stats(),
+        "stock_data_single_flight": StockDataProvider.get_single_flight_stats(),
+        "upstream_limiter": StockDataProvider.get_upstream_limiter_stats(),
+        "indicator_cache": TechnicalIndicator.get_cache_stats(),
+        "indicator_index": get_index_stats()
+    }
+
 # 检查是否需要登录
 @app.get("/api/need_login")
 async def need_login():